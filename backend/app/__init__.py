@@ -1,22 +1,54 @@
 from flask import Flask, jsonify
 from flask_sqlalchemy import SQLAlchemy
-from flask_jwt_extended import JWTManager
-from flask_bcrypt import Bcrypt
 from flask_cors import CORS
 from config import Config
+from app.tokens import CachingJWTManager
+from app.sharding import RoutingSession
 
-db = SQLAlchemy()
-jwt = JWTManager()
-bcrypt = Bcrypt()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+jwt = CachingJWTManager()
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
     
+    from app.db_tuning import engine_options, apply_sqlite_pragmas
+    if 'SQLALCHEMY_ENGINE_OPTIONS' not in app.config:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+    
+    from app.sharding import shard_router, shard_binds
+    from app.replicas import replica_binds
+    if app.config.get('SHARD_DATABASE_URLS') or app.config.get('REPLICA_DATABASE_URLS'):
+        app.config['SQLALCHEMY_BINDS'] = {
+            **app.config.get('SQLALCHEMY_BINDS', {}), **shard_binds(app.config), **replica_binds(app.config)
+        }
+    shard_router.init_app(app)
+    
     # Initialize extensions
     db.init_app(app)
+    with app.app_context():
+        for engine in db.engines.values():
+            apply_sqlite_pragmas(engine, app.config)
     jwt.init_app(app)
-    bcrypt.init_app(app)
+    
+    from app.tokens import token_versions
+    token_versions.init_app(app)
+    
+    from app.passwords import password_hasher
+    password_hasher.init_app(app)
+    
+    from app.cache import report_cache
+    report_cache.init_app(app)
+    
+    from app.categories import category_registry
+    category_registry.init_app(app)
+    
+    from app.replicas import replica_router
+    replica_router.init_app(app)
+    
+    from app.instrumentation import instrumentation
+    with app.app_context():
+        instrumentation.init_app(app, db.engines.values())
     
     # JWT Error Handlers
     @jwt.expired_token_loader
@@ -31,6 +63,14 @@ def create_app(config_class=Config):
     def missing_token_callback(error):
         return jsonify({'error': 'Authorization token is missing', 'message': str(error)}), 401
     
+    @jwt.token_in_blocklist_loader
+    def token_revoked_check(jwt_header, jwt_payload):
+        return token_versions.is_revoked(jwt_payload)
+    
+    @jwt.revoked_token_loader
+    def revoked_token_callback(jwt_header, jwt_payload):
+        return jsonify({'error': 'Token has been revoked'}), 401
+    
     # Enable CORS
     CORS(app, resources={
         r"/api/*": {
@@ -47,11 +87,23 @@ def create_app(config_class=Config):
     from app.budgets import budgets_bp
     from app.goals import goals_bp
     from app.reports import reports_bp
+    from app.recurring import recurring_bp
     
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(transactions_bp, url_prefix='/api/transactions')
     app.register_blueprint(budgets_bp, url_prefix='/api/budgets')
     app.register_blueprint(goals_bp, url_prefix='/api/goals')
     app.register_blueprint(reports_bp, url_prefix='/api/reports')
+    app.register_blueprint(recurring_bp, url_prefix='/api/recurring')
+    
+    # CLI commands
+    from app.cli import register_commands
+    register_commands(app)
+    
+    from app.scheduler import recurring_scheduler
+    recurring_scheduler.init_app(app)
+    
+    from app.ingest import ingest_queue
+    ingest_queue.init_app(app)
     
     return app
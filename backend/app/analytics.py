@@ -0,0 +1,160 @@
+import numpy as np
+from calendar import monthrange
+from datetime import date, datetime
+from flask import current_app
+from sqlalchemy import select
+from app import db
+from app.models import Budget, MonthlyCategoryTotal, Transaction
+from app.categories import category_registry
+from app.money import to_amount
+
+# Spending forecasts and anomaly detection. Each report loads the history it
+# needs as columnar NumPy arrays in a single query and works on whole arrays;
+# the only Python loops run over the categories or flagged rows being returned.
+
+
+def _columns(statement, dtypes):
+    """Execute `statement` and return one NumPy array per selected column."""
+    # Core execution: plain tuples, no ORM row loading
+    rows = db.session.connection(bind_arguments={'clause': statement}).execute(statement).all()
+    if not rows:
+        return [np.empty(0, dtype=dtype) for dtype in dtypes]
+    return [np.array(column, dtype=dtype) for column, dtype in zip(zip(*rows), dtypes)]
+
+
+def _month_shift(year, month, months):
+    index = year * 12 + month - 1 + months
+    return index // 12, index % 12 + 1
+
+
+def forecast(user_id, month, year, today=None, window=None):
+    """Month-end expense projection per category against that month's budgets.
+    
+    Each category's projection is what it has spent so far plus its rolling
+    average over the `window` months before, scaled to the days left.
+    """
+    today = today or datetime.utcnow().date()
+    window = window or current_app.config['ANALYTICS_ROLLING_MONTHS']
+    target = year * 12 + month - 1
+    
+    years, months, rollup_categories, totals = _columns(
+        select(
+            MonthlyCategoryTotal.year,
+            MonthlyCategoryTotal.month,
+            MonthlyCategoryTotal.category_id,
+            MonthlyCategoryTotal.total_cents
+        ).where(
+            MonthlyCategoryTotal.user_id == user_id,
+            MonthlyCategoryTotal.type == 'expense',
+            MonthlyCategoryTotal.count > 0,
+            MonthlyCategoryTotal.year * 12 + MonthlyCategoryTotal.month - 1 <= target
+        ),
+        [np.int64, np.int64, np.int64, np.int64]
+    )
+    budget_categories, limits = _columns(
+        select(Budget.category_id, Budget.monthly_limit_cents).where(
+            Budget.user_id == user_id,
+            Budget.month == month,
+            Budget.year == year
+        ),
+        [np.int64, np.int64]
+    )
+    
+    category_ids = np.union1d(rollup_categories, budget_categories)
+    index = years * 12 + months - 1
+    first = min(int(index.min()), target) if len(index) else target
+    # category x month matrix of spend, oldest month first, target month last
+    matrix = np.zeros((len(category_ids), target - first + 1), dtype=np.int64)
+    matrix[np.searchsorted(category_ids, rollup_categories), index - first] = totals
+    
+    spent = matrix[:, -1]
+    history = matrix[:, :-1][:, -window:]
+    average = history.sum(axis=1) / history.shape[1] if history.shape[1] else np.zeros(len(category_ids))
+    
+    budget = np.full(len(category_ids), -1, dtype=np.int64)
+    budget[np.searchsorted(category_ids, budget_categories)] = limits
+    
+    days = monthrange(year, month)[1]
+    if (year, month) < (today.year, today.month):
+        elapsed = days
+    elif (year, month) == (today.year, today.month):
+        elapsed = today.day
+    else:
+        elapsed = 0
+    projected = np.rint(spent + average * (days - elapsed) / days).astype(np.int64)
+    
+    names = category_registry.names(user_id)
+    categories = [{
+        'category_id': int(category_id),
+        'category_name': names.get(int(category_id), 'Unknown'),
+        'spent': to_amount(int(spent[i])),
+        'rolling_average': to_amount(int(round(average[i]))),
+        'projected': to_amount(int(projected[i])),
+        'budget': to_amount(int(budget[i])) if budget[i] >= 0 else None,
+        'projected_over_budget': bool(budget[i] >= 0 and projected[i] > budget[i])
+    } for i, category_id in enumerate(category_ids)]
+    categories.sort(key=lambda item: item['projected'], reverse=True)
+    
+    has_budget = budget >= 0
+    return {
+        'month': month,
+        'year': year,
+        'days_elapsed': elapsed,
+        'days_in_month': days,
+        'window_months': int(history.shape[1]),
+        'total_spent': to_amount(int(spent.sum())),
+        'total_projected': to_amount(int(projected.sum())),
+        'total_budget': to_amount(int(budget[has_budget].sum())),
+        'projected_over_budget': bool((projected[has_budget] > budget[has_budget]).any()),
+        'categories': categories
+    }
+
+
+def anomalies(user_id, months=None, threshold=None, today=None):
+    """Expenses whose amount is `threshold` or more standard deviations from
+    their category's mean over the last `months` months."""
+    today = today or datetime.utcnow().date()
+    months = months or current_app.config['ANALYTICS_ANOMALY_MONTHS']
+    threshold = threshold or current_app.config['ANALYTICS_ZSCORE_THRESHOLD']
+    min_samples = current_app.config['ANALYTICS_MIN_SAMPLES']
+    since = date(*_month_shift(today.year, today.month, -(months - 1)), 1)
+    
+    # Dates are only needed for the rows flagged, and are fetched for those alone
+    ids, categories, amounts = _columns(
+        select(Transaction.transaction_id, Transaction.category_id, Transaction.amount_cents).where(
+            Transaction.user_id == user_id,
+            Transaction.type == 'expense',
+            Transaction.date >= since
+        ),
+        [np.int64, np.int64, np.float64]
+    )
+    
+    category_ids, inverse = np.unique(categories, return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(category_ids))
+    means = np.bincount(inverse, weights=amounts, minlength=len(category_ids)) / np.maximum(counts, 1)
+    deviations = amounts - means[inverse]
+    stds = np.sqrt(np.bincount(inverse, weights=deviations ** 2, minlength=len(category_ids)) / np.maximum(counts, 1))
+    
+    row_std = stds[inverse]
+    scores = np.divide(deviations, row_std, out=np.zeros_like(deviations), where=row_std > 0)
+    flagged = np.nonzero((np.abs(scores) >= threshold) & (counts[inverse] >= min_samples))[0]
+    flagged = flagged[np.argsort(-np.abs(scores[flagged]), kind='stable')]
+    
+    names = category_registry.names(user_id)
+    dates = dict(db.session.query(Transaction.transaction_id, Transaction.date).filter(
+        Transaction.transaction_id.in_(ids[flagged].tolist())
+    ).all()) if len(flagged) else {}
+    return {
+        'since': since.isoformat(),
+        'threshold': threshold,
+        'transactions_checked': int(len(ids)),
+        'anomalies': [{
+            'transaction_id': int(ids[i]),
+            'date': dates[int(ids[i])].isoformat(),
+            'category_id': int(categories[i]),
+            'category_name': names.get(int(categories[i]), 'Unknown'),
+            'amount': to_amount(int(amounts[i])),
+            'category_mean': to_amount(int(round(means[inverse[i]]))),
+            'z_score': round(float(scores[i]), 2)
+        } for i in flagged]
+    }
@@ -2,10 +2,16 @@ from flask import Blueprint, request, jsonify
 from app import db
 from app.models import User
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.passwords import password_hasher, HasherBusy
+from app.tokens import token_versions, token_claims, claimed_user
 
 auth_bp = Blueprint('auth', __name__)
 
+def busy_response(error):
+    response = jsonify({'error': str(error)})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     try:
@@ -22,7 +28,7 @@ def register():
         user = User(
             name=data['name'],
             email=data['email'],
-            password_hash=generate_password_hash(data['password'], method='pbkdf2:sha256')
+            password_hash=password_hasher.hash(data['password'])
         )
         
         db.session.add(user)
@@ -30,6 +36,8 @@ def register():
         
         return jsonify({'message': 'User registered successfully'}), 201
     
+    except HasherBusy as e:
+        return busy_response(e)
     except Exception as e:
         db.session.rollback()
         print(f"Registration error: {str(e)}")  # Debug log
@@ -50,11 +58,16 @@ def login():
             return jsonify({'error': 'Invalid email or password'}), 401
         
         # Check password
-        if not check_password_hash(user.password_hash, data['password']):
+        if not password_hasher.verify(user.password_hash, data['password']):
             return jsonify({'error': 'Invalid email or password'}), 401
         
+        # Upgrade hashes made with an older algorithm or cost
+        if password_hasher.needs_rehash(user.password_hash):
+            user.password_hash = password_hasher.hash(data['password'])
+            db.session.commit()
+        
         # Create access token
-        access_token = create_access_token(identity=str(user.user_id))
+        access_token = create_access_token(identity=str(user.user_id), additional_claims=token_claims(user))
         
         return jsonify({
             'token': access_token,
@@ -65,7 +78,10 @@ def login():
             }
         }), 200
     
+    except HasherBusy as e:
+        return busy_response(e)
     except Exception as e:
+        db.session.rollback()
         print(f"Login error: {str(e)}")  # Debug log
         return jsonify({'error': str(e)}), 500
 
@@ -74,6 +90,12 @@ def login():
 def get_current_user():
     try:
         current_user_id = int(get_jwt_identity())
+        
+        # Tokens carry the profile, and revocation is checked before we get here
+        claimed = claimed_user(current_user_id)
+        if claimed:
+            return jsonify({'user': claimed}), 200
+        
         user = User.query.get(current_user_id)
         
         if not user:
@@ -102,21 +124,32 @@ def update_profile():
         
         data = request.get_json()
         
+        revoke = False
         if data.get('name'):
             user.name = data['name']
-        if data.get('email'):
+        if data.get('email') and data['email'] != user.email:
             # Check if email is already taken by another user
             existing = User.query.filter_by(email=data['email']).first()
             if existing and existing.user_id != current_user_id:
                 return jsonify({'error': 'Email already in use'}), 400
             user.email = data['email']
+            revoke = True
         if data.get('password'):
-            user.password_hash = generate_password_hash(data['password'], method='pbkdf2:sha256')
-        
+            user.password_hash = password_hasher.hash(data['password'])
+            revoke = True
+        
+        # A new email or password revokes every outstanding token; a name
+        # edit does not log other devices out, which keep showing the old
+        # name from their token until it expires. This client gets a fresh one.
+        if revoke:
+            token_versions.bump(user)
         db.session.commit()
+        if revoke:
+            token_versions.remember(user)
         
         return jsonify({
             'message': 'Profile updated successfully',
+            'token': create_access_token(identity=str(user.user_id), additional_claims=token_claims(user)),
             'user': {
                 'user_id': user.user_id,
                 'name': user.name,
@@ -124,6 +157,9 @@ def update_profile():
             }
         }), 200
     
+    except HasherBusy as e:
+        db.session.rollback()
+        return busy_response(e)
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
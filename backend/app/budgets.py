@@ -1,9 +1,11 @@
 from flask import Blueprint, request, jsonify
 from app import db
-from app.models import Budget, Transaction, Category
+from app.cache import report_cache
+from app.models import Budget
+from app.money import to_cents
+from app.report_engine import budget_status
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
-from sqlalchemy import func, extract
 
 budgets_bp = Blueprint('budgets', __name__)
 
@@ -12,35 +14,10 @@ budgets_bp = Blueprint('budgets', __name__)
 def get_budgets():
     try:
         current_user_id = int(get_jwt_identity())
-        month = datetime.utcnow().month
-        year = datetime.utcnow().year
+        month = request.args.get('month', datetime.utcnow().month, type=int)
+        year = request.args.get('year', datetime.utcnow().year, type=int)
         
-        budgets = Budget.query.filter_by(
-            user_id=current_user_id,
-            month=month,
-            year=year
-        ).all()
-        
-        result = []
-        for budget in budgets:
-            spent = db.session.query(func.sum(Transaction.amount)).filter(
-                Transaction.user_id == current_user_id,
-                Transaction.category_id == budget.category_id,
-                Transaction.type == 'expense',
-                extract('month', Transaction.date) == month,
-                extract('year', Transaction.date) == year
-            ).scalar() or 0.0
-            
-            category = Category.query.get(budget.category_id)
-            
-            result.append({
-                'budget_id': budget.budget_id,
-                'category_id': budget.category_id,
-                'category_name': category.name if category else 'Unknown',
-                'amount': float(budget.monthly_limit),  # Map monthly_limit to amount
-                'period': 'monthly',  # Always monthly for compatibility
-                'spent': float(spent)
-            })
+        result = budget_status(current_user_id, month, year)
         
         return jsonify({'budgets': result}), 200
     except Exception as e:
@@ -59,6 +36,11 @@ def create_budget():
         if not category_id or not amount:
             return jsonify({'error': 'Category and amount are required'}), 400
         
+        try:
+            limit_cents = to_cents(amount)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         month = datetime.utcnow().month
         year = datetime.utcnow().year
         
@@ -76,13 +58,14 @@ def create_budget():
         budget = Budget(
             user_id=current_user_id,
             category_id=int(category_id),
-            monthly_limit=float(amount),  # Map amount to monthly_limit
+            monthly_limit_cents=limit_cents,  # Map amount to monthly_limit
             month=month,
             year=year
         )
         
         db.session.add(budget)
         db.session.commit()
+        report_cache.invalidate(current_user_id)
         
         return jsonify({
             'message': 'Budget created successfully',
@@ -108,11 +91,15 @@ def update_budget(budget_id):
         data = request.get_json()
         
         if data.get('amount'):
-            budget.monthly_limit = float(data['amount'])
+            try:
+                budget.monthly_limit_cents = to_cents(data['amount'])
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
         if data.get('category_id'):
             budget.category_id = int(data['category_id'])
         
         db.session.commit()
+        report_cache.invalidate(current_user_id)
         
         return jsonify({'message': 'Budget updated successfully'}), 200
     except Exception as e:
@@ -134,6 +121,7 @@ def delete_budget(budget_id):
         
         db.session.delete(budget)
         db.session.commit()
+        report_cache.invalidate(current_user_id)
         
         return jsonify({'message': 'Budget deleted successfully'}), 200
     except Exception as e:
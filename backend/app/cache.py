@@ -0,0 +1,206 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+from flask import request, Response
+from flask_jwt_extended import get_jwt_identity
+
+# Per-user cache for report endpoints. Every cached entry is keyed on the
+# user's data version, which mutations bump, so a write makes all of that
+# user's cached reports unreachable at once instead of deleting them one by one.
+
+
+class MemoryBackend:
+    """In-process LRU with per-entry TTL.
+
+    Counters are kept apart so eviction can never reset a user's version, and
+    start from the process start time so ETags handed out before a restart
+    never match again. They are not shared between worker processes, so
+    versions from this backend are never used for ETags.
+    """
+
+    shared = False
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.counters = {}
+        self.epoch = int(time.time() * 1000)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ex=None):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + ex if ex else None)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def counter(self, key):
+        with self.lock:
+            return self.counters.get(key, self.epoch)
+
+    def incr(self, key):
+        with self.lock:
+            self.counters[key] = self.counters.get(key, self.epoch) + 1
+            return self.counters[key]
+
+
+class RedisBackend:
+    """Thin adapter over any client exposing Redis' get/set(ex=, nx=)/delete/incr, so
+    a local stand-in can replace a real server.
+
+    A missing counter is seeded with the current time in milliseconds, so
+    versions handed out after the server is flushed never match old ETags.
+    """
+
+    shared = True
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ex=None):
+        self.client.set(key, value, ex=ex)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def _seed(self, key):
+        self.client.set(key, int(time.time() * 1000), nx=True)
+
+    def counter(self, key):
+        value = self.client.get(key)
+        if value is None:
+            self._seed(key)
+            value = self.client.get(key)
+        return int(value)
+
+    def incr(self, key):
+        self._seed(key)
+        return int(self.client.incr(key))
+
+
+class ReportCache:
+    def __init__(self):
+        self.backend = None
+        self.ttl = 60
+
+    def init_app(self, app):
+        processes = app.config.get('SERVER_PROCESSES', 1)
+        backend = app.config.get('REPORT_CACHE_BACKEND') or ('memory' if processes == 1 else 'none')
+        if backend == 'memory' and processes > 1:
+            # Each worker would keep serving its own copy after another one's write
+            raise ValueError('REPORT_CACHE_BACKEND=memory needs a single process; use redis or none')
+        self.ttl = app.config['REPORT_CACHE_TTL']
+        if backend == 'memory':
+            self.backend = MemoryBackend(app.config['REPORT_CACHE_MAX_ENTRIES'])
+        elif backend == 'redis':
+            import redis
+            self.backend = RedisBackend(redis.Redis.from_url(app.config['REPORT_CACHE_REDIS_URL']))
+        else:
+            self.backend = None
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def version(self, user_id):
+        return self.backend.counter(f'reports:{user_id}:version')
+
+    def invalidate(self, user_id):
+        if self.enabled:
+            self.backend.incr(f'reports:{user_id}:version')
+        # Reports rebuilt on a lagging replica would be cached as current
+        from app.replicas import replica_router
+        replica_router.wrote(user_id)
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, body):
+        self.backend.set(key, body, ex=self.ttl)
+
+
+report_cache = ReportCache()
+
+
+def cached_report(endpoint, daily=False, resolve=None):
+    """Cache a report view's JSON body per (user, version, endpoint, month, year
+    and any other query arguments). `daily` adds today's date (UTC) to the
+    key, for reports computed relative to today. `resolve` is called in the
+    request for the values the view resolves from its arguments (such as
+    default dates), which are added to the key; when it raises ValueError the
+    view runs uncached and reports the error.
+
+    With a shared backend (Redis), responses carry an ETag derived from that
+    key, so a client that already holds the current version gets a 304
+    without the report being rebuilt. The memory backend's versions are per
+    worker process, and a write seen by one worker would leave another
+    answering 304 for the old report, so it sends no ETags.
+    Must sit inside @jwt_required().
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not report_cache.enabled:
+                return view(*args, **kwargs)
+            try:
+                resolved = resolve() if resolve else None
+            except ValueError:
+                return view(*args, **kwargs)
+
+            user_id = int(get_jwt_identity())
+            now = datetime.utcnow()
+            month = request.args.get('month', now.month, type=int)
+            year = request.args.get('year', now.year, type=int)
+            version = report_cache.version(user_id)
+
+            extra = '&'.join(f'{name}={value}' for name, value in sorted(request.args.items(multi=True))
+                             if name not in ('month', 'year'))
+            key = f'reports:{user_id}:v{version}:{endpoint}:{month}:{year}:{extra}'
+            if daily:
+                key += f':{now.date().isoformat()}'
+            if resolved is not None:
+                key += f':{resolved}'
+            etag = hashlib.sha1(key.encode()).hexdigest() if report_cache.backend.shared else None
+
+            if etag and etag in request.if_none_match:
+                response = Response(status=304)
+                response.set_etag(etag)
+                return response
+
+            body = report_cache.get(key)
+            if body is None:
+                result = view(*args, **kwargs)
+                response, status = result if isinstance(result, tuple) else (result, 200)
+                if status != 200:
+                    return result
+                body = response.get_data()
+                report_cache.set(key, body)
+
+            response = Response(body, status=200, mimetype='application/json')
+            if etag:
+                response.set_etag(etag)
+            return response
+        return wrapper
+    return decorator
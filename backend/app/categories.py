@@ -0,0 +1,108 @@
+from collections import namedtuple
+from sqlalchemy import case, literal, String
+from app.cache import MemoryBackend
+
+# Per-process category registry. The default categories everybody shares are
+# read once; each user's custom categories are loaded on first use and kept in
+# an LRU of CATEGORY_CACHE_SIZE users. Categories are never edited or deleted,
+# so the only way an entry goes stale is a category added by another worker:
+# validation reloads the user's entry once before rejecting an unknown id, and
+# entries expire after CATEGORY_CACHE_TTL seconds regardless.
+
+CategoryInfo = namedtuple('CategoryInfo', ['category_id', 'name', 'type', 'is_custom'])
+
+
+class CategoryRegistry:
+    def __init__(self):
+        self.defaults = None
+        self.custom = MemoryBackend()
+        self.ttl = 300
+
+    def init_app(self, app):
+        self.defaults = None
+        self.custom = MemoryBackend(app.config['CATEGORY_CACHE_SIZE'])
+        self.ttl = app.config['CATEGORY_CACHE_TTL']
+
+    def _load(self, *criteria):
+        from app import db
+        from app.models import Category
+        rows = db.session.query(
+            Category.category_id, Category.name, Category.type, Category.is_custom
+        ).filter(*criteria).all()
+        return {row.category_id: CategoryInfo(*row) for row in rows}
+
+    def _defaults(self, reload=False):
+        from app.models import Category
+        if self.defaults is None or reload:
+            self.defaults = self._load(Category.is_custom == False)
+        return self.defaults
+
+    def _custom(self, user_id, reload=False):
+        from app.models import Category
+        categories = None if reload else self.custom.get(user_id)
+        if categories is None:
+            categories = self._load(Category.user_id == user_id)
+            self.custom.set(user_id, categories, ex=self.ttl)
+        return categories
+
+    def get(self, user_id, category_id):
+        """The category if `user_id` may use it, from cached data only."""
+        return self._custom(user_id).get(category_id) or self._defaults().get(category_id)
+
+    def lookup(self, user_id, category_id):
+        """Like get(), but a miss reloads the registry once before giving up."""
+        category = self.get(user_id, category_id)
+        if category is None:
+            category = self._custom(user_id, reload=True).get(category_id) or self._defaults(reload=True).get(category_id)
+        return category
+
+    def available(self, user_id):
+        """Every category the user may use, in id order."""
+        categories = dict(self._defaults())
+        categories.update(self._custom(user_id))
+        return [categories[category_id] for category_id in sorted(categories)]
+
+    def names(self, user_id):
+        return {category.category_id: category.name for category in self.available(user_id)}
+
+    def types(self, user_id):
+        return {category.category_id: category.type for category in self.available(user_id)}
+
+    def validate(self, user_id, category_id, type_):
+        """Error message if the user may not file a `type_` transaction under
+        `category_id`, else None."""
+        try:
+            category_id = int(category_id)
+        except (TypeError, ValueError):
+            return 'Category must be an id'
+        category = self.lookup(user_id, category_id)
+        if category is None:
+            return 'Category not found'
+        if category.type != type_:
+            return f'Category is not an {type_} category'
+        return None
+
+    def invalidate(self, user_id):
+        self.custom.delete(user_id)
+
+
+category_registry = CategoryRegistry()
+
+
+def category_name(row):
+    """Name of a Transaction/Budget/RecurringRule's category. The row's
+    `category` relationship is only loaded if the registry lacks the id."""
+    known = category_registry.get(row.user_id, row.category_id)
+    if known is not None:
+        return known.name
+    return row.category.name if row.category else None
+
+
+def name_column(user_id, column):
+    """SQL expression naming the category in `column`, filled from the
+    registry so a query never joins categories (which stay on the default
+    database when user data is sharded)."""
+    names = category_registry.names(user_id)
+    if not names:
+        return literal(None, String)
+    return case(names, value=column)
@@ -0,0 +1,139 @@
+import time
+import click
+from datetime import date
+from flask import current_app
+from flask.cli import AppGroup
+from app import db, rollups, sharding, replicas
+from app.scheduler import materialize
+from app.sharding import shard_router
+
+rollups_cli = AppGroup('rollups', help='Maintain the monthly_category_totals and daily_totals rollup tables.')
+recurring_cli = AppGroup('recurring', help='Post due occurrences of recurring transactions.')
+replicas_cli = AppGroup('replicas', help='Heartbeat and check the read replicas (REPLICA_DATABASE_URLS).')
+shards_cli = AppGroup('shards', help='Inspect and rebalance the user_id shards (SHARD_DATABASE_URLS).')
+
+
+@rollups_cli.command('rebuild')
+@click.option('--user-id', type=int, default=None, help='Only rebuild this user.')
+def rebuild_rollups(user_id):
+    """Recompute the rollups from the transactions table."""
+    for _ in shard_router.each_shard(user_id):
+        rollups.rebuild(user_id)
+        db.session.commit()
+    click.echo('✅ Rollups rebuilt')
+
+
+@rollups_cli.command('verify')
+@click.option('--user-id', type=int, default=None, help='Only verify this user.')
+def verify_rollups(user_id):
+    """Report every rollup row that drifted from the transactions table."""
+    drift = []
+    for _ in shard_router.each_shard(user_id):
+        drift.extend(rollups.verify(user_id))
+    for item in drift:
+        if item['table'] == 'daily_totals':
+            key = f"user={item['key'][0]} {item['key'][1]} {item['key'][2]}"
+        else:
+            key = (f"user={item['key'][0]} {item['key'][1]}-{item['key'][2]:02d} "
+                   f"category={item['key'][3]} {item['key'][4]}")
+        click.echo(f"{item['table']} {key}: stored={item['stored']} expected={item['expected']}")
+    if drift:
+        raise click.ClickException(f'{len(drift)} rollup rows drifted; run "flask rollups rebuild"')
+    click.echo('✅ Rollups match the transactions table')
+
+
+@recurring_cli.command('run')
+@click.option('--until', default=None, help='Post occurrences up to this date (YYYY-MM-DD, default today).')
+@click.option('--loop', is_flag=True, help='Keep running every RECURRING_SCHEDULER_INTERVAL seconds.')
+def run_recurring(until, loop):
+    """Materialize every recurring rule that is due."""
+    until = date.fromisoformat(until) if until else None
+    while True:
+        started = time.perf_counter()
+        rules, posted = materialize(until)
+        click.echo(f'✅ Posted {posted} transactions from {rules} rules in {time.perf_counter() - started:.2f}s')
+        if not loop:
+            break
+        time.sleep(current_app.config['RECURRING_SCHEDULER_INTERVAL'])
+
+
+@shards_cli.command('status')
+def shard_status():
+    """List the shards and every user whose data is not on its shard yet."""
+    if not shard_router.enabled:
+        raise click.ClickException('Sharding is disabled; set SHARD_DATABASE_URLS')
+    for name, url in zip(shard_router.names, sharding.shard_urls(current_app.config)):
+        click.echo(f'{name}: {url}')
+    found = sharding.misplaced()
+    for user_id, source, target in found:
+        click.echo(f"user={user_id} on {source or 'default'}, belongs on {target}")
+    click.echo(f'{len(found)} users to move')
+
+
+@shards_cli.command('rebalance')
+@click.option('--dry-run', is_flag=True, help='Only list the moves.')
+def rebalance_shards(dry_run):
+    """Move every user's data to the shard the hash ring assigns it.
+    
+    Run it with the application stopped: a user's data is unreachable (and
+    writes to it are lost) while it is on the wrong shard.
+    """
+    if not shard_router.enabled:
+        raise click.ClickException('Sharding is disabled; set SHARD_DATABASE_URLS')
+    sharding.create_all()
+    found = sharding.misplaced()
+    for user_id, source, target in found:
+        if dry_run:
+            click.echo(f"would move user={user_id} {source or 'default'} -> {target}")
+            continue
+        started = time.perf_counter()
+        rows = sharding.move_user(user_id, source, target)
+        click.echo(f"moved user={user_id} {source or 'default'} -> {target}: {rows} rows in {time.perf_counter() - started:.2f}s")
+    click.echo(f"✅ {len(found)} users {'to move' if dry_run else 'moved'}")
+
+
+def _every_interval(loop, step):
+    while True:
+        started = time.perf_counter()
+        step()
+        if not loop:
+            break
+        time.sleep(max(0, current_app.config['REPLICA_HEARTBEAT_INTERVAL'] - (time.perf_counter() - started)))
+
+
+@replicas_cli.command('status')
+def replica_status():
+    """Show how far behind the primary each replica is."""
+    if not replicas.replica_router.enabled:
+        raise click.ClickException('No replicas configured; set REPLICA_DATABASE_URLS')
+    max_lag = current_app.config['REPLICA_MAX_LAG_SECONDS']
+    for name, seconds in replicas.lag().items():
+        if seconds is None:
+            click.echo(f'{name}: unreachable or never synced, not used')
+        else:
+            click.echo(f"{name}: {seconds:.2f}s behind{'' if seconds <= max_lag else ', not used'}")
+
+
+@replicas_cli.command('heartbeat')
+@click.option('--loop', is_flag=True, help='Keep beating every REPLICA_HEARTBEAT_INTERVAL seconds.')
+def replica_heartbeat(loop):
+    """Stamp the heartbeat the replicas' lag is measured by (for real replication)."""
+    _every_interval(loop, replicas.beat)
+
+
+@replicas_cli.command('sync')
+@click.option('--loop', is_flag=True, help='Keep syncing every REPLICA_HEARTBEAT_INTERVAL seconds.')
+def replica_sync(loop):
+    """Copy a SQLite primary over its replicas (local replication stand-in)."""
+    if not replicas.replica_router.enabled:
+        raise click.ClickException('No replicas configured; set REPLICA_DATABASE_URLS')
+    _every_interval(loop, replicas.sync)
+    if not loop:
+        click.echo(f'✅ Synced {len(replicas.replica_router.names)} replicas')
+
+
+def register_commands(app):
+    app.cli.add_command(rollups_cli)
+    app.cli.add_command(recurring_cli)
+    app.cli.add_command(shards_cli)
+    app.cli.add_command(replicas_cli)
@@ -0,0 +1,59 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# Engine options and connect-time SQLite PRAGMAs, all driven from Config,
+# plus the dialect-specific statements the batch writers rely on.
+
+
+def engine_options(config, url=None):
+    """Build SQLALCHEMY_ENGINE_OPTIONS for the configured database URL (or `url`)."""
+    url = make_url(url or config['SQLALCHEMY_DATABASE_URI'])
+    options = {'pool_pre_ping': config['DB_POOL_PRE_PING']}
+    
+    # In-memory SQLite uses a single-connection pool that takes no sizing options
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return options
+    
+    options.update({
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE']
+    })
+    return options
+
+
+def sqlite_pragmas(config):
+    return [
+        ('journal_mode', config['SQLITE_JOURNAL_MODE']),
+        ('synchronous', config['SQLITE_SYNCHRONOUS']),
+        ('busy_timeout', config['SQLITE_BUSY_TIMEOUT_MS']),
+        ('mmap_size', config['SQLITE_MMAP_SIZE']),
+        ('cache_size', config['SQLITE_CACHE_SIZE'])
+    ]
+
+
+def apply_sqlite_pragmas(engine, config):
+    """Run the configured PRAGMAs on every new connection of a SQLite engine."""
+    if engine.dialect.name != 'sqlite':
+        return
+    
+    pragmas = sqlite_pragmas(config)
+    
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+
+def conflict_insert(table, dialect_name):
+    """INSERT with on_conflict_do_nothing/do_update, or None where unsupported."""
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(table)
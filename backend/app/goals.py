@@ -1,6 +1,9 @@
 from flask import Blueprint, request, jsonify
 from app import db
-from app.models import SavingsGoal
+from app.cache import report_cache
+from app.models import SavingsGoal, GoalContribution
+from app.report_engine import goal_projections
+from app.money import to_cents, to_amount
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
 
@@ -17,8 +20,8 @@ def get_goals():
             'goals': [{
                 'goal_id': g.goal_id,
                 'name': g.title,  # Map title to name for frontend
-                'target_amount': float(g.target_amount),
-                'current_amount': float(g.saved_amount),  # Map saved_amount to current_amount
+                'target_amount': to_amount(g.target_amount_cents),
+                'current_amount': to_amount(g.saved_amount_cents),  # Map saved_amount to current_amount
                 'deadline': g.deadline.strftime('%Y-%m-%d') if g.deadline else None
             } for g in goals]
         }), 200
@@ -40,6 +43,11 @@ def create_goal():
         if not name or not target_amount:
             return jsonify({'error': 'Name and target amount are required'}), 400
         
+        try:
+            target_cents = to_cents(target_amount)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         # Parse deadline
         deadline_obj = None
         if deadline:
@@ -54,21 +62,22 @@ def create_goal():
         goal = SavingsGoal(
             user_id=current_user_id,
             title=name,  # Map name to title
-            target_amount=float(target_amount),
-            saved_amount=0.0,
+            target_amount_cents=target_cents,
+            saved_amount_cents=0,
             deadline=deadline_obj
         )
         
         db.session.add(goal)
         db.session.commit()
+        report_cache.invalidate(current_user_id)
         
         return jsonify({
             'message': 'Goal created successfully',
             'goal': {
                 'goal_id': goal.goal_id,
                 'name': goal.title,
-                'target_amount': float(goal.target_amount),
-                'current_amount': float(goal.saved_amount),
+                'target_amount': to_amount(goal.target_amount_cents),
+                'current_amount': to_amount(goal.saved_amount_cents),
                 'deadline': goal.deadline.strftime('%Y-%m-%d') if goal.deadline else None
             }
         }), 201
@@ -94,7 +103,10 @@ def update_goal(goal_id):
         if data.get('name'):
             goal.title = data['name']
         if data.get('target_amount'):
-            goal.target_amount = float(data['target_amount'])
+            try:
+                goal.target_amount_cents = to_cents(data['target_amount'])
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
         if 'deadline' in data and data['deadline']:
             try:
                 goal.deadline = datetime.strptime(data['deadline'], '%Y-%m-%d')
@@ -102,14 +114,15 @@ def update_goal(goal_id):
                 goal.deadline = datetime.fromisoformat(data['deadline'])
         
         db.session.commit()
+        report_cache.invalidate(current_user_id)
         
         return jsonify({
             'message': 'Goal updated successfully',
             'goal': {
                 'goal_id': goal.goal_id,
                 'name': goal.title,
-                'target_amount': float(goal.target_amount),
-                'current_amount': float(goal.saved_amount),
+                'target_amount': to_amount(goal.target_amount_cents),
+                'current_amount': to_amount(goal.saved_amount_cents),
                 'deadline': goal.deadline.strftime('%Y-%m-%d') if goal.deadline else None
             }
         }), 200
@@ -132,6 +145,7 @@ def delete_goal(goal_id):
         
         db.session.delete(goal)
         db.session.commit()
+        report_cache.invalidate(current_user_id)
         
         return jsonify({'message': 'Goal deleted successfully'}), 200
     except Exception as e:
@@ -152,24 +166,62 @@ def contribute_to_goal(goal_id):
             return jsonify({'error': 'Goal not found'}), 404
         
         data = request.get_json()
-        amount = float(data.get('amount', 0))
+        try:
+            amount_cents = to_cents(data.get('amount', 0))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        if amount <= 0:
+        if amount_cents <= 0:
             return jsonify({'error': 'Amount must be positive'}), 400
         
-        goal.saved_amount = float(goal.saved_amount) + amount
+        # Increment in SQL so concurrent contributions cannot overwrite each other
+        goal.saved_amount_cents = SavingsGoal.saved_amount_cents + amount_cents
+        db.session.add(GoalContribution(goal_id=goal.goal_id, user_id=current_user_id, amount_cents=amount_cents))
         db.session.commit()
+        report_cache.invalidate(current_user_id)
         
         return jsonify({
             'message': 'Contribution added successfully',
             'goal': {
                 'goal_id': goal.goal_id,
                 'name': goal.title,
-                'target_amount': float(goal.target_amount),
-                'current_amount': float(goal.saved_amount),
+                'target_amount': to_amount(goal.target_amount_cents),
+                'current_amount': to_amount(goal.saved_amount_cents),
                 'deadline': goal.deadline.strftime('%Y-%m-%d') if goal.deadline else None
             }
         }), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
+
+@goals_bp.route('/<int:goal_id>/contributions', methods=['GET'])
+@jwt_required()
+def get_contributions(goal_id):
+    try:
+        current_user_id = int(get_jwt_identity())
+        goal = SavingsGoal.query.filter_by(
+            goal_id=goal_id,
+            user_id=current_user_id
+        ).first()
+        
+        if not goal:
+            return jsonify({'error': 'Goal not found'}), 404
+        
+        contributions = GoalContribution.query.filter_by(
+            user_id=current_user_id,
+            goal_id=goal_id
+        ).order_by(GoalContribution.contributed_at.desc(), GoalContribution.contribution_id.desc()).all()
+        
+        return jsonify({'contributions': [c.to_dict() for c in contributions]}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@goals_bp.route('/projections', methods=['GET'])
+@jwt_required()
+def get_projections():
+    try:
+        current_user_id = int(get_jwt_identity())
+        
+        return jsonify({'projections': goal_projections(current_user_id)}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
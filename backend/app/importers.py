@@ -0,0 +1,111 @@
+import codecs
+import csv
+import io
+import re
+from datetime import date, datetime
+from app.money import Money
+
+# Parsers for POST /api/transactions/bulk. Each one yields (row_number, raw)
+# pairs lazily so uploads are validated as they are read, never held whole.
+
+OFX_TRANSACTION = re.compile(r'<STMTTRN>(.*?)</STMTTRN>', re.DOTALL | re.IGNORECASE)
+OFX_FIELD = re.compile(r'<(\w+)>([^<\r\n]*)')
+
+
+def iter_json_rows(items):
+    for number, item in enumerate(items, start=1):
+        yield number, item
+
+
+def iter_csv_rows(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(text)
+    # Row 1 is the header, so data rows are numbered from 2 like a spreadsheet
+    for number, row in enumerate(reader, start=2):
+        yield number, row
+
+
+def iter_ofx_rows(stream, expense_category_id, income_category_id):
+    """Yield rows from the <STMTTRN> blocks of an OFX (SGML or XML) statement.
+
+    OFX carries no categories, so every expense and every income row is filed
+    under the category ids supplied with the upload.
+    """
+    buffer = ''
+    number = 0
+    for text in _iter_text(stream):
+        buffer += text
+        last_end = 0
+        for match in OFX_TRANSACTION.finditer(buffer):
+            number += 1
+            last_end = match.end()
+            fields = {key.upper(): value.strip() for key, value in OFX_FIELD.findall(match.group(1))}
+            yield number, _ofx_to_row(fields, expense_category_id, income_category_id)
+        buffer = buffer[last_end:]
+
+
+def _iter_text(stream):
+    # Incremental, so a character split across two reads is decoded whole
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    for chunk in iter(lambda: stream.read(64 * 1024), b''):
+        yield decoder.decode(chunk)
+    yield decoder.decode(b'', final=True)
+
+
+def _ofx_to_row(fields, expense_category_id, income_category_id):
+    amount = fields.get('TRNAMT', '')
+    try:
+        is_expense = float(amount) < 0
+    except ValueError:
+        return {'amount': amount}
+
+    posted = fields.get('DTPOSTED', '')[:8]
+    return {
+        'type': 'expense' if is_expense else 'income',
+        'amount': amount.lstrip('-'),
+        'category_id': expense_category_id if is_expense else income_category_id,
+        'date': f'{posted[:4]}-{posted[4:6]}-{posted[6:8]}' if len(posted) == 8 else None,
+        'notes': fields.get('MEMO') or fields.get('NAME', '')
+    }
+
+
+def validate_row(raw, user_id, categories, currency):
+    """Turn a raw row into insert values, raising ValueError with a message.
+
+    `categories` maps every category id the user may use to its type.
+    """
+    if not isinstance(raw, dict):
+        raise ValueError('Row must be an object')
+
+    if not raw.get('type') or not raw.get('amount') or not raw.get('category_id'):
+        raise ValueError('Type, amount, and category are required')
+
+    if raw['type'] not in ['income', 'expense']:
+        raise ValueError('Type must be either income or expense')
+
+    amount_cents = Money.parse(raw['amount'], currency).cents
+    if amount_cents <= 0:
+        raise ValueError('Amount must be positive')
+
+    try:
+        category_id = int(raw['category_id'])
+    except (TypeError, ValueError):
+        raise ValueError('Category must be an id')
+    if category_id not in categories:
+        raise ValueError('Category not found')
+    if categories[category_id] != raw['type']:
+        raise ValueError(f'Category is not an {raw["type"]} category')
+
+    try:
+        transaction_date = date.fromisoformat(raw['date'][:10]) if raw.get('date') else datetime.utcnow().date()
+    except (TypeError, ValueError):
+        raise ValueError('Date must be in YYYY-MM-DD format')
+
+    return {
+        'user_id': user_id,
+        'type': raw['type'],
+        'amount_cents': amount_cents,
+        'category_id': category_id,
+        'date': transaction_date,
+        'notes': raw.get('notes') or ''
+    }
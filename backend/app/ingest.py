@@ -0,0 +1,335 @@
+import fcntl
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+from datetime import date, datetime
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.exc import DataError, IntegrityError
+from app import db, rollups
+from app.cache import MemoryBackend, report_cache
+from app.models import Transaction, IngestReceipt
+from app.sharding import shard_router
+
+# Write-behind ingestion for POST /api/transactions/ingest. A validated row is
+# appended to a local journal (fsynced, in groups, before the 202 goes out)
+# and queued; one writer thread per process inserts queued rows every
+# INGEST_BATCH_ROWS rows or INGEST_BATCH_MS milliseconds, in one commit per
+# shard together with an ingest_receipts row each and the rollup deltas.
+#
+# Each process journals to its own directory under INGEST_JOURNAL_DIR, held
+# with an flock. A process starting up adopts the directories of processes
+# that are gone and replays them; receipts already in ingest_receipts are
+# skipped, so a row is never posted twice however often it is replayed.
+# Journal segments are deleted once every row in them is committed.
+#
+# Accepted receipts are marked pending until their row is committed, in the
+# report cache's Redis when it has one (so any worker can answer for them),
+# otherwise per process; the status endpoint returns 404 for receipt ids
+# that are neither committed nor marked.
+
+PENDING_TTL = 24 * 3600
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Journal:
+    """Append-only JSON-lines log of accepted rows, split into segments."""
+
+    def __init__(self, root, segment_bytes, fsync):
+        self.root = root
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.directory = os.path.join(root, '%d-%s' % (os.getpid(), uuid.uuid4().hex[:8]))
+        os.makedirs(self.directory)
+        self.owner = open(os.path.join(self.directory, 'lock'), 'w')
+        fcntl.flock(self.owner, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+        self.seq = 0
+        self.synced = 0
+        self.outstanding = set()  # seqs written and not yet committed
+        self.segments = []  # [path, last seq written to it]
+        self.file = None
+        self._open_segment()
+
+    def _open_segment(self):
+        path = os.path.join(self.directory, 'segment-%012d.log' % (self.seq + 1))
+        self.file = open(path, 'a', encoding='utf-8')
+        self.segments.append([path, self.seq])
+
+    def append(self, entries):
+        """Write entries and return their sequence numbers once they are durable."""
+        with self.lock:
+            seqs = []
+            for entry in entries:
+                self.seq += 1
+                self.file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+                seqs.append(self.seq)
+            self.outstanding.update(seqs)
+            self.file.flush()
+            self.segments[-1][1] = self.seq
+        if self.fsync and seqs:
+            self._sync(seqs[-1])
+        return seqs
+
+    def _sync(self, seq):
+        # Group commit: one fsync covers every append written before it started
+        with self.sync_lock:
+            if self.synced >= seq:
+                return
+            with self.lock:
+                target = self.seq
+                fd = self.file.fileno()
+            os.fsync(fd)
+            self.synced = target
+
+    def checkpoint(self, committed):
+        """Record the seqs in `committed` as done, start a new segment if the
+        current one is full, and delete every segment below the oldest row
+        still outstanding. Rows may reach the writer out of seq order (a
+        request thread appends, then queues), so the oldest outstanding row
+        decides, not the newest committed one."""
+        with self.sync_lock, self.lock:
+            self.outstanding.difference_update(committed)
+            if self.file.tell() >= self.segment_bytes:
+                self.file.close()
+                self._open_segment()
+            safe = min(self.outstanding) - 1 if self.outstanding else self.seq
+            while len(self.segments) > 1 and self.segments[0][1] <= safe:
+                os.remove(self.segments.pop(0)[0])
+
+    def adopt_orphans(self):
+        """Move the entries journaled by processes that are gone into this
+        journal, deleting their directories; returns [(seq, entry)]."""
+        adopted = []
+        for name in sorted(os.listdir(self.root)):
+            directory = os.path.join(self.root, name)
+            if directory == self.directory or not os.path.isdir(directory):
+                continue
+            try:
+                with open(os.path.join(directory, 'lock'), 'a') as owner:
+                    try:
+                        fcntl.flock(owner, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue  # a live process, or another one adopting it
+                    entries = []
+                    for segment in sorted(f for f in os.listdir(directory) if f.startswith('segment-')):
+                        with open(os.path.join(directory, segment), encoding='utf-8') as lines:
+                            for line in lines:
+                                try:
+                                    entries.append(json.loads(line))
+                                except ValueError:
+                                    break  # torn final write; it was never acknowledged
+                    # Durable here before the orphan is removed
+                    adopted.extend(zip(self.append(entries), entries))
+                    if not self.fsync:
+                        self._sync(self.seq)
+                    shutil.rmtree(directory)
+            except FileNotFoundError:
+                continue  # adopted by another process meanwhile
+        return adopted
+
+    def close(self, remove=False):
+        """Close the journal; `remove` deletes it, for when every row is committed."""
+        with self.lock:
+            self.file.close()
+        if remove:
+            shutil.rmtree(self.directory)
+        self.owner.close()
+
+
+class IngestQueue:
+    def __init__(self):
+        self.thread = None
+        self.journal = None
+        self.pending = queue.Queue()
+        self.slots = None
+        self.stopped = threading.Event()
+        self.accepted = MemoryBackend()
+
+    @property
+    def enabled(self):
+        return self.thread is not None
+
+    def init_app(self, app):
+        if not app.config['INGEST_ENABLED'] or self.thread is not None:
+            return
+        root = app.config['INGEST_JOURNAL_DIR']
+        os.makedirs(root, exist_ok=True)
+        self.journal = Journal(root, app.config['INGEST_JOURNAL_SEGMENT_BYTES'], app.config['INGEST_JOURNAL_FSYNC'])
+        self.slots = threading.BoundedSemaphore(app.config['INGEST_QUEUE_SIZE'])
+        if app.config['REPORT_CACHE_BACKEND'] == 'redis':
+            self.accepted = report_cache.backend
+        else:
+            self.accepted = MemoryBackend(max(2 * app.config['INGEST_QUEUE_SIZE'], 1024))
+        # Replayed rows were accepted before the restart and take no slot
+        for seq, entry in self.journal.adopt_orphans():
+            self._mark(entry)
+            self.pending.put((seq, entry, False))
+        self.stopped.clear()
+        self.thread = threading.Thread(
+            target=self.run,
+            args=(app, app.config['INGEST_BATCH_ROWS'], app.config['INGEST_BATCH_MS'] / 1000),
+            name='ingest-writer',
+            daemon=True
+        )
+        self.thread.start()
+
+    @staticmethod
+    def _key(user_id, receipt_id):
+        return f'ingest:{user_id}:{receipt_id}'
+
+    def _mark(self, entry):
+        self.accepted.set(self._key(entry['user_id'], entry['receipt_id']), '1', ex=PENDING_TTL)
+
+    def is_pending(self, user_id, receipt_id):
+        """True if the receipt was accepted and is not committed yet."""
+        return self.accepted.get(self._key(user_id, receipt_id)) is not None
+
+    def submit(self, user_id, values, receipt_id):
+        """Journal and queue one validated row; raises QueueFull under backpressure."""
+        if not self.slots.acquire(blocking=False):
+            raise QueueFull()
+        entry = {'receipt_id': receipt_id, 'user_id': user_id, 'values': dict(values, date=values['date'].isoformat())}
+        try:
+            seq, = self.journal.append([entry])
+        except Exception:
+            self.slots.release()
+            raise
+        self._mark(entry)
+        self.pending.put((seq, entry, True))
+
+    def _collect(self, rows, wait):
+        try:
+            batch = [self.pending.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + wait
+        while len(batch) < rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self, app, rows, wait):
+        while not self.stopped.is_set() or not self.pending.empty():
+            batch = self._collect(rows, wait)
+            if not batch:
+                continue
+            delay = 0.1
+            with app.app_context():
+                while True:
+                    try:
+                        write([entry for _, entry, _ in batch])
+                        break
+                    except Exception:
+                        # The rows are journaled; keep retrying until the database is back
+                        db.session.rollback()
+                        app.logger.exception('Ingest batch of %d rows failed, retrying', len(batch))
+                        time.sleep(delay)
+                        delay = min(delay * 2, 5)
+            # Unmarked only after write() sent the users' reads to the primary,
+            # so a status read always finds the mark or the receipt
+            for _, entry, _ in batch:
+                self.accepted.delete(self._key(entry['user_id'], entry['receipt_id']))
+            self.journal.checkpoint([seq for seq, _, _ in batch])
+            for _, _, counted in batch:
+                if counted:
+                    self.slots.release()
+
+    def stop(self):
+        """Commit everything queued, then stop the writer."""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+            self.journal.close(remove=True)
+
+
+ingest_queue = IngestQueue()
+
+
+def _insert(entries):
+    """Insert the entries not yet posted, with their receipts; returns the
+    transaction rows inserted."""
+    keys = [(entry['user_id'], entry['receipt_id']) for entry in entries]
+    done = set(db.session.execute(
+        select(IngestReceipt.user_id, IngestReceipt.receipt_id).where(
+            tuple_(IngestReceipt.user_id, IngestReceipt.receipt_id).in_(keys)
+        )
+    ).all())
+    fresh = []
+    for key, entry in zip(keys, entries):
+        # Replayed and resubmitted receipts are posted once
+        if key not in done:
+            done.add(key)
+            fresh.append(entry)
+    if not fresh:
+        return []
+
+    rows = [dict(entry['values'], date=date.fromisoformat(entry['values']['date'])) for entry in fresh]
+    table = Transaction.__table__
+    ids = db.session.execute(
+        insert(table).returning(table.c.transaction_id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+    now = datetime.utcnow()
+    db.session.execute(insert(IngestReceipt.__table__), [{
+        'user_id': entry['user_id'],
+        'receipt_id': entry['receipt_id'],
+        'transaction_id': transaction_id,
+        'committed_at': now
+    } for entry, transaction_id in zip(fresh, ids)])
+    return rows
+
+
+def _commit(entries):
+    deltas = rollups.Deltas()
+    for row in _insert(entries):
+        deltas.add(row['user_id'], row['date'], row['category_id'], row['type'], row['amount_cents'])
+    deltas.apply()
+    db.session.commit()
+
+
+def _record_failure(entry, error):
+    db.session.execute(insert(IngestReceipt.__table__).values(
+        user_id=entry['user_id'],
+        receipt_id=entry['receipt_id'],
+        error=error,
+        committed_at=datetime.utcnow()
+    ))
+    db.session.commit()
+
+
+def write(entries):
+    """Commit queued entries, one transaction per shard. When the database
+    rejects a batch, its rows are retried one by one and those rejected again
+    get a failed receipt; any other error propagates for the batch to retry."""
+    groups = {}
+    for entry in entries:
+        key = shard_router.shard_for(entry['user_id']) if shard_router.enabled else None
+        groups.setdefault(key, []).append(entry)
+
+    for key, group in groups.items():
+        with shard_router.using(key):
+            try:
+                _commit(group)
+            except (IntegrityError, DataError):
+                db.session.rollback()
+                for entry in group:
+                    try:
+                        _commit([entry])
+                    except (IntegrityError, DataError) as e:
+                        db.session.rollback()
+                        _record_failure(entry, str(e.orig))
+        for user_id in {entry['user_id'] for entry in group}:
+            report_cache.invalidate(user_id)
@@ -0,0 +1,136 @@
+import cProfile
+import os
+import random
+import threading
+import time
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+
+# Opt-in request instrumentation (INSTRUMENTATION_ENABLED). Records wall time,
+# SQL statement count and SQL time per request, returns them as a Server-Timing
+# header, aggregates per-blueprint histograms for Prometheus at /metrics, and
+# dumps cProfile stats for sampled requests slower than PROFILE_THRESHOLD_MS.
+# Metrics are per process; scrape every worker.
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = {}
+        self.sql_time = {}
+        self.requests = {}
+        self.sql_statements = {}
+
+    def record(self, blueprint, method, status, duration, sql_count, sql_time):
+        with self.lock:
+            self.latency.setdefault(blueprint, Histogram()).observe(duration)
+            self.sql_time.setdefault(blueprint, Histogram()).observe(sql_time)
+            key = (blueprint, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.sql_statements[blueprint] = self.sql_statements.get(blueprint, 0) + sql_count
+
+    def _histogram_lines(self, name, histograms):
+        lines = [f'# TYPE {name} histogram']
+        for blueprint, histogram in sorted(histograms.items()):
+            for bound, count in zip(BUCKETS, histogram.counts):
+                lines.append(f'{name}_bucket{{blueprint="{blueprint}",le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{blueprint="{blueprint}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{name}_sum{{blueprint="{blueprint}"}} {histogram.total:.6f}')
+            lines.append(f'{name}_count{{blueprint="{blueprint}"}} {histogram.count}')
+        return lines
+
+    def render(self):
+        with self.lock:
+            lines = self._histogram_lines('http_request_duration_seconds', self.latency)
+            lines += self._histogram_lines('http_request_sql_duration_seconds', self.sql_time)
+            lines.append('# TYPE http_requests_total counter')
+            for (blueprint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{{blueprint="{blueprint}",method="{method}",status="{status}"}} {count}')
+            lines.append('# TYPE sql_statements_total counter')
+            for blueprint, count in sorted(self.sql_statements.items()):
+                lines.append(f'sql_statements_total{{blueprint="{blueprint}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+class Instrumentation:
+    def __init__(self):
+        self.metrics = Metrics()
+
+    def init_app(self, app, engines):
+        if not app.config['INSTRUMENTATION_ENABLED']:
+            return
+
+        self.sample_rate = app.config['PROFILE_SAMPLE_RATE']
+        self.threshold = app.config['PROFILE_THRESHOLD_MS'] / 1000.0
+        self.profile_dir = app.config['PROFILE_DIR']
+
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule('/metrics', 'metrics', self._metrics_view)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('instrumentation_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['instrumentation_start'].pop()
+        if has_request_context() and 'sql_count' in g:
+            g.sql_count += 1
+            g.sql_time += time.perf_counter() - started
+
+    def _before_request(self):
+        g.request_start = time.perf_counter()
+        g.sql_count = 0
+        g.sql_time = 0.0
+        g.profiler = None
+        if self.sample_rate and random.random() < self.sample_rate:
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    def _after_request(self, response):
+        if 'request_start' not in g:
+            return response
+        duration = time.perf_counter() - g.request_start
+
+        if g.profiler is not None:
+            g.profiler.disable()
+            if duration >= self.threshold:
+                self._dump_profile(g.profiler, duration)
+
+        blueprint = request.blueprint or 'app'
+        self.metrics.record(blueprint, request.method, response.status_code, duration, g.sql_count, g.sql_time)
+
+        response.headers.add('Server-Timing', f'app;dur={duration * 1000:.1f}')
+        response.headers.add('Server-Timing', f'db;dur={g.sql_time * 1000:.1f};desc="{g.sql_count} queries"')
+        return response
+
+    def _dump_profile(self, profiler, duration):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        endpoint = (request.endpoint or 'unknown').replace('.', '-')
+        filename = f'{int(time.time() * 1000)}-{endpoint}-{duration * 1000:.0f}ms.prof'
+        profiler.dump_stats(os.path.join(self.profile_dir, filename))
+
+    def _metrics_view(self):
+        return Response(self.metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+instrumentation = Instrumentation()
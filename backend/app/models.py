@@ -1,4 +1,6 @@
 from app import db
+from app.money import to_amount
+from app.categories import category_name
 from datetime import datetime
 
 class User(db.Model):
@@ -8,6 +10,8 @@ class User(db.Model):
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False, index=True)
     password_hash = db.Column(db.String(255), nullable=False)
+    # Bumped to revoke every token issued before (see app/tokens.py)
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -31,7 +35,7 @@ class Category(db.Model):
     name = db.Column(db.String(50), nullable=False)
     type = db.Column(db.String(10), nullable=False)  # 'income' or 'expense'
     is_custom = db.Column(db.Boolean, default=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=True)  # NULL for default categories
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=True, index=True)  # NULL for default categories
     
     transactions = db.relationship('Transaction', backref='category', lazy=True)
     budgets = db.relationship('Budget', backref='category', lazy=True)
@@ -47,14 +51,23 @@ class Category(db.Model):
 
 class Transaction(db.Model):
     __tablename__ = 'transactions'
+    __table_args__ = (
+        db.Index('ix_transactions_user_date', 'user_id', 'date'),
+        db.Index('ix_transactions_user_type_date', 'user_id', 'type', 'date'),
+        db.Index('ix_transactions_user_category_date', 'user_id', 'category_id', 'date'),
+        # Each occurrence of a recurring rule is posted at most once
+        db.Index('ux_transactions_rule_occurrence', 'recurring_rule_id', 'occurrence_date', unique=True),
+    )
     
     transaction_id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False)
     type = db.Column(db.String(10), nullable=False)  # 'income' or 'expense'
-    amount = db.Column(db.Float, nullable=False)
+    amount_cents = db.Column(db.BigInteger, nullable=False)  # minor currency units
     category_id = db.Column(db.Integer, db.ForeignKey('categories.category_id'), nullable=False)
     date = db.Column(db.Date, nullable=False, default=datetime.utcnow)
     notes = db.Column(db.Text, nullable=True)
+    recurring_rule_id = db.Column(db.Integer, db.ForeignKey('recurring_rules.rule_id'), nullable=True)
+    occurrence_date = db.Column(db.Date, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def to_dict(self):
@@ -62,22 +75,61 @@ class Transaction(db.Model):
             'transaction_id': self.transaction_id,
             'user_id': self.user_id,
             'type': self.type,
-            'amount': self.amount,
+            'amount': to_amount(self.amount_cents),
             'category_id': self.category_id,
-            'category_name': self.category.name if self.category else None,
+            'category_name': category_name(self),
             'date': self.date.isoformat(),
             'notes': self.notes,
+            'recurring_rule_id': self.recurring_rule_id,
             'created_at': self.created_at.isoformat()
         }
 
 
+class RecurringRule(db.Model):
+    __tablename__ = 'recurring_rules'
+    
+    rule_id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False, index=True)
+    type = db.Column(db.String(10), nullable=False)  # 'income' or 'expense'
+    amount_cents = db.Column(db.BigInteger, nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.category_id'), nullable=False)
+    notes = db.Column(db.Text, nullable=True)
+    frequency = db.Column(db.String(10), nullable=False)  # 'daily', 'weekly', 'monthly' or 'yearly'
+    interval = db.Column(db.Integer, nullable=False, default=1)  # every N days/weeks/months/years
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=True)
+    # First occurrence not yet posted; NULL once the rule has ended
+    next_occurrence = db.Column(db.Date, nullable=True, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    category = db.relationship('Category')
+    
+    def to_dict(self):
+        return {
+            'rule_id': self.rule_id,
+            'type': self.type,
+            'amount': to_amount(self.amount_cents),
+            'category_id': self.category_id,
+            'category_name': category_name(self),
+            'notes': self.notes,
+            'frequency': self.frequency,
+            'interval': self.interval,
+            'start_date': self.start_date.isoformat(),
+            'end_date': self.end_date.isoformat() if self.end_date else None,
+            'next_occurrence': self.next_occurrence.isoformat() if self.next_occurrence else None
+        }
+
+
 class Budget(db.Model):
     __tablename__ = 'budgets'
+    __table_args__ = (
+        db.Index('ix_budgets_user_period', 'user_id', 'year', 'month'),
+    )
     
     budget_id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('categories.category_id'), nullable=False)
-    monthly_limit = db.Column(db.Float, nullable=False)
+    monthly_limit_cents = db.Column(db.BigInteger, nullable=False)
     month = db.Column(db.Integer, nullable=False)  # 1-12
     year = db.Column(db.Integer, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -87,8 +139,8 @@ class Budget(db.Model):
             'budget_id': self.budget_id,
             'user_id': self.user_id,
             'category_id': self.category_id,
-            'category_name': self.category.name if self.category else None,
-            'monthly_limit': self.monthly_limit,
+            'category_name': category_name(self),
+            'monthly_limit': to_amount(self.monthly_limit_cents),
             'month': self.month,
             'year': self.year
         }
@@ -98,22 +150,108 @@ class SavingsGoal(db.Model):
     __tablename__ = 'savings_goals'
     
     goal_id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False, index=True)
     title = db.Column(db.String(100), nullable=False)
-    target_amount = db.Column(db.Float, nullable=False)
-    saved_amount = db.Column(db.Float, default=0.0)
+    target_amount_cents = db.Column(db.BigInteger, nullable=False)
+    saved_amount_cents = db.Column(db.BigInteger, nullable=False, default=0)
     deadline = db.Column(db.Date, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    contributions = db.relationship('GoalContribution', backref='goal', lazy=True, cascade='all, delete-orphan')
+    
     def to_dict(self):
-        progress = (self.saved_amount / self.target_amount * 100) if self.target_amount > 0 else 0
+        progress = (self.saved_amount_cents / self.target_amount_cents * 100) if self.target_amount_cents > 0 else 0
         return {
             'goal_id': self.goal_id,
             'user_id': self.user_id,
             'title': self.title,
-            'target_amount': self.target_amount,
-            'saved_amount': self.saved_amount,
+            'target_amount': to_amount(self.target_amount_cents),
+            'saved_amount': to_amount(self.saved_amount_cents),
             'progress': round(progress, 2),
             'deadline': self.deadline.isoformat() if self.deadline else None,
             'created_at': self.created_at.isoformat()
         }
+
+
+class GoalContribution(db.Model):
+    """Ledger of contributions; SavingsGoal.saved_amount_cents is their running total."""
+    __tablename__ = 'goal_contributions'
+    __table_args__ = (
+        db.Index('ix_goal_contributions_user_goal', 'user_id', 'goal_id'),
+    )
+    
+    contribution_id = db.Column(db.Integer, primary_key=True)
+    goal_id = db.Column(db.Integer, db.ForeignKey('savings_goals.goal_id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False)
+    amount_cents = db.Column(db.BigInteger, nullable=False)
+    contributed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'contribution_id': self.contribution_id,
+            'goal_id': self.goal_id,
+            'amount': to_amount(self.amount_cents),
+            'contributed_at': self.contributed_at.isoformat()
+        }
+
+
+class MonthlyCategoryTotal(db.Model):
+    __tablename__ = 'monthly_category_totals'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Integer, primary_key=True)  # 1-12
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.category_id'), primary_key=True)
+    type = db.Column(db.String(10), primary_key=True)  # 'income' or 'expense'
+    total_cents = db.Column(db.BigInteger, nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'year': self.year,
+            'month': self.month,
+            'category_id': self.category_id,
+            'type': self.type,
+            'total': to_amount(self.total_cents),
+            'count': self.count
+        }
+
+
+class DailyTotal(db.Model):
+    __tablename__ = 'daily_totals'
+    
+    # Per-day totals for day and week trend buckets (see app/rollups.py)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    type = db.Column(db.String(10), primary_key=True)  # 'income' or 'expense'
+    total_cents = db.Column(db.BigInteger, nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ReplicaHeartbeat(db.Model):
+    __tablename__ = 'replica_heartbeat'
+    
+    # One row, stamped on the primary; its age on a replica is that replica's lag (see app/replicas.py)
+    id = db.Column(db.Integer, primary_key=True)
+    beat_at = db.Column(db.Float, nullable=False)  # time.time() on the primary
+
+
+class IngestReceipt(db.Model):
+    __tablename__ = 'ingest_receipts'
+    
+    # Outcome of a row accepted by POST /api/transactions/ingest (see app/ingest.py)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), primary_key=True)
+    receipt_id = db.Column(db.String(64), primary_key=True)
+    transaction_id = db.Column(db.Integer, nullable=True)  # None when the row was rejected
+    error = db.Column(db.Text, nullable=True)
+    committed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'receipt_id': self.receipt_id,
+            'status': 'failed' if self.error else 'committed',
+            'transaction_id': self.transaction_id,
+            'error': self.error,
+            'committed_at': self.committed_at.isoformat()
+        }
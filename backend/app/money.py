@@ -0,0 +1,112 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from flask import current_app, has_app_context
+
+# Amounts are stored as integers in the currency's minor unit ("cents", even
+# for currencies with zero or three decimals) so SQL aggregation is exact.
+# Money converts at the API edge: request values are parsed with Decimal,
+# never float arithmetic, and responses render the exact decimal value.
+
+MINOR_UNITS = {
+    'BHD': 3, 'JOD': 3, 'KWD': 3, 'OMR': 3, 'TND': 3,
+    'JPY': 0, 'KRW': 0, 'VND': 0, 'CLP': 0, 'ISK': 0,
+}
+DEFAULT_MINOR_UNITS = 2
+MAX_CENTS = 2 ** 63 - 1
+
+
+def default_currency():
+    if has_app_context():
+        return current_app.config['CURRENCY']
+    return 'USD'
+
+
+class Money:
+    __slots__ = ('cents', 'currency')
+
+    def __init__(self, cents, currency=None):
+        self.cents = int(cents)
+        self.currency = currency or default_currency()
+
+    @staticmethod
+    def exponent(currency):
+        return MINOR_UNITS.get(currency, DEFAULT_MINOR_UNITS)
+
+    @classmethod
+    def parse(cls, value, currency=None):
+        """Parse a request value ('12.34', 12.34, 12) into Money, rounding half up."""
+        currency = currency or default_currency()
+        if isinstance(value, bool):
+            raise ValueError('Amount must be a number')
+        try:
+            amount = Decimal(str(value).strip())
+        except (InvalidOperation, TypeError):
+            raise ValueError('Amount must be a number')
+        if not amount.is_finite():
+            raise ValueError('Amount must be a number')
+        scaled = amount.scaleb(cls.exponent(currency))
+        if abs(scaled) > MAX_CENTS:
+            raise ValueError('Amount is too large')
+        return cls(scaled.quantize(Decimal(1), rounding=ROUND_HALF_UP), currency)
+
+    def to_decimal(self):
+        return Decimal(self.cents).scaleb(-self.exponent(self.currency))
+
+    def to_json(self):
+        # The float nearest an exact decimal round-trips to that decimal's text
+        return float(self.to_decimal())
+
+    def _check(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        if other.currency != self.currency:
+            raise ValueError(f'Cannot combine {self.currency} and {other.currency}')
+        return other
+
+    def __add__(self, other):
+        if self._check(other) is NotImplemented:
+            return NotImplemented
+        return Money(self.cents + other.cents, self.currency)
+
+    def __sub__(self, other):
+        if self._check(other) is NotImplemented:
+            return NotImplemented
+        return Money(self.cents - other.cents, self.currency)
+
+    def __neg__(self):
+        return Money(-self.cents, self.currency)
+
+    def __eq__(self, other):
+        return isinstance(other, Money) and (self.cents, self.currency) == (other.cents, other.currency)
+
+    def __hash__(self):
+        return hash((self.cents, self.currency))
+
+    def __repr__(self):
+        return f'Money({self.to_decimal()} {self.currency})'
+
+
+def to_cents(value):
+    """Request value -> integer minor units in the configured currency."""
+    return Money.parse(value).cents
+
+
+def to_amount(cents):
+    """Stored integer minor units -> JSON number."""
+    return Money(cents or 0).to_json()
+
+
+def amount_formatter(currency=None):
+    """to_amount() for many values, looking the currency up once.
+
+    Dividing two exactly representable integers is correctly rounded, so this
+    gives the same float as Money.to_json() (which goes through Decimal).
+    """
+    currency = currency or default_currency()
+    scale = 10 ** Money.exponent(currency)
+
+    def format_amount(cents):
+        cents = cents or 0
+        if abs(cents) >= 2 ** 53:
+            return Money(cents, currency).to_json()
+        return cents / scale
+    return format_amount
@@ -0,0 +1,96 @@
+import multiprocessing
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Password hashing on a bounded pool (PASSWORD_HASH_POOL). The request
+# thread still waits for its hash, so the pool does not free request threads:
+# it caps how many hashes run at once (and, with 'process', moves them out of
+# the GIL). At most workers + PASSWORD_HASH_QUEUE_SIZE may be in flight;
+# further callers wait PASSWORD_HASH_WAIT seconds for a slot and then get
+# HasherBusy, so a login storm is shed with 503s instead of piling up behind
+# the hash cost. Verification understands every supported format,
+# so changing the algorithm or cost only affects new hashes, and login
+# upgrades old ones via needs_rehash().
+
+ALGORITHMS = ('pbkdf2', 'bcrypt')
+BCRYPT_PREFIX = re.compile(r'^\$2[aby]\$(\d\d)\$')
+# bcrypt only reads the first 72 bytes; truncate explicitly as bcrypt < 5 did
+BCRYPT_MAX_BYTES = 72
+
+
+class HasherBusy(Exception):
+    pass
+
+
+def _hash(algorithm, cost, password):
+    if algorithm == 'bcrypt':
+        import bcrypt
+        return bcrypt.hashpw(password.encode()[:BCRYPT_MAX_BYTES], bcrypt.gensalt(cost)).decode()
+    return generate_password_hash(password, method=f'pbkdf2:sha256:{cost}')
+
+
+def _verify(password_hash, password):
+    if BCRYPT_PREFIX.match(password_hash):
+        import bcrypt
+        return bcrypt.checkpw(password.encode()[:BCRYPT_MAX_BYTES], password_hash.encode())
+    return check_password_hash(password_hash, password)
+
+
+class PasswordHasher:
+    def __init__(self):
+        self.executor = None
+        self.slots = None
+        self.lock = threading.Lock()
+
+    def init_app(self, app):
+        self.algorithm = app.config['PASSWORD_HASH_ALGORITHM']
+        if self.algorithm not in ALGORITHMS:
+            raise ValueError(f'PASSWORD_HASH_ALGORITHM must be one of {", ".join(ALGORITHMS)}')
+        self.cost = app.config['PASSWORD_BCRYPT_ROUNDS'] if self.algorithm == 'bcrypt' else app.config['PASSWORD_PBKDF2_ITERATIONS']
+        self.pool = app.config['PASSWORD_HASH_POOL']
+        self.workers = app.config['PASSWORD_HASH_WORKERS']
+        self.wait = app.config['PASSWORD_HASH_WAIT']
+        self.slots = threading.BoundedSemaphore(self.workers + app.config['PASSWORD_HASH_QUEUE_SIZE'])
+        self.shutdown()
+
+    def _executor(self):
+        # Created lazily so a process pool is never started before gunicorn forks
+        with self.lock:
+            if self.executor is None:
+                if self.pool == 'process':
+                    self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+                else:
+                    self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix='password-hash')
+            return self.executor
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+                self.executor = None
+
+    def _run(self, fn, *args):
+        if not self.slots.acquire(timeout=self.wait):
+            raise HasherBusy('Too many password operations in progress, retry shortly')
+        try:
+            return self._executor().submit(fn, *args).result()
+        finally:
+            self.slots.release()
+
+    def hash(self, password):
+        return self._run(_hash, self.algorithm, self.cost, password)
+
+    def verify(self, password_hash, password):
+        return self._run(_verify, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True when the hash was made with another algorithm or cost than configured."""
+        match = BCRYPT_PREFIX.match(password_hash)
+        if self.algorithm == 'bcrypt':
+            return not match or int(match.group(1)) != self.cost
+        return not password_hash.startswith(f'pbkdf2:sha256:{self.cost}$')
+
+
+password_hasher = PasswordHasher()
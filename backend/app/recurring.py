@@ -0,0 +1,178 @@
+from flask import Blueprint, request, jsonify, current_app
+from app import db
+from app.models import RecurringRule, Transaction
+from app.categories import category_registry
+from app.money import to_cents
+from app.scheduler import FREQUENCIES, materialize, next_occurrence_after
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from datetime import date, datetime
+from sqlalchemy import update, func
+
+recurring_bp = Blueprint('recurring', __name__)
+
+def _parse_date(value):
+    return date.fromisoformat(value[:10]) if value else None
+
+def _catch_up(user_id, rule):
+    """Post whatever of the committed rule is already due (a start date in the
+    past). The rule is saved either way: on failure the scheduler posts the
+    occurrences on its next run, so the request still succeeds."""
+    try:
+        materialize(user_id=user_id)
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('Posting due occurrences of recurring rule %d failed', rule.rule_id)
+    db.session.refresh(rule)
+
+@recurring_bp.route('/', methods=['GET'])
+@jwt_required()
+def get_rules():
+    try:
+        current_user_id = int(get_jwt_identity())
+        rules = RecurringRule.query.filter_by(user_id=current_user_id).order_by(RecurringRule.rule_id).all()
+        
+        return jsonify({'rules': [rule.to_dict() for rule in rules]}), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@recurring_bp.route('/', methods=['POST'])
+@jwt_required()
+def create_rule():
+    try:
+        current_user_id = int(get_jwt_identity())
+        data = request.get_json()
+        
+        if not data or not data.get('type') or not data.get('amount') or not data.get('category_id') or not data.get('frequency'):
+            return jsonify({'error': 'Type, amount, category and frequency are required'}), 400
+        
+        if data['type'] not in ['income', 'expense']:
+            return jsonify({'error': 'Type must be either income or expense'}), 400
+        
+        if data['frequency'] not in FREQUENCIES:
+            return jsonify({'error': f'Frequency must be one of {", ".join(FREQUENCIES)}'}), 400
+        
+        try:
+            amount_cents = to_cents(data['amount'])
+            interval = int(data.get('interval', 1))
+            start_date = _parse_date(data.get('start_date')) or datetime.utcnow().date()
+            end_date = _parse_date(data.get('end_date'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if amount_cents <= 0:
+            return jsonify({'error': 'Amount must be positive'}), 400
+        if interval < 1:
+            return jsonify({'error': 'Interval must be at least 1'}), 400
+        if end_date and end_date < start_date:
+            return jsonify({'error': 'End date must not be before the start date'}), 400
+        
+        error = category_registry.validate(current_user_id, data['category_id'], data['type'])
+        if error:
+            return jsonify({'error': error}), 400
+        
+        rule = RecurringRule(
+            user_id=current_user_id,
+            type=data['type'],
+            amount_cents=amount_cents,
+            category_id=data['category_id'],
+            notes=data.get('notes', ''),
+            frequency=data['frequency'],
+            interval=interval,
+            start_date=start_date,
+            end_date=end_date,
+            next_occurrence=start_date
+        )
+        
+        db.session.add(rule)
+        db.session.commit()
+        
+        _catch_up(current_user_id, rule)
+        
+        return jsonify({
+            'message': 'Recurring rule created successfully',
+            'rule': rule.to_dict()
+        }), 201
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@recurring_bp.route('/<int:rule_id>', methods=['PUT'])
+@jwt_required()
+def update_rule(rule_id):
+    """Change future occurrences; transactions already posted are left as they are."""
+    try:
+        current_user_id = int(get_jwt_identity())
+        rule = RecurringRule.query.filter_by(rule_id=rule_id, user_id=current_user_id).first()
+        
+        if not rule:
+            return jsonify({'error': 'Recurring rule not found'}), 404
+        
+        data = request.get_json()
+        
+        try:
+            if data.get('amount'):
+                rule.amount_cents = to_cents(data['amount'])
+                if rule.amount_cents <= 0:
+                    return jsonify({'error': 'Amount must be positive'}), 400
+            if 'end_date' in data:
+                rule.end_date = _parse_date(data['end_date'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if data.get('category_id'):
+            error = category_registry.validate(current_user_id, data['category_id'], rule.type)
+            if error:
+                return jsonify({'error': error}), 400
+            rule.category_id = data['category_id']
+        if 'notes' in data:
+            rule.notes = data['notes']
+        
+        if 'end_date' in data:
+            if rule.next_occurrence is None:
+                # An ended rule whose end date moved later (or was cleared)
+                # resumes after the last occurrence it posted
+                last_posted = db.session.query(func.max(Transaction.occurrence_date)).filter(
+                    Transaction.recurring_rule_id == rule.rule_id
+                ).scalar()
+                rule.next_occurrence = next_occurrence_after(rule, last_posted)
+            elif rule.end_date and rule.next_occurrence > rule.end_date:
+                rule.next_occurrence = None
+        
+        db.session.commit()
+        
+        if 'end_date' in data:
+            _catch_up(current_user_id, rule)
+        
+        return jsonify({
+            'message': 'Recurring rule updated successfully',
+            'rule': rule.to_dict()
+        }), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@recurring_bp.route('/<int:rule_id>', methods=['DELETE'])
+@jwt_required()
+def delete_rule(rule_id):
+    """Stop the rule; transactions it already posted are kept."""
+    try:
+        current_user_id = int(get_jwt_identity())
+        rule = RecurringRule.query.filter_by(rule_id=rule_id, user_id=current_user_id).first()
+        
+        if not rule:
+            return jsonify({'error': 'Recurring rule not found'}), 404
+        
+        db.session.execute(
+            update(Transaction).where(Transaction.recurring_rule_id == rule_id).values(recurring_rule_id=None)
+        )
+        db.session.delete(rule)
+        db.session.commit()
+        
+        return jsonify({'message': 'Recurring rule deleted successfully'}), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
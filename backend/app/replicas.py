@@ -0,0 +1,200 @@
+import itertools
+import threading
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import select, update, insert
+from sqlalchemy.sql.dml import UpdateBase
+from app.cache import MemoryBackend
+
+# Optional read replicas of the default database (REPLICA_DATABASE_URLS,
+# bound as replica0, replica1, ...). GET requests to the read-only endpoints
+# below run their queries on a replica; everything else, and every write,
+# uses the primary. With sharding on, user-owned tables still go to their
+# shard, so replicas then serve only users and categories.
+#
+# Lag is measured with a heartbeat: beat() stamps replica_heartbeat on the
+# primary, and a replica's lag is how old the stamp it has replicated is.
+# Replicas further behind than REPLICA_MAX_LAG_SECONDS, or unreachable, are
+# skipped. A user who has just written (any successful non-GET request, or
+# report_cache.invalidate() from the scheduler and other writers) reads from
+# the primary until a replica has a heartbeat newer than the write, or
+# REPLICA_STICKY_SECONDS pass.
+
+READ_BLUEPRINTS = ('reports', 'transactions', 'budgets', 'goals')
+READ_ENDPOINTS = ('auth.get_current_user',)
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+HEARTBEAT_ID = 1
+
+
+def replica_urls(config):
+    return config.get('REPLICA_DATABASE_URLS', '').replace(',', ' ').split()
+
+
+def replica_binds(config):
+    """SQLALCHEMY_BINDS entries for the configured replicas."""
+    from app.db_tuning import engine_options
+    return {
+        'replica%d' % i: dict(engine_options(config, url), url=url)
+        for i, url in enumerate(replica_urls(config))
+    }
+
+
+def read_only_request():
+    return request.method in SAFE_METHODS and (
+        request.blueprint in READ_BLUEPRINTS or request.endpoint in READ_ENDPOINTS
+    )
+
+
+def _request_user():
+    from flask_jwt_extended import get_jwt_identity
+    try:
+        identity = get_jwt_identity()
+    except RuntimeError:
+        return None
+    return int(identity) if identity is not None else None
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self.names = []
+        self.max_lag = 5
+        self.sticky = 30
+        self.check_interval = 1
+        self.writes = MemoryBackend()
+        self.beats = {}
+        self.checked_at = None
+        self.lock = threading.Lock()
+        self.turn = itertools.count()
+
+    @property
+    def enabled(self):
+        return bool(self.names)
+
+    def init_app(self, app):
+        self.names = list(replica_binds(app.config))
+        self.beats = {}
+        self.checked_at = None
+        if not self.enabled:
+            return
+        self.max_lag = app.config['REPLICA_MAX_LAG_SECONDS']
+        self.sticky = app.config['REPLICA_STICKY_SECONDS']
+        self.check_interval = app.config['REPLICA_LAG_CHECK_SECONDS']
+        # Recent writes must be seen by every worker, so they are shared in
+        # the report cache's Redis; kept in memory only for a single process
+        from app.cache import report_cache
+        if app.config['REPORT_CACHE_BACKEND'] == 'redis':
+            self.writes = report_cache.backend
+        elif app.config.get('SERVER_PROCESSES', 1) > 1:
+            raise ValueError('REPLICA_DATABASE_URLS with several workers needs REPORT_CACHE_BACKEND=redis')
+        else:
+            self.writes = MemoryBackend(app.config['REPLICA_STICKY_MAX_USERS'])
+        app.after_request(self.after_request)
+
+    def heartbeats(self):
+        """Heartbeat (time.time() on the primary) each replica has, or None
+        when it cannot be read; refreshed every REPLICA_LAG_CHECK_SECONDS."""
+        now = time.monotonic()
+        with self.lock:
+            if self.checked_at is not None and now - self.checked_at < self.check_interval:
+                return self.beats
+            self.checked_at = now
+        from app import db
+        from app.models import ReplicaHeartbeat
+        beats = {}
+        for name in self.names:
+            try:
+                with db.engines[name].connect() as connection:
+                    beats[name] = connection.execute(
+                        select(ReplicaHeartbeat.beat_at).where(ReplicaHeartbeat.id == HEARTBEAT_ID)
+                    ).scalar()
+            except Exception:
+                beats[name] = None
+        self.beats = beats
+        return beats
+
+    def choose(self, user_id):
+        """Bind key of a replica fresh enough for `user_id`, or None for the primary."""
+        now = time.time()
+        since = self.writes.get(f'replica:{user_id}:write')
+        since = float(since) if since is not None else None
+        fresh = [
+            name for name, beat in self.heartbeats().items()
+            if beat is not None and now - beat <= self.max_lag and (since is None or beat > since)
+        ]
+        if not fresh:
+            return None
+        return fresh[next(self.turn) % len(fresh)]
+
+    def for_request(self):
+        """The replica this request reads from, decided on its first query once
+        the user is known. Queries made while the token is still being checked
+        (the revocation lookup) read from the primary."""
+        if not has_request_context():
+            return None
+        if '_replica' not in g:
+            if not read_only_request():
+                g._replica = None
+            else:
+                user_id = _request_user()
+                if user_id is None:
+                    return None
+                g._replica = self.choose(user_id)
+        return g._replica
+
+    def for_statement(self, clause, flushing):
+        if flushing or isinstance(clause, UpdateBase):
+            return None
+        return self.for_request()
+
+    def wrote(self, user_id):
+        """Keep the user's reads off replicas that have not seen this moment yet."""
+        if self.enabled:
+            self.writes.set(f'replica:{user_id}:write', repr(time.time()), ex=self.sticky)
+
+    def after_request(self, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            user_id = _request_user()
+            if user_id is not None:
+                self.wrote(user_id)
+        return response
+
+
+replica_router = ReplicaRouter()
+
+
+def beat():
+    """Stamp the heartbeat on the primary."""
+    from app import db
+    from app.models import ReplicaHeartbeat
+    table = ReplicaHeartbeat.__table__
+    with db.engine.begin() as connection:
+        stamped = connection.execute(update(table).where(table.c.id == HEARTBEAT_ID).values(beat_at=time.time()))
+        if not stamped.rowcount:
+            connection.execute(insert(table).values(id=HEARTBEAT_ID, beat_at=time.time()))
+
+
+def lag():
+    """Seconds each replica is behind the primary's heartbeat (None if unreadable)."""
+    replica_router.checked_at = None
+    now = time.time()
+    return {name: (now - beat if beat is not None else None) for name, beat in replica_router.heartbeats().items()}
+
+
+def sync():
+    """Replication stand-in for SQLite: beat, then copy the whole primary over
+    every replica with the online backup API. Readers of a replica see either
+    the old or the new copy, never a mix."""
+    from app import db
+    if db.engine.dialect.name != 'sqlite':
+        raise RuntimeError('The replication stand-in only copies SQLite databases')
+    beat()
+    source = db.engine.raw_connection()
+    try:
+        for name in replica_router.names:
+            target = db.engines[name].raw_connection()
+            try:
+                source.driver_connection.backup(target.driver_connection)
+            finally:
+                target.close()
+    finally:
+        source.close()
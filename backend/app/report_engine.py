@@ -0,0 +1,349 @@
+from app import db
+from app.models import Budget, MonthlyCategoryTotal, DailyTotal, SavingsGoal, GoalContribution
+from datetime import date, datetime, timedelta
+from app.money import to_amount, amount_formatter
+from app.categories import category_registry
+from flask import current_app
+from sqlalchemy import func, case, select, cast, Date, Integer
+
+# Report endpoints read the monthly_category_totals and daily_totals rollups
+# (see app/rollups.py) rather than re-aggregating raw transactions.
+
+DAYS_PER_MONTH = 365.25 / 12
+# A goal's contribution rate is never measured over less than this, so a
+# single recent contribution does not extrapolate to an absurd velocity
+MIN_VELOCITY_DAYS = 30
+
+
+def month_window(month, year):
+    if month == 12:
+        return date(year, 12, 1), date(year + 1, 1, 1)
+    return date(year, month, 1), date(year, month + 1, 1)
+
+
+def monthly_totals(user_id, year):
+    """Income and expense totals for every month of `year` in one grouped query."""
+    rows = db.session.query(
+        MonthlyCategoryTotal.month,
+        MonthlyCategoryTotal.type,
+        func.sum(MonthlyCategoryTotal.total_cents)
+    ).filter(
+        MonthlyCategoryTotal.user_id == user_id,
+        MonthlyCategoryTotal.year == year
+    ).group_by(MonthlyCategoryTotal.month, MonthlyCategoryTotal.type).all()
+
+    totals = {month: {'income': 0, 'expense': 0} for month in range(1, 13)}
+    for month, type_, total in rows:
+        totals[month][type_] = int(total or 0)
+
+    return [{
+        'month': month,
+        'income': to_amount(totals[month]['income']),
+        'expenses': to_amount(totals[month]['expense']),
+        'savings': to_amount(totals[month]['income'] - totals[month]['expense'])
+    } for month in range(1, 13)]
+
+
+def month_totals(user_id, month, year):
+    """Income and expense totals for a single month, in cents."""
+    rows = db.session.query(
+        MonthlyCategoryTotal.type,
+        func.sum(MonthlyCategoryTotal.total_cents)
+    ).filter(
+        MonthlyCategoryTotal.user_id == user_id,
+        MonthlyCategoryTotal.year == year,
+        MonthlyCategoryTotal.month == month
+    ).group_by(MonthlyCategoryTotal.type).all()
+
+    totals = {'income': 0, 'expense': 0}
+    for type_, total in rows:
+        totals[type_] = int(total or 0)
+    return totals
+
+
+def category_totals(user_id, month, year, type_='expense'):
+    """Per-category totals (with category names) for a single month."""
+    rows = db.session.query(
+        MonthlyCategoryTotal.category_id,
+        MonthlyCategoryTotal.total_cents
+    ).filter(
+        MonthlyCategoryTotal.user_id == user_id,
+        MonthlyCategoryTotal.year == year,
+        MonthlyCategoryTotal.month == month,
+        MonthlyCategoryTotal.type == type_,
+        MonthlyCategoryTotal.count > 0
+    ).all()
+
+    names = category_registry.names(user_id)
+    return [{
+        'category': names.get(category_id, 'Unknown'),
+        'amount': to_amount(total)
+    } for category_id, total in rows]
+
+
+def budget_status(user_id, month, year):
+    """Spent-vs-limit for all of a user's budgets in a month, in one query."""
+    rows = db.session.query(
+        Budget.budget_id,
+        Budget.category_id,
+        Budget.monthly_limit_cents,
+        MonthlyCategoryTotal.total_cents
+    ).outerjoin(
+        MonthlyCategoryTotal,
+        (MonthlyCategoryTotal.user_id == Budget.user_id) &
+        (MonthlyCategoryTotal.year == Budget.year) &
+        (MonthlyCategoryTotal.month == Budget.month) &
+        (MonthlyCategoryTotal.category_id == Budget.category_id) &
+        (MonthlyCategoryTotal.type == 'expense')
+    ).filter(
+        Budget.user_id == user_id,
+        Budget.month == month,
+        Budget.year == year
+    ).order_by(Budget.budget_id).all()
+
+    names = category_registry.names(user_id)
+    return [{
+        'budget_id': budget_id,
+        'category_id': category_id,
+        'category_name': names.get(category_id, 'Unknown'),
+        'amount': to_amount(monthly_limit),
+        'period': 'monthly',
+        'spent': to_amount(total)
+    } for budget_id, category_id, monthly_limit, total in rows]
+
+
+def goal_projections(user_id, now=None):
+    """Progress, contribution velocity and projections for all of a user's goals.
+
+    One grouped query over the contribution ledger covers every goal. Velocity
+    is the amount contributed over the last GOAL_VELOCITY_DAYS (or since the
+    goal's first contribution, if later), per month.
+    """
+    now = now or datetime.utcnow()
+    window_start = now - timedelta(days=current_app.config['GOAL_VELOCITY_DAYS'])
+    recent = GoalContribution.contributed_at >= window_start
+
+    rows = db.session.query(
+        SavingsGoal.goal_id,
+        SavingsGoal.title,
+        SavingsGoal.target_amount_cents,
+        SavingsGoal.saved_amount_cents,
+        SavingsGoal.deadline,
+        SavingsGoal.created_at,
+        func.count(GoalContribution.contribution_id),
+        func.min(GoalContribution.contributed_at),
+        func.coalesce(func.sum(case((recent, GoalContribution.amount_cents), else_=0)), 0)
+    ).outerjoin(GoalContribution, GoalContribution.goal_id == SavingsGoal.goal_id).filter(
+        SavingsGoal.user_id == user_id
+    ).group_by(SavingsGoal.goal_id).order_by(SavingsGoal.goal_id).all()
+
+    today = now.date()
+    projections = []
+    for goal_id, title, target, saved, deadline, created_at, count, first, recent_cents in rows:
+        remaining = max(target - saved, 0)
+        observed_from = max(window_start, first or created_at or now)
+        observed_days = max((now - observed_from).total_seconds() / 86400, MIN_VELOCITY_DAYS)
+        per_day = int(recent_cents) / observed_days
+
+        deadline = deadline.date() if isinstance(deadline, datetime) else deadline
+        if remaining == 0:
+            completion = today
+        elif per_day > 0:
+            completion = today + timedelta(days=int(-(-remaining // per_day)))
+        else:
+            completion = None
+
+        required_monthly = None
+        if deadline and remaining:
+            months_left = max((deadline - today).days / DAYS_PER_MONTH, 1)
+            required_monthly = to_amount(round(remaining / months_left))
+
+        projections.append({
+            'goal_id': goal_id,
+            'user_id': user_id,
+            'title': title,
+            'target_amount': to_amount(target),
+            'saved_amount': to_amount(saved),
+            'progress': round(saved / target * 100, 2) if target > 0 else 0,
+            'deadline': deadline.isoformat() if deadline else None,
+            'created_at': created_at.isoformat() if created_at else None,
+            'remaining_amount': to_amount(remaining),
+            'contributions': count,
+            'monthly_velocity': to_amount(round(per_day * DAYS_PER_MONTH)),
+            'projected_completion': completion.isoformat() if completion else None,
+            'required_monthly': required_monthly,
+            'on_track': bool(remaining == 0 or (completion and (not deadline or completion <= deadline)))
+        })
+    return projections
+
+
+TREND_GRANULARITIES = ('day', 'week', 'month', 'quarter')
+
+
+def period_start(day, granularity):
+    """First day of the day/week (Monday)/month/quarter containing `day`."""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'quarter':
+        return date(day.year, (day.month - 1) // 3 * 3 + 1, 1)
+    return day
+
+
+def next_period(start, granularity):
+    if granularity == 'day':
+        return start + timedelta(days=1)
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    months = 3 if granularity == 'quarter' else 1
+    index = start.year * 12 + start.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def period_count(start, end, granularity):
+    """Number of periods range_trend() returns for `start`..`end`."""
+    if granularity == 'day':
+        return (end - start).days + 1
+    if granularity == 'week':
+        return (period_start(end, 'week') - period_start(start, 'week')).days // 7 + 1
+    months = 3 if granularity == 'quarter' else 1
+    return (end.year * 12 + end.month - 1) // months - (start.year * 12 + start.month - 1) // months + 1
+
+
+def _window_functions(dialect):
+    # SQLite has had window functions since 3.25
+    if dialect.name == 'sqlite':
+        return (dialect.server_version_info or (0,)) >= (3, 25)
+    return dialect.name == 'postgresql'
+
+
+def _signed(type_column, cents):
+    return case((type_column == 'income', cents), else_=-cents)
+
+
+def _opening_balance(user_id, start):
+    """Scalar subquery: net of every transaction dated before `start`.
+
+    Whole months come from the monthly rollup, the days of `start`'s own
+    month before it from the daily one.
+    """
+    month_start = start.replace(day=1)
+    rolled = select(func.coalesce(func.sum(
+        _signed(MonthlyCategoryTotal.type, MonthlyCategoryTotal.total_cents)
+    ), 0)).where(
+        MonthlyCategoryTotal.user_id == user_id,
+        MonthlyCategoryTotal.year * 12 + MonthlyCategoryTotal.month < start.year * 12 + start.month
+    ).scalar_subquery()
+    if start == month_start:
+        return rolled
+
+    partial = select(func.coalesce(func.sum(_signed(DailyTotal.type, DailyTotal.total_cents)), 0)).where(
+        DailyTotal.user_id == user_id,
+        DailyTotal.date >= month_start,
+        DailyTotal.date < start
+    ).scalar_subquery()
+    return rolled + partial
+
+
+def _bucket_rows(user_id, start, stop, granularity, dialect, windowed):
+    """(bucket, income, expense) per non-empty bucket in [start, stop), plus the
+    opening balance on every row and, when `windowed`, the running balance.
+
+    Without window functions the buckets are days or months, for the caller to
+    fold into weeks or quarters.
+    """
+    if granularity in ('month', 'quarter'):
+        index = MonthlyCategoryTotal.year * 12 + MonthlyCategoryTotal.month - 1
+        bucket = index // 3 if granularity == 'quarter' and windowed else index
+        type_column, cents = MonthlyCategoryTotal.type, MonthlyCategoryTotal.total_cents
+        criteria = [
+            MonthlyCategoryTotal.user_id == user_id,
+            index >= start.year * 12 + start.month - 1,
+            index < stop.year * 12 + stop.month - 1
+        ]
+    else:
+        bucket = DailyTotal.date
+        if granularity == 'week' and windowed:
+            if dialect.name == 'postgresql':
+                bucket = cast(func.date_trunc('week', DailyTotal.date), Date)
+            else:
+                weekday = (cast(func.strftime('%w', DailyTotal.date), Integer) + 6) % 7
+                bucket = func.date(DailyTotal.date, func.printf('-%d days', weekday), type_=Date)
+        type_column, cents = DailyTotal.type, DailyTotal.total_cents
+        criteria = [DailyTotal.user_id == user_id, DailyTotal.date >= start, DailyTotal.date < stop]
+
+    grouped = select(
+        bucket.label('bucket'),
+        func.sum(case((type_column == 'income', cents), else_=0)).label('income'),
+        func.sum(case((type_column == 'expense', cents), else_=0)).label('expense')
+    ).where(*criteria).group_by(bucket).subquery()
+
+    opening = _opening_balance(user_id, start)
+    columns = [grouped.c.bucket, grouped.c.income, grouped.c.expense, opening.label('opening')]
+    if windowed:
+        columns.append((opening + func.sum(grouped.c.income - grouped.c.expense).over(
+            order_by=grouped.c.bucket
+        )).label('balance'))
+    return db.session.execute(select(*columns).order_by(grouped.c.bucket)).all()
+
+
+def range_trend(user_id, start, end, granularity='month'):
+    """Income, expenses and running balance per day/week/month/quarter.
+
+    The range is widened to whole periods. Balance is the net of every
+    transaction up to the end of the period, including those before `start`.
+    Buckets, totals and the running balance come from one query using window
+    functions; where the dialect lacks them, a single Python pass accumulates
+    the balance instead.
+    """
+    start = period_start(start, granularity)
+    stop = next_period(period_start(end, granularity), granularity)
+    dialect = db.session.get_bind().dialect
+    windowed = _window_functions(dialect)
+
+    rows = _bucket_rows(user_id, start, stop, granularity, dialect, windowed)
+    if rows:
+        opening = int(rows[0].opening)
+    else:
+        opening = int(db.session.execute(select(_opening_balance(user_id, start))).scalar())
+
+    by_period = {}
+    for row in rows:
+        bucket = row.bucket
+        if granularity in ('month', 'quarter'):
+            index = bucket * 3 if granularity == 'quarter' and windowed else bucket
+            bucket = date(index // 12, index % 12 + 1, 1)
+        elif isinstance(bucket, str):
+            bucket = date.fromisoformat(bucket)
+        period = period_start(bucket, granularity)
+        income, expense, _ = by_period.get(period, (0, 0, None))
+        by_period[period] = (
+            income + int(row.income),
+            expense + int(row.expense),
+            int(row.balance) if windowed else None
+        )
+
+    amount = amount_formatter()
+    trend = []
+    balance = opening
+    period = start
+    while period < stop:
+        income, expense, running = by_period.get(period, (0, 0, None))
+        balance = running if running is not None else balance + income - expense
+        trend.append({
+            'period': period.isoformat(),
+            'income': amount(income),
+            'expenses': amount(expense),
+            'savings': amount(income - expense),
+            'balance': amount(balance)
+        })
+        period = next_period(period, granularity)
+
+    return {
+        'start': start.isoformat(),
+        'end': (stop - timedelta(days=1)).isoformat(),
+        'granularity': granularity,
+        'opening_balance': to_amount(opening),
+        'trend': trend
+    }
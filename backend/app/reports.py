@@ -1,63 +1,37 @@
-from flask import Blueprint, request, jsonify
-from app import db
-from app.models import Transaction, Budget, SavingsGoal
+from flask import Blueprint, request, jsonify, current_app
+from app.models import MonthlyCategoryTotal
+from app.categories import name_column
+from app.cache import cached_report
+from app.money import to_amount
+from app.exporters import FORMATS, export_response, parquet_available
+from app.report_engine import monthly_totals, month_totals, category_totals, goal_projections, range_trend, period_count, TREND_GRANULARITIES
+from app.analytics import forecast, anomalies
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from datetime import datetime
-from sqlalchemy import func, extract
+from datetime import datetime, date, timedelta
+from sqlalchemy import select
 
 reports_bp = Blueprint('reports', __name__)
 
 @reports_bp.route('/dashboard', methods=['GET'])
 @jwt_required()
+@cached_report('dashboard', daily=True)
 def get_dashboard():
     try:
         current_user_id = int(get_jwt_identity())
         month = request.args.get('month', datetime.utcnow().month, type=int)
         year = request.args.get('year', datetime.utcnow().year, type=int)
         
-        total_income = db.session.query(func.sum(Transaction.amount)).filter(
-            Transaction.user_id == current_user_id,
-            Transaction.type == 'income',
-            extract('month', Transaction.date) == month,
-            extract('year', Transaction.date) == year
-        ).scalar() or 0.0
-        
-        total_expenses = db.session.query(func.sum(Transaction.amount)).filter(
-            Transaction.user_id == current_user_id,
-            Transaction.type == 'expense',
-            extract('month', Transaction.date) == month,
-            extract('year', Transaction.date) == year
-        ).scalar() or 0.0
-        
-        category_spending = db.session.query(
-            Transaction.category_id,
-            func.sum(Transaction.amount).label('total')
-        ).join(Transaction.category).filter(
-            Transaction.user_id == current_user_id,
-            Transaction.type == 'expense',
-            extract('month', Transaction.date) == month,
-            extract('year', Transaction.date) == year
-        ).group_by(Transaction.category_id).all()
-        
-        categories = []
-        for cat_id, total in category_spending:
-            from app.models import Category
-            cat = Category.query.get(cat_id)
-            if cat:
-                categories.append({
-                    'category': cat.name,
-                    'amount': total
-                })
-        
-        savings = total_income - total_expenses
-        
-        goals = SavingsGoal.query.filter_by(user_id=current_user_id).all()
-        goals_summary = [g.to_dict() for g in goals]
+        totals = month_totals(current_user_id, month, year)
+        
+        categories = category_totals(current_user_id, month, year, 'expense')
+        
+        # Goal projections are relative to today
+        goals_summary = goal_projections(current_user_id)
         
         return jsonify({
-            'total_income': total_income,
-            'total_expenses': total_expenses,
-            'savings': savings,
+            'total_income': to_amount(totals['income']),
+            'total_expenses': to_amount(totals['expense']),
+            'savings': to_amount(totals['income'] - totals['expense']),
             'category_spending': categories,
             'goals': goals_summary,
             'month': month,
@@ -69,35 +43,137 @@ def get_dashboard():
 
 @reports_bp.route('/monthly-trend', methods=['GET'])
 @jwt_required()
+@cached_report('monthly-trend')
 def get_monthly_trend():
     try:
         current_user_id = int(get_jwt_identity())
         year = request.args.get('year', datetime.utcnow().year, type=int)
         
-        monthly_data = []
-        for month in range(1, 13):
-            income = db.session.query(func.sum(Transaction.amount)).filter(
-                Transaction.user_id == current_user_id,
-                Transaction.type == 'income',
-                extract('month', Transaction.date) == month,
-                extract('year', Transaction.date) == year
-            ).scalar() or 0.0
-            
-            expenses = db.session.query(func.sum(Transaction.amount)).filter(
-                Transaction.user_id == current_user_id,
-                Transaction.type == 'expense',
-                extract('month', Transaction.date) == month,
-                extract('year', Transaction.date) == year
-            ).scalar() or 0.0
-            
-            monthly_data.append({
-                'month': month,
-                'income': income,
-                'expenses': expenses,
-                'savings': income - expenses
-            })
+        monthly_data = monthly_totals(current_user_id, year)
         
         return jsonify({'monthly_trend': monthly_data}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+def _trend_range():
+    """(start, end) of a trend request: end defaults to today, start to a year
+    before end. Raises ValueError for malformed dates."""
+    end = date.fromisoformat(request.args['end']) if request.args.get('end') else datetime.utcnow().date()
+    start = date.fromisoformat(request.args['start']) if request.args.get('start') else end - timedelta(days=365)
+    return start, end
+
+@reports_bp.route('/trend', methods=['GET'])
+@jwt_required()
+@cached_report('trend', resolve=lambda: '%s:%s' % _trend_range())
+def get_trend():
+    try:
+        current_user_id = int(get_jwt_identity())
+        granularity = request.args.get('granularity', 'month')
+        
+        if granularity not in TREND_GRANULARITIES:
+            return jsonify({'error': 'Granularity must be one of day, week, month or quarter'}), 400
+        try:
+            start, end = _trend_range()
+        except ValueError:
+            return jsonify({'error': 'Dates must be in YYYY-MM-DD format'}), 400
+        if start > end:
+            return jsonify({'error': 'Start must not be after end'}), 400
+        
+        max_periods = current_app.config['REPORT_TREND_MAX_PERIODS']
+        if period_count(start, end, granularity) > max_periods:
+            return jsonify({'error': f'Range covers more than {max_periods} periods, use a coarser granularity'}), 400
+        
+        return jsonify(range_trend(current_user_id, start, end, granularity)), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@reports_bp.route('/forecast', methods=['GET'])
+@jwt_required()
+@cached_report('forecast', daily=True)
+def get_forecast():
+    try:
+        current_user_id = int(get_jwt_identity())
+        month = request.args.get('month', datetime.utcnow().month, type=int)
+        year = request.args.get('year', datetime.utcnow().year, type=int)
+        window = request.args.get('window', type=int)
+        
+        if not 1 <= month <= 12:
+            return jsonify({'error': 'Month must be between 1 and 12'}), 400
+        if window is not None and window < 1:
+            return jsonify({'error': 'Window must be at least 1 month'}), 400
+        
+        return jsonify(forecast(current_user_id, month, year, window=window)), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@reports_bp.route('/anomalies', methods=['GET'])
+@jwt_required()
+@cached_report('anomalies')
+def get_anomalies():
+    try:
+        current_user_id = int(get_jwt_identity())
+        months = request.args.get('months', type=int)
+        threshold = request.args.get('threshold', type=float)
+        
+        if months is not None and months < 1:
+            return jsonify({'error': 'Months must be at least 1'}), 400
+        if threshold is not None and threshold <= 0:
+            return jsonify({'error': 'Threshold must be positive'}), 400
+        
+        return jsonify(anomalies(current_user_id, months=months, threshold=threshold)), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+EXPORT_COLUMNS = [
+    ('year', 'int'),
+    ('month', 'int'),
+    ('type', 'str'),
+    ('category_id', 'int'),
+    ('category_name', 'str'),
+    ('total_cents', 'int'),
+    ('count', 'int')
+]
+
+@reports_bp.route('/export', methods=['GET'])
+@jwt_required()
+def export_report():
+    try:
+        current_user_id = int(get_jwt_identity())
+        year = request.args.get('year', type=int)
+        fmt = request.args.get('format', 'csv').lower()
+        
+        if fmt not in FORMATS:
+            return jsonify({'error': 'Format must be either csv or parquet'}), 400
+        if fmt == 'parquet' and not parquet_available():
+            return jsonify({'error': 'Parquet export requires pyarrow to be installed'}), 400
+        
+        filters = [
+            MonthlyCategoryTotal.user_id == current_user_id,
+            MonthlyCategoryTotal.count > 0
+        ]
+        if year:
+            filters.append(MonthlyCategoryTotal.year == year)
+        
+        statement = select(
+            MonthlyCategoryTotal.year,
+            MonthlyCategoryTotal.month,
+            MonthlyCategoryTotal.type,
+            MonthlyCategoryTotal.category_id,
+            name_column(current_user_id, MonthlyCategoryTotal.category_id),
+            MonthlyCategoryTotal.total_cents,
+            MonthlyCategoryTotal.count
+        ).where(*filters).order_by(
+            MonthlyCategoryTotal.year,
+            MonthlyCategoryTotal.month,
+            MonthlyCategoryTotal.type,
+            MonthlyCategoryTotal.category_id
+        )
+        
+        return export_response(statement, EXPORT_COLUMNS, fmt, f'report-{year}' if year else 'report')
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,230 @@
+from app import db
+from app.models import Transaction, MonthlyCategoryTotal, DailyTotal
+from app.report_engine import month_window
+from app.db_tuning import conflict_insert
+from sqlalchemy import func, extract, cast, Integer, insert, update, delete, tuple_
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime
+
+# Totals are kept per (user, year, month, category, type) so report endpoints
+# read O(categories) rows, and per (user, date, type) for day and week trends.
+# Every write path that touches transactions must keep both in step inside the
+# same database transaction.
+
+def _increment(model, keys, amount_cents, count):
+    key = [getattr(model, name) == value for name, value in keys.items()]
+    values = {
+        'total_cents': model.total_cents + amount_cents,
+        'count': model.count + count
+    }
+    
+    result = db.session.execute(update(model).where(*key).values(**values))
+    if result.rowcount:
+        return
+    
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(model).values(total_cents=amount_cents, count=count, **keys))
+    except IntegrityError:
+        # A concurrent writer created the row first
+        db.session.execute(update(model).where(*key).values(**values))
+
+
+def apply(user_id, year, month, category_id, type_, amount_cents, count):
+    _increment(MonthlyCategoryTotal, {
+        'user_id': user_id,
+        'year': year,
+        'month': month,
+        'category_id': category_id,
+        'type': type_
+    }, amount_cents, count)
+
+
+def apply_daily(user_id, day, type_, amount_cents, count):
+    _increment(DailyTotal, {'user_id': user_id, 'date': day, 'type': type_}, amount_cents, count)
+
+
+def _day(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def record(transaction, sign=1):
+    """Add (sign=1) or remove (sign=-1) a transaction's contribution."""
+    apply(
+        transaction.user_id,
+        transaction.date.year,
+        transaction.date.month,
+        transaction.category_id,
+        transaction.type,
+        sign * transaction.amount_cents,
+        sign
+    )
+    apply_daily(
+        transaction.user_id,
+        _day(transaction.date),
+        transaction.type,
+        sign * transaction.amount_cents,
+        sign
+    )
+
+
+MONTHLY_KEY = ['user_id', 'year', 'month', 'category_id', 'type']
+DAILY_KEY = ['user_id', 'date', 'type']
+
+
+def _aggregate_query(*criteria):
+    year = cast(extract('year', Transaction.date), Integer)
+    month = cast(extract('month', Transaction.date), Integer)
+    return db.session.query(
+        Transaction.user_id,
+        year.label('year'),
+        month.label('month'),
+        Transaction.category_id,
+        Transaction.type,
+        func.sum(Transaction.amount_cents).label('total_cents'),
+        func.count().label('count')
+    ).filter(*criteria).group_by(
+        Transaction.user_id, year, month, Transaction.category_id, Transaction.type
+    )
+
+
+def _daily_query(*criteria):
+    return db.session.query(
+        Transaction.user_id,
+        Transaction.date,
+        Transaction.type,
+        func.sum(Transaction.amount_cents).label('total_cents'),
+        func.count().label('count')
+    ).filter(*criteria).group_by(Transaction.user_id, Transaction.date, Transaction.type)
+
+
+def _insert_from(*criteria):
+    """Aggregate the matching transactions into both rollup tables."""
+    db.session.execute(insert(MonthlyCategoryTotal).from_select(
+        MONTHLY_KEY + ['total_cents', 'count'], _aggregate_query(*criteria).statement
+    ))
+    db.session.execute(insert(DailyTotal).from_select(
+        DAILY_KEY + ['total_cents', 'count'], _daily_query(*criteria).statement
+    ))
+
+
+def months_of(*criteria):
+    """The (user_id, year, month) keys of the transactions matching `criteria`."""
+    year = cast(extract('year', Transaction.date), Integer)
+    month = cast(extract('month', Transaction.date), Integer)
+    return set(db.session.query(Transaction.user_id, year, month).filter(*criteria).distinct())
+
+
+def refresh_months(keys):
+    """Recompute the rollups for an iterable of (user_id, year, month) keys."""
+    keys = sorted(set(keys))
+    for i in range(0, len(keys), 500):
+        batch = keys[i:i + 500]
+        db.session.execute(delete(MonthlyCategoryTotal).where(
+            tuple_(MonthlyCategoryTotal.user_id, MonthlyCategoryTotal.year, MonthlyCategoryTotal.month).in_(batch)
+        ))
+        for user_id, year, month in batch:
+            start, end = month_window(month, year)
+            db.session.execute(delete(DailyTotal).where(
+                DailyTotal.user_id == user_id,
+                DailyTotal.date >= start,
+                DailyTotal.date < end
+            ))
+            _insert_from(Transaction.user_id == user_id, Transaction.date >= start, Transaction.date < end)
+
+
+def rebuild(user_id=None):
+    """Recompute rollups from scratch for one user, or for everyone."""
+    if user_id is None:
+        db.session.execute(delete(MonthlyCategoryTotal))
+        db.session.execute(delete(DailyTotal))
+        _insert_from()
+    else:
+        db.session.execute(delete(MonthlyCategoryTotal).where(MonthlyCategoryTotal.user_id == user_id))
+        db.session.execute(delete(DailyTotal).where(DailyTotal.user_id == user_id))
+        _insert_from(Transaction.user_id == user_id)
+
+
+def _drift(table, expected, stored):
+    drift = []
+    for key in sorted(set(expected) | set(stored)):
+        # Totals are integer cents, so anything but an exact match is drift
+        if expected.get(key, (0, 0)) != stored.get(key, (0, 0)):
+            drift.append({
+                'table': table,
+                'key': key,
+                'expected': expected.get(key, (0, 0)),
+                'stored': stored.get(key, (0, 0))
+            })
+    return drift
+
+
+def verify(user_id=None):
+    """Compare stored rollups with a fresh aggregation and return every drifted key."""
+    criteria = [Transaction.user_id == user_id] if user_id is not None else []
+    drift = []
+    for model, query, key_names in (
+        (MonthlyCategoryTotal, _aggregate_query, MONTHLY_KEY),
+        (DailyTotal, _daily_query, DAILY_KEY)
+    ):
+        expected = {
+            tuple(getattr(row, name) for name in key_names): (int(row.total_cents), row.count)
+            for row in query(*criteria)
+        }
+        
+        stored_query = model.query
+        if user_id is not None:
+            stored_query = stored_query.filter_by(user_id=user_id)
+        stored = {
+            tuple(getattr(r, name) for name in key_names): (r.total_cents, r.count)
+            for r in stored_query
+        }
+        drift.extend(_drift(model.__tablename__, expected, stored))
+    return drift
+
+
+class Deltas:
+    """Accumulates rollup changes for many rows and applies them once per key."""
+    
+    def __init__(self):
+        self.totals = {}
+        self.daily = {}
+    
+    def add(self, user_id, transaction_date, category_id, type_, amount_cents, sign=1):
+        key = (user_id, transaction_date.year, transaction_date.month, category_id, type_)
+        total, count = self.totals.get(key, (0, 0))
+        self.totals[key] = (total + sign * amount_cents, count + sign)
+        
+        key = (user_id, _day(transaction_date), type_)
+        total, count = self.daily.get(key, (0, 0))
+        self.daily[key] = (total + sign * amount_cents, count + sign)
+    
+    def apply(self):
+        dialect = db.session.get_bind().dialect.name
+        for model, key_names, totals in (
+            (MonthlyCategoryTotal, MONTHLY_KEY, self.totals),
+            (DailyTotal, DAILY_KEY, self.daily)
+        ):
+            table = model.__table__
+            upsert = conflict_insert(table, dialect)
+            if upsert is None:
+                for key, (total, count) in totals.items():
+                    _increment(model, dict(zip(key_names, key)), total, count)
+                continue
+            
+            # One batched INSERT ... ON CONFLICT DO UPDATE instead of a round trip per key
+            upsert = upsert.on_conflict_do_update(
+                index_elements=[column.name for column in table.primary_key],
+                set_={
+                    'total_cents': table.c.total_cents + upsert.excluded.total_cents,
+                    'count': table.c.count + upsert.excluded.count
+                }
+            )
+            rows = [
+                dict(zip(key_names, key), total_cents=total, count=count)
+                for key, (total, count) in totals.items()
+            ]
+            for i in range(0, len(rows), 1000):
+                db.session.execute(upsert, rows[i:i + 1000])
+        self.totals = {}
+        self.daily = {}
@@ -0,0 +1,208 @@
+import threading
+from calendar import monthrange
+from datetime import date, datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, update, bindparam, insert
+from app import db, rollups
+from app.cache import report_cache
+from app.db_tuning import conflict_insert
+from app.models import Transaction, RecurringRule
+from app.sharding import shard_router
+
+# Materializes recurring rules into transactions. Rules are read in batches
+# of RECURRING_BATCH_SIZE by rule_id; each batch inserts its due occurrences,
+# advances the rules' next_occurrence and updates the rollups in one commit.
+# The unique (recurring_rule_id, occurrence_date) index makes re-running a
+# batch, or two schedulers racing, post nothing twice.
+
+FREQUENCIES = ('daily', 'weekly', 'monthly', 'yearly')
+
+
+def _add_months(day, months):
+    # Anchored on the start day, so a rule on the 31st posts on each month's last day
+    index = day.month - 1 + months
+    year, month = day.year + index // 12, index % 12 + 1
+    return date(year, month, min(day.day, monthrange(year, month)[1]))
+
+
+def _nth(rule, n):
+    if rule.frequency == 'daily':
+        return rule.start_date + timedelta(days=n * rule.interval)
+    if rule.frequency == 'weekly':
+        return rule.start_date + timedelta(weeks=n * rule.interval)
+    months = n * rule.interval * (12 if rule.frequency == 'yearly' else 1)
+    return _add_months(rule.start_date, months)
+
+
+def _first_index_on_or_after(rule, day):
+    start = rule.start_date
+    if day <= start:
+        return 0
+    if rule.frequency in ('daily', 'weekly'):
+        step = rule.interval * (7 if rule.frequency == 'weekly' else 1)
+        return -(-(day - start).days // step)
+    step = rule.interval * (12 if rule.frequency == 'yearly' else 1)
+    n = ((day.year - start.year) * 12 + day.month - start.month) // step
+    while _nth(rule, n) < day:
+        n += 1
+    return n
+
+
+def due_occurrences(rule, until):
+    """Occurrence dates from rule.next_occurrence up to `until`, and the one after them.
+    
+    The second value is None when the rule's end_date has been passed.
+    """
+    last = min(until, rule.end_date) if rule.end_date else until
+    n = _first_index_on_or_after(rule, rule.next_occurrence)
+    dates = []
+    day = _nth(rule, n)
+    while day <= last:
+        dates.append(day)
+        n += 1
+        day = _nth(rule, n)
+    if rule.end_date and day > rule.end_date:
+        day = None
+    return dates, day
+
+
+def next_occurrence_after(rule, last_posted):
+    """First occurrence after `last_posted` (the start date when nothing was
+    posted yet), or None when that is past the rule's end_date."""
+    if last_posted is None:
+        day = rule.start_date
+    else:
+        day = _nth(rule, _first_index_on_or_after(rule, last_posted + timedelta(days=1)))
+    if rule.end_date and day > rule.end_date:
+        return None
+    return day
+
+
+def _insert_occurrences(rows):
+    """Insert rows, skipping occurrences already posted; returns the inserted ones."""
+    table = Transaction.__table__
+    statement = conflict_insert(table, db.session.get_bind().dialect.name)
+    if statement is not None:
+        statement = statement.on_conflict_do_nothing(index_elements=['recurring_rule_id', 'occurrence_date'])
+    else:
+        statement = insert(table)
+    # Only rows actually inserted come back, so the rollups count each one once
+    statement = statement.returning(table.c.user_id, table.c.date, table.c.category_id, table.c.type, table.c.amount_cents)
+    return db.session.execute(statement, rows).all()
+
+
+def _materialize_shard(until, user_id, batch_size):
+    columns = [
+        RecurringRule.rule_id, RecurringRule.user_id, RecurringRule.type, RecurringRule.amount_cents,
+        RecurringRule.category_id, RecurringRule.notes, RecurringRule.frequency, RecurringRule.interval,
+        RecurringRule.start_date, RecurringRule.end_date, RecurringRule.next_occurrence
+    ]
+    advance = update(RecurringRule.__table__).where(
+        RecurringRule.__table__.c.rule_id == bindparam('b_rule_id')
+    ).values(next_occurrence=bindparam('b_next'))
+    
+    last_id = 0
+    processed = posted = 0
+    while True:
+        query = select(*columns).where(
+            RecurringRule.next_occurrence.isnot(None),
+            RecurringRule.next_occurrence <= until,
+            RecurringRule.rule_id > last_id
+        )
+        if user_id is not None:
+            query = query.where(RecurringRule.user_id == user_id)
+        rules = db.session.execute(query.order_by(RecurringRule.rule_id).limit(batch_size)).all()
+        if not rules:
+            break
+        
+        rows = []
+        advances = []
+        now = datetime.utcnow()
+        for rule in rules:
+            dates, next_occurrence = due_occurrences(rule, until)
+            for day in dates:
+                rows.append({
+                    'user_id': rule.user_id,
+                    'type': rule.type,
+                    'amount_cents': rule.amount_cents,
+                    'category_id': rule.category_id,
+                    'date': day,
+                    'notes': rule.notes or '',
+                    'recurring_rule_id': rule.rule_id,
+                    'occurrence_date': day,
+                    'created_at': now
+                })
+            advances.append({'b_rule_id': rule.rule_id, 'b_next': next_occurrence})
+        
+        deltas = rollups.Deltas()
+        users = set()
+        for i in range(0, len(rows), batch_size):
+            for row in _insert_occurrences(rows[i:i + batch_size]):
+                deltas.add(row.user_id, row.date, row.category_id, row.type, row.amount_cents)
+                users.add(row.user_id)
+                posted += 1
+        db.session.execute(advance, advances)
+        deltas.apply()
+        db.session.commit()
+        for user in users:
+            report_cache.invalidate(user)
+        
+        processed += len(rules)
+        last_id = rules[-1].rule_id
+    
+    return processed, posted
+
+
+def materialize(until=None, user_id=None, batch_size=None):
+    """Post every occurrence due on or before `until` (default today, UTC).
+    
+    Returns (rules processed, transactions posted).
+    """
+    until = until or datetime.utcnow().date()
+    batch_size = batch_size or current_app.config['RECURRING_BATCH_SIZE']
+    processed = posted = 0
+    # Rule ids are per database, so each shard is walked on its own
+    for _ in shard_router.each_shard(user_id):
+        rules, rows = _materialize_shard(until, user_id, batch_size)
+        processed += rules
+        posted += rows
+    return processed, posted
+
+
+class RecurringScheduler:
+    """Runs materialize() every RECURRING_SCHEDULER_INTERVAL seconds on a daemon thread."""
+    
+    def __init__(self):
+        self.thread = None
+        self.stopped = threading.Event()
+    
+    def init_app(self, app):
+        if not app.config['RECURRING_SCHEDULER_ENABLED'] or self.thread is not None:
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(
+            target=self.run,
+            args=(app, app.config['RECURRING_SCHEDULER_INTERVAL']),
+            name='recurring-scheduler',
+            daemon=True
+        )
+        self.thread.start()
+    
+    def run(self, app, interval):
+        while not self.stopped.is_set():
+            with app.app_context():
+                try:
+                    materialize()
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('Recurring scheduler run failed')
+            self.stopped.wait(interval)
+    
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+
+recurring_scheduler = RecurringScheduler()
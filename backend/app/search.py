@@ -0,0 +1,131 @@
+import re
+from flask import current_app
+from sqlalchemy import event, func, select, text, literal_column, table, column, bindparam
+from app.models import Transaction
+
+# Full-text search over transaction notes, chosen by dialect:
+#
+# SQLite   - an external-content FTS5 table (transactions_fts) over notes and
+#            user_id, kept in step with transactions by triggers, so every
+#            write path (ORM, bulk core inserts, the scheduler) stays in sync.
+#            user_id is indexed as a token so a search reads only the calling
+#            user's postings instead of filtering everybody's matches.
+# Postgres - a GIN expression index on to_tsvector('simple', notes); the
+#            search condition repeats the same expression so it is used.
+#
+# Results are ranked by relevance divided by (1 + age in days / SEARCH_RECENCY_DAYS).
+
+FTS_TABLE = 'transactions_fts'
+TS_CONFIG = 'simple'
+
+SQLITE_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        notes, user_id, content='transactions', content_rowid='transaction_id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, notes, user_id) VALUES (new.transaction_id, new.notes, new.user_id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, notes, user_id) VALUES ('delete', old.transaction_id, old.notes, old.user_id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS transactions_fts_update AFTER UPDATE OF notes, user_id ON transactions BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, notes, user_id) VALUES ('delete', old.transaction_id, old.notes, old.user_id);
+        INSERT INTO {FTS_TABLE}(rowid, notes, user_id) VALUES (new.transaction_id, new.notes, new.user_id);
+    END""",
+]
+
+POSTGRES_DDL = [
+    f"""CREATE INDEX IF NOT EXISTS ix_transactions_notes_fts ON transactions
+        USING GIN (to_tsvector('{TS_CONFIG}', coalesce(notes, '')))""",
+]
+
+fts = table(FTS_TABLE, column('rowid'))
+
+
+def install(connection, rebuild=False):
+    """Create the search index for the connection's dialect if it is missing.
+    
+    `rebuild` re-reads every existing note into the SQLite index.
+    """
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': FTS_TABLE}
+        ).first()
+        for statement in SQLITE_DDL:
+            connection.execute(text(statement))
+        if rebuild or not exists:
+            connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    elif dialect == 'postgresql':
+        for statement in POSTGRES_DDL:
+            connection.execute(text(statement))
+
+
+@event.listens_for(Transaction.__table__, 'after_create')
+def _after_create(target, connection, **kwargs):
+    # A freshly created transactions table must not inherit a stale index
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text(f'DROP TABLE IF EXISTS {FTS_TABLE}'))
+    install(connection)
+
+
+@event.listens_for(Transaction.__table__, 'after_drop')
+def _after_drop(target, connection, **kwargs):
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text(f'DROP TABLE IF EXISTS {FTS_TABLE}'))
+
+
+def terms(q):
+    """Words of a search string; each is matched as a prefix."""
+    return re.findall(r'\w+', (q or '').lower())
+
+
+def matches(q, user_id, dialect):
+    """Subquery of (transaction_id, relevance) for the user's notes matching `q`.
+    
+    Higher relevance is better. Raises ValueError when `q` has no words.
+    """
+    words = terms(q)
+    if not words:
+        raise ValueError('Search query must contain at least one word')
+    
+    if dialect == 'sqlite':
+        expression = 'user_id : "%d" AND notes : (%s)' % (user_id, ' '.join(f'"{word}"*' for word in words))
+        # bm25 is lower-is-better; weight only the notes column
+        relevance = -literal_column(f'bm25({FTS_TABLE}, 1.0, 0.0)')
+        return select(fts.c.rowid.label('transaction_id'), relevance.label('relevance')).where(
+            text(f'{FTS_TABLE} MATCH :fts_query').bindparams(bindparam('fts_query', expression))
+        ).subquery()
+    
+    if dialect == 'postgresql':
+        # The configuration is inlined, not bound, so the expression is
+        # identical to the indexed one and the planner can use the GIN index
+        config = literal_column(f"'{TS_CONFIG}'::regconfig")
+        vector = func.to_tsvector(config, func.coalesce(Transaction.notes, ''))
+        query = func.to_tsquery(config, ' & '.join(f'{word}:*' for word in words))
+        return select(
+            Transaction.transaction_id.label('transaction_id'),
+            func.ts_rank(vector, query).label('relevance')
+        ).where(Transaction.user_id == user_id, vector.op('@@')(query)).subquery()
+    
+    # No full-text support: every word must appear somewhere in the notes
+    return select(
+        Transaction.transaction_id.label('transaction_id'),
+        literal_column('1.0').label('relevance')
+    ).where(
+        Transaction.user_id == user_id,
+        *[Transaction.notes.ilike(f'%{word}%') for word in words]
+    ).subquery()
+
+
+def score(matched, dialect):
+    """Relevance decayed by age, for ORDER BY ... DESC. Future-dated rows
+    count as today's."""
+    if dialect == 'sqlite':
+        age = func.max(func.julianday('now') - func.julianday(Transaction.date), 0)
+    elif dialect == 'postgresql':
+        age = func.greatest(func.current_date() - Transaction.date, 0)
+    else:
+        return matched.c.relevance
+    return matched.c.relevance / (1.0 + age / current_app.config['SEARCH_RECENCY_DAYS'])
@@ -0,0 +1,244 @@
+import hashlib
+from bisect import bisect
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import inspect, select, insert, delete, union
+from sqlalchemy.exc import UnboundExecutionError
+from sqlalchemy.sql.util import find_tables
+from app.replicas import replica_router
+
+# Optional sharding by user_id. With SHARD_DATABASE_URLS set, every table a
+# user owns (transactions, budgets, goals, rules, rollups, the search index)
+# lives in one of the shard databases, bound as shard0, shard1, ... in the
+# order the URLs are listed. users and categories stay on the default bind.
+#
+# A user's shard is found on a consistent-hash ring of SHARD_VIRTUAL_NODES
+# points per shard, so appending a shard moves only about 1/N of the users.
+# RoutingSession.get_bind sends each statement that touches a user-owned
+# table to the shard of the request's JWT identity, or to the shard pinned
+# with shard_router.using() for work done outside a request. A user-owned
+# table used with neither is an error rather than a silent default.
+
+GLOBAL_TABLES = ('users', 'categories', 'replica_heartbeat')
+_UNSET = object()
+_pinned = ContextVar('pinned_shard', default=_UNSET)
+
+
+def shard_urls(config):
+    return config.get('SHARD_DATABASE_URLS', '').replace(',', ' ').split()
+
+
+def shard_binds(config):
+    """SQLALCHEMY_BINDS entries for the configured shards."""
+    from app.db_tuning import engine_options
+    return {
+        'shard%d' % i: dict(engine_options(config, url), url=url)
+        for i, url in enumerate(shard_urls(config))
+    }
+
+
+def _point(key):
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+
+class ShardRouter:
+    def __init__(self):
+        self.names = []
+        self.ring = []
+        self.points = []
+        self.tables = None
+
+    @property
+    def enabled(self):
+        return bool(self.names)
+
+    def init_app(self, app):
+        self.names = list(shard_binds(app.config))
+        self.ring = sorted(
+            (_point('%s#%d' % (name, vnode)), name)
+            for name in self.names
+            for vnode in range(app.config.get('SHARD_VIRTUAL_NODES', 64))
+        )
+        self.points = [point for point, _ in self.ring]
+
+    def shard_for(self, user_id):
+        """Bind key of the shard that owns `user_id`."""
+        index = bisect(self.points, _point(str(user_id))) % len(self.ring)
+        return self.ring[index][1]
+
+    def sharded_tables(self):
+        if self.tables is None:
+            from app import db
+            from app.search import FTS_TABLE
+            self.tables = {table.name for table in db.metadata.sorted_tables if table.name not in GLOBAL_TABLES}
+            self.tables.add(FTS_TABLE)
+        return self.tables
+
+    def current_shard(self):
+        """Bind key for user-owned tables in this context (None is the default bind)."""
+        pinned = _pinned.get()
+        if pinned is not _UNSET:
+            return pinned
+        if has_request_context():
+            from flask_jwt_extended import get_jwt_identity
+            try:
+                identity = get_jwt_identity()
+            except RuntimeError:
+                identity = None
+            if identity is not None:
+                return self.shard_for(int(identity))
+        raise UnboundExecutionError(
+            'Query on a user-owned table with no user to route by; wrap it in shard_router.using()'
+        )
+
+    @contextmanager
+    def using(self, shard):
+        """Route user-owned tables to `shard` (a bind key, or None for the default bind)."""
+        token = _pinned.set(shard)
+        try:
+            yield shard
+        finally:
+            _pinned.reset(token)
+
+    def each_shard(self, user_id=None):
+        """Run the loop body once per shard holding user data (just the user's
+        shard when `user_id` is given), pinned to it."""
+        if not self.enabled:
+            yield None
+            return
+        for name in [self.shard_for(user_id)] if user_id is not None else self.names:
+            with self.using(name):
+                yield name
+
+    def touches_shard(self, mapper, clause):
+        tables = self.sharded_tables()
+        if mapper is not None and inspect(mapper).local_table.name in tables:
+            return True
+        if clause is not None:
+            return any(table.name in tables for table in find_tables(clause, include_crud=True, include_aliases=True))
+        return False
+
+
+shard_router = ShardRouter()
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that sends user-owned tables to their shard,
+    and reads of read-only requests to a replica (see app/replicas.py)."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and shard_router.enabled and shard_router.touches_shard(mapper, clause):
+            shard = shard_router.current_shard()
+            if shard is not None:
+                return self._db.engines[shard]
+            bind = self._db.engines[None]
+        if bind is None and replica_router.enabled:
+            replica = replica_router.for_statement(clause, self._flushing)
+            if replica is not None:
+                bind = self._db.engines[replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def create_all():
+    """Create the user-owned tables (and search index) in every shard."""
+    from app import db
+    tables = [table for table in db.metadata.sorted_tables if table.name in shard_router.sharded_tables()]
+    for name in shard_router.names:
+        db.metadata.create_all(db.engines[name], tables=tables)
+    return shard_router.names
+
+
+# Rebalancing. Tables are copied in this order; primary keys are renumbered
+# on the way in (the target has its own sequences), and each (column, table)
+# reference is rewritten to the new ids of a table copied before it.
+def _move_plan():
+    from app.models import (
+        RecurringRule, SavingsGoal, Budget, GoalContribution, Transaction, MonthlyCategoryTotal, DailyTotal,
+        IngestReceipt
+    )
+    return [
+        (RecurringRule.__table__, 'rule_id', {}),
+        (SavingsGoal.__table__, 'goal_id', {}),
+        (Budget.__table__, 'budget_id', {}),
+        (GoalContribution.__table__, 'contribution_id', {'goal_id': 'savings_goals'}),
+        (Transaction.__table__, 'transaction_id', {'recurring_rule_id': 'recurring_rules'}),
+        (IngestReceipt.__table__, None, {'transaction_id': 'transactions'}),
+        (MonthlyCategoryTotal.__table__, None, {}),
+        (DailyTotal.__table__, None, {}),
+    ]
+
+
+def _users_in(connection):
+    plan = _move_plan()
+    query = union(*[select(table.c.user_id) for table, _, _ in plan])
+    return {row[0] for row in connection.execute(query)}
+
+
+def _delete_user(connection, user_id):
+    for table, _, _ in reversed(_move_plan()):
+        connection.execute(delete(table).where(table.c.user_id == user_id))
+
+
+def _copy_user(source, target, user_id, chunk_size):
+    plan = _move_plan()
+    referenced = {name for _, _, refs in plan for name in refs.values()}
+    new_ids = {}
+    moved = 0
+    for table, key, refs in plan:
+        ids = new_ids.setdefault(table.name, {})
+        rows = source.execute(select(table).where(table.c.user_id == user_id).execution_options(yield_per=chunk_size))
+        for chunk in rows.mappings().partitions():
+            batch = []
+            old_ids = []
+            for row in chunk:
+                values = dict(row)
+                for column, other in refs.items():
+                    # None when the row referred to is gone (a receipt's deleted transaction)
+                    if values[column] is not None:
+                        values[column] = new_ids[other].get(values[column])
+                if key:
+                    old_ids.append(values.pop(key))
+                batch.append(values)
+            if table.name in referenced:
+                # New ids come back in the order the rows were sent
+                statement = insert(table).returning(table.c[key], sort_by_parameter_order=True)
+                ids.update(zip(old_ids, target.execute(statement, batch).scalars()))
+            else:
+                target.execute(insert(table), batch)
+            moved += len(chunk)
+    return moved
+
+
+def misplaced():
+    """(user_id, current bind key, owning shard) for every user whose data is
+    not on the shard the ring assigns it; the default bind counts as a source."""
+    from app import db
+    found = []
+    for name in [None] + shard_router.names:
+        with db.engines[name].connect() as connection:
+            for user_id in sorted(_users_in(connection)):
+                owner = shard_router.shard_for(user_id)
+                if owner != name:
+                    found.append((user_id, name, owner))
+    return found
+
+
+def move_user(user_id, source, target, chunk_size=5000):
+    """Copy one user's rows from bind `source` to shard `target`, then delete
+    them from `source`. Returns the number of rows copied.
+
+    The target's copy is replaced first, so a move interrupted between the two
+    commits can simply be run again. Ids are renumbered: references held by
+    clients (transaction ids, list cursors) do not survive a move.
+    """
+    from app import db
+    from app.cache import report_cache
+    with db.engines[source].connect() as reader, db.engines[target].begin() as writer:
+        _delete_user(writer, user_id)
+        moved = _copy_user(reader, writer, user_id, chunk_size)
+    with db.engines[source].begin() as connection:
+        _delete_user(connection, user_id)
+    report_cache.invalidate(user_id)
+    return moved
@@ -0,0 +1,95 @@
+import hashlib
+import time
+from flask_jwt_extended import JWTManager, get_jwt
+from app.cache import MemoryBackend
+
+# Fast path for JWT-protected requests. Verified tokens are remembered per
+# process by the SHA-256 of the encoded token until they expire, so repeat
+# requests skip the HMAC check. Access tokens carry the user's name, email and
+# token version ('tv'); bumping users.token_version revokes every token issued
+# before, and the current version is itself cached so the revocation check
+# costs one cache lookup rather than a query.
+
+
+class CachingJWTManager(JWTManager):
+    def __init__(self, app=None, **kwargs):
+        self.verified = None
+        super().__init__(app, **kwargs)
+
+    def init_app(self, app, **kwargs):
+        super().init_app(app, **kwargs)
+        size = app.config['JWT_VERIFIED_CACHE_SIZE']
+        # The cache overrides a private JWTManager method (flask_jwt_extended
+        # has no public hook around verification; requirements.txt pins the
+        # version it was written against). Without it, tokens are simply
+        # verified every time.
+        supported = hasattr(JWTManager, '_decode_jwt_from_config')
+        self.verified = MemoryBackend(size) if size and supported else None
+
+    def _decode_jwt_from_config(self, encoded_token, csrf_value=None, allow_expired=False):
+        if self.verified is None or csrf_value is not None:
+            return super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+
+        key = hashlib.sha256(encoded_token.encode()).hexdigest()
+        payload = self.verified.get(key)
+        if payload is None or (not allow_expired and payload.get('exp', float('inf')) <= time.time()):
+            # Misses, and expired hits, go through full verification
+            payload = super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+            ttl = payload['exp'] - time.time() if 'exp' in payload else None
+            if ttl is None or ttl > 0:
+                self.verified.set(key, payload, ex=ttl)
+        return dict(payload)
+
+
+class TokenVersions:
+    def __init__(self):
+        self.cache = MemoryBackend()
+        self.ttl = 30
+
+    def init_app(self, app):
+        self.cache = MemoryBackend(app.config['JWT_VERIFIED_CACHE_SIZE'] or 1024)
+        self.ttl = app.config['AUTH_TOKEN_VERSION_TTL']
+
+    def current(self, user_id, fresh=False):
+        """The user's token version, or None if the user no longer exists.
+        `fresh` skips this process's cache."""
+        version = None if fresh else self.cache.get(user_id)
+        if version is None:
+            from app import db
+            from app.models import User
+            version = db.session.query(User.token_version).filter_by(user_id=user_id).scalar()
+            if version is None:
+                return None
+            self.cache.set(user_id, version, ex=self.ttl)
+        return version
+
+    def is_revoked(self, payload):
+        user_id = int(payload['sub'])
+        version = self.current(user_id)
+        if version is not None and payload.get('tv', 0) > version:
+            # Issued after a bump made by another worker: this cache is stale
+            version = self.current(user_id, fresh=True)
+        return version is None or payload.get('tv', 0) != version
+
+    def bump(self, user):
+        """Revoke the user's existing tokens at the caller's commit; call remember() after it."""
+        user.token_version = (user.token_version or 0) + 1
+
+    def remember(self, user):
+        # Other workers notice within AUTH_TOKEN_VERSION_TTL seconds
+        self.cache.set(user.user_id, user.token_version, ex=self.ttl)
+
+
+token_versions = TokenVersions()
+
+
+def token_claims(user):
+    return {'name': user.name, 'email': user.email, 'tv': user.token_version or 0}
+
+
+def claimed_user(user_id):
+    """The current user's public fields from the token, or None for older tokens."""
+    claims = get_jwt()
+    if 'name' not in claims or 'email' not in claims:
+        return None
+    return {'user_id': user_id, 'name': claims['name'], 'email': claims['email']}
@@ -1,39 +1,224 @@
-from flask import Blueprint, request, jsonify
-from app import db
-from app.models import Transaction, Category
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
+from app import db, rollups, search
+from app.cache import report_cache
+from app.categories import category_registry, name_column
+from app.models import Transaction, Category, IngestReceipt
+from app.ingest import ingest_queue, QueueFull
+from app.exporters import FORMATS, export_response, parquet_available
+from app.money import to_cents
+from app.importers import iter_json_rows, iter_csv_rows, iter_ofx_rows, validate_row
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from datetime import datetime
+from datetime import datetime, date
+from sqlalchemy import or_, and_, insert, select, update, delete
+import base64
+import json
+import re
+import uuid
 
 transactions_bp = Blueprint('transactions', __name__)
 
+RECEIPT_ID = re.compile(r'[A-Za-z0-9_.:-]{1,64}')
+
+def _search_matches(user_id, q):
+    return search.matches(q, user_id, db.session.get_bind().dialect.name)
+
+def _transaction_filters(user_id, args, match=True):
+    """Filter criteria shared by listing, export and batch endpoints.
+    
+    `match=False` leaves out the q= condition, for callers that join
+    _search_matches() themselves to rank by it.
+    """
+    filters = [Transaction.user_id == user_id]
+    
+    type_filter = args.get('type')
+    category_id = args.get('category_id')
+    start_date = args.get('start_date')
+    end_date = args.get('end_date')
+    
+    if type_filter:
+        filters.append(Transaction.type == type_filter)
+    if category_id:
+        filters.append(Transaction.category_id == int(category_id))
+    if start_date:
+        filters.append(Transaction.date >= datetime.fromisoformat(start_date))
+    if end_date:
+        filters.append(Transaction.date <= datetime.fromisoformat(end_date))
+    if match and args.get('q'):
+        matched = _search_matches(user_id, args['q'])
+        filters.append(Transaction.transaction_id.in_(select(matched.c.transaction_id)))
+    
+    return filters
+
+def _encode_cursor(transaction):
+    raw = f"{transaction.date.isoformat()}|{transaction.transaction_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        date_part, id_part = raw.split('|')
+        return date.fromisoformat(date_part), int(id_part)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+# Search results are ranked by a score that moves with time and new rows, so
+# their pages are addressed by position rather than by a (date, id) key
+def _encode_search_cursor(offset):
+    return base64.urlsafe_b64encode(f"search|{offset}".encode()).decode()
+
+def _decode_search_cursor(cursor):
+    try:
+        kind, offset = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        if kind != 'search' or int(offset) < 0:
+            raise ValueError
+        return int(offset)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+def _stream_transactions(query, chunk_size):
+    yield '{"transactions": ['
+    first = True
+    buffer = []
+    for transaction in query.yield_per(chunk_size):
+        buffer.append(json.dumps(transaction.to_dict()))
+        if len(buffer) >= chunk_size:
+            yield ('' if first else ',') + ','.join(buffer)
+            first = False
+            buffer = []
+    if buffer:
+        yield ('' if first else ',') + ','.join(buffer)
+    yield ']}'
+
 @transactions_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_transactions():
     try:
         current_user_id = int(get_jwt_identity())
         
-        type_filter = request.args.get('type')
-        category_id = request.args.get('category_id')
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        
-        query = Transaction.query.filter_by(user_id=current_user_id)
-        
-        if type_filter:
-            query = query.filter_by(type=type_filter)
-        if category_id:
-            query = query.filter_by(category_id=category_id)
-        if start_date:
-            query = query.filter(Transaction.date >= datetime.fromisoformat(start_date))
-        if end_date:
-            query = query.filter(Transaction.date <= datetime.fromisoformat(end_date))
-        
-        transactions = query.order_by(Transaction.date.desc()).all()
+        limit = request.args.get('limit', type=int)
+        cursor = request.args.get('cursor')
+        stream = request.args.get('stream', '').lower() in ('1', 'true')
+        q = request.args.get('q')
+        
+        if q and not search.terms(q):
+            return jsonify({'error': 'Search query must contain at least one word'}), 400
+        
+        try:
+            filters = _transaction_filters(current_user_id, request.args, match=not q)
+        except ValueError:
+            return jsonify({'error': 'Invalid filter value'}), 400
+        
+        if q:
+            # Best matches first: relevance decayed by the transaction's age
+            matched = _search_matches(current_user_id, q)
+            query = Transaction.query.filter(*filters).join(
+                matched, matched.c.transaction_id == Transaction.transaction_id
+            ).order_by(
+                search.score(matched, db.session.get_bind().dialect.name).desc(),
+                Transaction.date.desc(),
+                Transaction.transaction_id.desc()
+            )
+        else:
+            query = Transaction.query.filter(*filters).order_by(
+                Transaction.date.desc(),
+                Transaction.transaction_id.desc()
+            )
+        
+        if stream:
+            chunk_size = current_app.config['TRANSACTIONS_STREAM_CHUNK_SIZE']
+            return Response(
+                stream_with_context(_stream_transactions(query, chunk_size)),
+                mimetype='application/json'
+            )
+        
+        # Without limit/cursor the full list is returned, as before
+        if limit is None and cursor is None:
+            transactions = query.all()
+            return jsonify({
+                'transactions': [t.to_dict() for t in transactions]
+            }), 200
+        
+        max_limit = current_app.config['TRANSACTIONS_PAGE_MAX_LIMIT']
+        limit = max(1, min(limit or max_limit, max_limit))
+        
+        if q:
+            try:
+                offset = _decode_search_cursor(cursor) if cursor else 0
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            transactions = query.offset(offset).limit(limit + 1).all()
+            has_more = len(transactions) > limit
+            return jsonify({
+                'transactions': [t.to_dict() for t in transactions[:limit]],
+                'next_cursor': _encode_search_cursor(offset + limit) if has_more else None
+            }), 200
+        
+        if cursor:
+            try:
+                cursor_date, cursor_id = _decode_cursor(cursor)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            query = query.filter(or_(
+                Transaction.date < cursor_date,
+                and_(Transaction.date == cursor_date, Transaction.transaction_id < cursor_id)
+            ))
+        
+        # Fetch one extra row to know whether another page exists
+        transactions = query.limit(limit + 1).all()
+        has_more = len(transactions) > limit
+        transactions = transactions[:limit]
         
         return jsonify({
-            'transactions': [t.to_dict() for t in transactions]
+            'transactions': [t.to_dict() for t in transactions],
+            'next_cursor': _encode_cursor(transactions[-1]) if has_more else None
         }), 200
-        
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+EXPORT_COLUMNS = [
+    ('transaction_id', 'int'),
+    ('date', 'date'),
+    ('type', 'str'),
+    ('amount_cents', 'int'),
+    ('category_id', 'int'),
+    ('category_name', 'str'),
+    ('notes', 'str'),
+    ('created_at', 'datetime')
+]
+
+@transactions_bp.route('/export', methods=['GET'])
+@jwt_required()
+def export_transactions():
+    try:
+        current_user_id = int(get_jwt_identity())
+        fmt = request.args.get('format', 'csv').lower()
+        
+        if fmt not in FORMATS:
+            return jsonify({'error': 'Format must be either csv or parquet'}), 400
+        if fmt == 'parquet' and not parquet_available():
+            return jsonify({'error': 'Parquet export requires pyarrow to be installed'}), 400
+        if request.args.get('q') and not search.terms(request.args['q']):
+            return jsonify({'error': 'Search query must contain at least one word'}), 400
+        
+        try:
+            filters = _transaction_filters(current_user_id, request.args)
+        except ValueError:
+            return jsonify({'error': 'Invalid filter value'}), 400
+        
+        statement = select(
+            Transaction.transaction_id,
+            Transaction.date,
+            Transaction.type,
+            Transaction.amount_cents,
+            Transaction.category_id,
+            name_column(current_user_id, Transaction.category_id),
+            Transaction.notes,
+            Transaction.created_at
+        ).where(*filters).order_by(Transaction.date.desc(), Transaction.transaction_id.desc())
+        
+        return export_response(statement, EXPORT_COLUMNS, fmt, 'transactions')
+    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -50,23 +235,338 @@ def add_transaction():
         if data['type'] not in ['income', 'expense']:
             return jsonify({'error': 'Type must be either income or expense'}), 400
         
+        try:
+            amount_cents = to_cents(data['amount'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        error = category_registry.validate(current_user_id, data['category_id'], data['type'])
+        if error:
+            return jsonify({'error': error}), 400
+        
         transaction = Transaction(
             user_id=current_user_id,
             type=data['type'],
-            amount=float(data['amount']),
-            category_id=data['category_id'],
+            amount_cents=amount_cents,
+            category_id=int(data['category_id']),
             date=datetime.fromisoformat(data['date']) if data.get('date') else datetime.utcnow(),
             notes=data.get('notes', '')
         )
         
         db.session.add(transaction)
+        rollups.record(transaction)
         db.session.commit()
+        report_cache.invalidate(current_user_id)
         
         return jsonify({
             'message': 'Transaction added successfully',
             'transaction': transaction.to_dict()
         }), 201
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+def _bulk_rows():
+    """Pick the row parser for the uploaded payload, or return an error message."""
+    upload = request.files.get('file')
+    if upload:
+        filename = (upload.filename or '').lower()
+        if filename.endswith(('.ofx', '.qfx')):
+            expense_category_id = request.form.get('category_id')
+            income_category_id = request.form.get('income_category_id', expense_category_id)
+            if not expense_category_id:
+                return None, 'category_id is required for OFX imports'
+            return iter_ofx_rows(upload.stream, expense_category_id, income_category_id), None
+        if filename.endswith('.csv'):
+            return iter_csv_rows(upload.stream), None
+        return None, 'Unsupported file type, upload a .csv or .ofx file'
+    
+    if request.mimetype == 'text/csv':
+        return iter_csv_rows(request.stream), None
+    
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('transactions')
+    if not isinstance(data, list):
+        return None, 'Expected a JSON array of transactions or a CSV/OFX file'
+    return iter_json_rows(data), None
+
+@transactions_bp.route('/bulk', methods=['POST'])
+@jwt_required()
+def bulk_import_transactions():
+    try:
+        current_user_id = int(get_jwt_identity())
+        
+        rows, error = _bulk_rows()
+        if error:
+            return jsonify({'error': error}), 400
+        
+        categories = category_registry.types(current_user_id)
+        
+        batch_size = current_app.config['BULK_IMPORT_BATCH_SIZE']
+        max_errors = current_app.config['BULK_IMPORT_MAX_ERRORS']
+        currency = current_app.config['CURRENCY']
+        deltas = rollups.Deltas()
+        batch = []
+        errors = []
+        inserted = 0
+        failed = 0
+        
+        # Everything goes into one database transaction; rows are sent in batches
+        for number, raw in rows:
+            try:
+                values = validate_row(raw, current_user_id, categories, currency)
+            except ValueError as e:
+                failed += 1
+                if len(errors) < max_errors:
+                    errors.append({'row': number, 'error': str(e)})
+                continue
+            
+            batch.append(values)
+            deltas.add(current_user_id, values['date'], values['category_id'], values['type'], values['amount_cents'])
+            if len(batch) >= batch_size:
+                db.session.execute(insert(Transaction.__table__), batch)
+                inserted += len(batch)
+                batch = []
+        
+        if batch:
+            db.session.execute(insert(Transaction.__table__), batch)
+            inserted += len(batch)
+        
+        deltas.apply()
+        db.session.commit()
+        report_cache.invalidate(current_user_id)
+        
+        return jsonify({
+            'message': f'Imported {inserted} transactions',
+            'inserted': inserted,
+            'failed': failed,
+            'errors': errors
+        }), 201 if inserted else 400
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@transactions_bp.route('/ingest', methods=['POST'])
+@jwt_required()
+def ingest_transaction():
+    try:
+        current_user_id = int(get_jwt_identity())
+        
+        if not ingest_queue.enabled:
+            return jsonify({'error': 'Ingestion is not enabled, POST to /api/transactions/ instead'}), 404
+        
+        # A client retrying with the same Idempotency-Key gets the row posted once
+        receipt_id = request.headers.get('Idempotency-Key') or uuid.uuid4().hex
+        if not RECEIPT_ID.fullmatch(receipt_id):
+            return jsonify({'error': 'Idempotency-Key must be 1-64 letters, digits, "-", "_", "." or ":"'}), 400
+        
+        try:
+            values = validate_row(
+                request.get_json(silent=True),
+                current_user_id,
+                category_registry.types(current_user_id),
+                current_app.config['CURRENCY']
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        try:
+            ingest_queue.submit(current_user_id, values, receipt_id)
+        except QueueFull:
+            response = jsonify({'error': 'Ingestion queue is full, retry shortly'})
+            response.headers['Retry-After'] = '1'
+            return response, 503
+        
+        return jsonify({
+            'message': 'Transaction accepted',
+            'receipt_id': receipt_id,
+            'status': 'pending',
+            'status_url': f'/api/transactions/ingest/{receipt_id}'
+        }), 202
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@transactions_bp.route('/ingest/<receipt_id>', methods=['GET'])
+@jwt_required()
+def get_ingest_receipt(receipt_id):
+    try:
+        current_user_id = int(get_jwt_identity())
         
+        receipt = db.session.get(IngestReceipt, (current_user_id, receipt_id))
+        if not receipt:
+            if ingest_queue.is_pending(current_user_id, receipt_id):
+                return jsonify({'receipt_id': receipt_id, 'status': 'pending'}), 200
+            return jsonify({'error': 'Receipt not found'}), 404
+        
+        return jsonify(receipt.to_dict()), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+BATCH_FILTER_KEYS = {'type', 'category_id', 'start_date', 'end_date', 'q'}
+
+def _batch_criteria(user_id, data):
+    """Rows a batch request targets: an `ids` list or a `filter` object taking
+    the same keys as the listing's query parameters. Returns (criteria, error)."""
+    if not isinstance(data, dict) or ('ids' in data) == ('filter' in data):
+        return None, 'Provide either ids or filter'
+    
+    if 'ids' in data:
+        ids = data['ids']
+        if not isinstance(ids, list) or not ids:
+            return None, 'ids must be a non-empty list'
+        if len(ids) > current_app.config['TRANSACTIONS_BATCH_MAX_IDS']:
+            return None, f"At most {current_app.config['TRANSACTIONS_BATCH_MAX_IDS']} ids per request"
+        try:
+            ids = {int(i) for i in ids}
+        except (TypeError, ValueError):
+            return None, 'ids must be integers'
+        return [Transaction.user_id == user_id, Transaction.transaction_id.in_(ids)], None
+    
+    # An empty filter would match every transaction the user has
+    filters = data['filter']
+    if not isinstance(filters, dict) or not filters:
+        return None, 'filter must be a non-empty object'
+    unknown = set(filters) - BATCH_FILTER_KEYS
+    if unknown:
+        return None, f"Unknown filter keys: {', '.join(sorted(unknown))}"
+    if filters.get('q') and not search.terms(filters['q']):
+        return None, 'Search query must contain at least one word'
+    try:
+        return _transaction_filters(user_id, filters), None
+    except (TypeError, ValueError):
+        return None, 'Invalid filter value'
+
+def _batch_values(user_id, changes):
+    """Column values for a batch update. Returns (values, error)."""
+    if not isinstance(changes, dict) or not changes:
+        return None, 'set must be a non-empty object'
+    
+    values = {}
+    if changes.get('type'):
+        if changes['type'] not in ['income', 'expense']:
+            return None, 'Type must be either income or expense'
+        values['type'] = changes['type']
+    
+    if changes.get('category_id'):
+        try:
+            category = category_registry.lookup(user_id, int(changes['category_id']))
+        except (TypeError, ValueError):
+            return None, 'Category must be an id'
+        if not category:
+            return None, 'Category not found'
+        if 'type' in values and values['type'] != category.type:
+            return None, f"Category is not an {values['type']} category"
+        values['category_id'] = category.category_id
+    
+    if changes.get('amount'):
+        try:
+            values['amount_cents'] = to_cents(changes['amount'])
+        except ValueError as e:
+            return None, str(e)
+    
+    if changes.get('date'):
+        try:
+            values['date'] = date.fromisoformat(str(changes['date'])[:10])
+        except ValueError:
+            return None, 'Date must be in YYYY-MM-DD format'
+    
+    if 'notes' in changes:
+        values['notes'] = changes['notes'] or ''
+    
+    if not values:
+        return None, 'Nothing to update'
+    return values, None
+
+@transactions_bp.route('/batch', methods=['PATCH'])
+@jwt_required()
+def batch_update_transactions():
+    try:
+        current_user_id = int(get_jwt_identity())
+        data = request.get_json(silent=True)
+        
+        criteria, error = _batch_criteria(current_user_id, data)
+        if error:
+            return jsonify({'error': error}), 400
+        values, error = _batch_values(current_user_id, data.get('set'))
+        if error:
+            return jsonify({'error': error}), 400
+        
+        if 'type' in values and 'category_id' not in values:
+            # Rows keep their categories, which must all be of the new type
+            allowed = [category_id for category_id, type_ in category_registry.types(current_user_id).items()
+                       if type_ == values['type']]
+            mismatched = db.session.query(Transaction.transaction_id).filter(
+                *criteria, Transaction.category_id.notin_(allowed)
+            ).first()
+            if mismatched:
+                return jsonify({'error': f"Category is not an {values['type']} category; set a category_id of that type too"}), 400
+        elif 'category_id' in values and 'type' not in values:
+            # Rows keep their types, which must all be the new category's, as PUT requires
+            category_type = category_registry.types(current_user_id)[values['category_id']]
+            mismatched = db.session.query(Transaction.transaction_id).filter(
+                *criteria, Transaction.type != category_type
+            ).first()
+            if mismatched:
+                return jsonify({'error': f"Category is an {category_type} category; set type to {category_type} too"}), 400
+        
+        # Months the rows leave (and, for a new date, the month they join)
+        # are re-aggregated after the update, in the same database transaction
+        touches_rollups = bool(set(values) - {'notes'})
+        months = rollups.months_of(*criteria) if touches_rollups else set()
+        if 'date' in values:
+            months.add((current_user_id, values['date'].year, values['date'].month))
+        
+        result = db.session.execute(
+            update(Transaction).where(*criteria).values(**values),
+            execution_options={'synchronize_session': False}
+        )
+        if result.rowcount:
+            rollups.refresh_months(months)
+        db.session.commit()
+        if result.rowcount:
+            report_cache.invalidate(current_user_id)
+        
+        return jsonify({
+            'message': f'Updated {result.rowcount} transactions',
+            'updated': result.rowcount
+        }), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@transactions_bp.route('/batch', methods=['DELETE'])
+@jwt_required()
+def batch_delete_transactions():
+    try:
+        current_user_id = int(get_jwt_identity())
+        data = request.get_json(silent=True)
+        
+        criteria, error = _batch_criteria(current_user_id, data)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        months = rollups.months_of(*criteria)
+        result = db.session.execute(
+            delete(Transaction).where(*criteria),
+            execution_options={'synchronize_session': False}
+        )
+        if result.rowcount:
+            rollups.refresh_months(months)
+        db.session.commit()
+        if result.rowcount:
+            report_cache.invalidate(current_user_id)
+        
+        return jsonify({
+            'message': f'Deleted {result.rowcount} transactions',
+            'deleted': result.rowcount
+        }), 200
+    
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -86,16 +586,34 @@ def update_transaction(transaction_id):
         
         data = request.get_json()
         
+        if data.get('type') and data['type'] not in ['income', 'expense']:
+            return jsonify({'error': 'Type must be either income or expense'}), 400
+        
+        try:
+            amount_cents = to_cents(data['amount']) if data.get('amount') else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if data.get('type') or data.get('category_id'):
+            error = category_registry.validate(
+                current_user_id,
+                data.get('category_id') or transaction.category_id,
+                data.get('type') or transaction.type
+            )
+            if error:
+                return jsonify({'error': error}), 400
+        
+        # Take the old values out of the rollups before changing anything
+        rollups.record(transaction, -1)
+        
         if data.get('type'):
-            if data['type'] not in ['income', 'expense']:
-                return jsonify({'error': 'Type must be either income or expense'}), 400
             transaction.type = data['type']
         
-        if data.get('amount'):
-            transaction.amount = float(data['amount'])
+        if amount_cents is not None:
+            transaction.amount_cents = amount_cents
         
         if data.get('category_id'):
-            transaction.category_id = data['category_id']
+            transaction.category_id = int(data['category_id'])
         
         if data.get('date'):
             transaction.date = datetime.fromisoformat(data['date'])
@@ -103,13 +621,15 @@ def update_transaction(transaction_id):
         if 'notes' in data:
             transaction.notes = data['notes']
         
+        rollups.record(transaction)
         db.session.commit()
+        report_cache.invalidate(current_user_id)
         
         return jsonify({
             'message': 'Transaction updated successfully',
             'transaction': transaction.to_dict()
         }), 200
-        
+    
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -127,11 +647,13 @@ def delete_transaction(transaction_id):
         if not transaction:
             return jsonify({'error': 'Transaction not found'}), 404
         
+        rollups.record(transaction, -1)
         db.session.delete(transaction)
         db.session.commit()
+        report_cache.invalidate(current_user_id)
         
         return jsonify({'message': 'Transaction deleted successfully'}), 200
-        
+    
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -142,14 +664,12 @@ def get_categories():
     try:
         current_user_id = int(get_jwt_identity())
         
-        categories = Category.query.filter(
-            (Category.is_custom == False) | (Category.user_id == current_user_id)
-        ).all()
+        categories = category_registry.available(current_user_id)
         
         return jsonify({
-            'categories': [c.to_dict() for c in categories]
+            'categories': [c._asdict() for c in categories]
         }), 200
-        
+    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -175,12 +695,14 @@ def add_category():
         
         db.session.add(category)
         db.session.commit()
+        category_registry.invalidate(current_user_id)
+        report_cache.invalidate(current_user_id)
         
         return jsonify({
             'message': 'Category created successfully',
             'category': category.to_dict()
         }), 201
-        
+    
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
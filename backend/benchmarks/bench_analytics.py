@@ -0,0 +1,49 @@
+"""Time /api/reports/forecast and /api/reports/anomalies on a 5-year history.
+
+The report cache is disabled so every request does the full computation.
+
+Usage: python benchmarks/bench_analytics.py [transactions]
+"""
+import sys
+import time
+from datetime import date
+
+from common import make_app, seed
+from flask_jwt_extended import create_access_token
+from app import db
+from app.models import Budget, Category
+
+TARGET_MS = 50
+
+
+def main(rows):
+    app, _ = make_app('analytics_%d' % rows, REPORT_CACHE_BACKEND='none')
+    with app.app_context():
+        db.create_all()
+        seed(rows, users=1, years=5)
+        today = date.today()
+        if not Budget.query.first():
+            for category in Category.query.filter_by(type='expense'):
+                db.session.add(Budget(user_id=1, category_id=category.category_id, monthly_limit_cents=200000,
+                                      month=today.month, year=today.year))
+            db.session.commit()
+        token = create_access_token(identity='1')
+    
+    client = app.test_client()
+    headers = {'Authorization': 'Bearer ' + token}
+    print('%d transactions over 5 years' % rows)
+    for url in ('/api/reports/forecast', '/api/reports/anomalies', '/api/reports/anomalies?months=60'):
+        client.get(url, headers=headers)
+        timings = []
+        for _ in range(20):
+            started = time.perf_counter()
+            response = client.get(url, headers=headers)
+            timings.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, response.get_data(as_text=True)
+        timings.sort()
+        median, worst = timings[len(timings) // 2], timings[-1]
+        print('%-36s median %6.1f ms, max %6.1f ms %s' % (url, median, worst, 'OK' if median < TARGET_MS else 'SLOW'))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
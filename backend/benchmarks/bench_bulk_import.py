@@ -0,0 +1,60 @@
+"""Measure POST /api/transactions/bulk throughput for a generated CSV upload.
+
+Usage: python benchmarks/bench_bulk_import.py [rows]
+"""
+import io
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+from common import make_app
+from flask_jwt_extended import create_access_token
+from app import db
+from app.models import User, Category
+
+
+def make_csv(rows, categories):
+    rng = random.Random(7)
+    first_day = date.today() - timedelta(days=365 * 5)
+    lines = ['type,amount,category_id,date,notes']
+    for i in range(rows):
+        category_id, type_ = rng.choice(categories)
+        day = first_day + timedelta(days=rng.randrange(365 * 5))
+        lines.append('%s,%.2f,%d,%s,row %d' % (type_, rng.uniform(1, 500), category_id, day.isoformat(), i))
+    return '\n'.join(lines).encode()
+
+
+def main(rows):
+    app, _ = make_app('bulk_import')
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add_all([
+            Category(name='Groceries', type='expense', is_custom=False),
+            Category(name='Salary', type='income', is_custom=False),
+        ])
+        user = User(name='Bench', email='bench@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        categories = [(c.category_id, c.type) for c in Category.query.all()]
+        token = create_access_token(identity=str(user.user_id))
+
+    body = make_csv(rows, categories)
+    client = app.test_client()
+    started = time.perf_counter()
+    response = client.post(
+        '/api/transactions/bulk',
+        data={'file': (io.BytesIO(body), 'history.csv')},
+        headers={'Authorization': 'Bearer ' + token},
+        content_type='multipart/form-data'
+    )
+    elapsed = time.perf_counter() - started
+    result = response.get_json()
+    print('status %d, inserted %d rows in %.2f s: %.0f rows/s (batch size %d)' % (
+        response.status_code, result['inserted'], elapsed, result['inserted'] / elapsed,
+        app.config['BULK_IMPORT_BATCH_SIZE']))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
@@ -0,0 +1,71 @@
+"""Compare concurrent transaction writes with SQLite defaults and with the
+tuned PRAGMAs from Config (WAL, synchronous=NORMAL, busy_timeout, ...).
+
+Usage: python benchmarks/bench_concurrent_writes.py [threads] [writes_per_thread]
+"""
+import sys
+import threading
+import time
+
+from common import make_app
+from flask_jwt_extended import create_access_token
+from app import db
+from app.models import User, Category
+
+PROFILES = {
+    'sqlite defaults': {
+        'SQLITE_JOURNAL_MODE': 'DELETE',
+        'SQLITE_SYNCHRONOUS': 'FULL',
+        'SQLITE_BUSY_TIMEOUT_MS': 0,
+        'SQLITE_MMAP_SIZE': 0,
+        'SQLITE_CACHE_SIZE': -2000
+    },
+    'tuned (Config)': {}
+}
+
+
+def writer(client, token, writes, errors):
+    headers = {'Authorization': 'Bearer ' + token}
+    for i in range(writes):
+        response = client.post('/api/transactions/', headers=headers, json={
+            'type': 'expense', 'amount': '12.50', 'category_id': 1, 'date': '2025-01-15'
+        })
+        if response.status_code != 201:
+            errors.append('locked' if 'database is locked' in response.get_data(as_text=True) else response.status_code)
+
+
+def run(label, overrides, threads, writes):
+    app, _ = make_app('concurrent_writes', **overrides)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(Category(name='Groceries', type='expense', is_custom=False))
+        tokens = []
+        for i in range(threads):
+            user = User(name='Writer %d' % i, email='writer%d@example.com' % i, password_hash='x')
+            db.session.add(user)
+            db.session.flush()
+            tokens.append(create_access_token(identity=str(user.user_id)))
+        db.session.commit()
+
+    errors = []
+    workers = [threading.Thread(target=writer, args=(app.test_client(), token, writes, errors)) for token in tokens]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    total = threads * writes
+    print('%-16s %5d writes in %6.2f s: %7.1f writes/s, %d failed %s' % (
+        label, total, elapsed, (total - len(errors)) / elapsed, len(errors), sorted(set(map(str, errors)))))
+
+
+def main(threads, writes):
+    for label, overrides in PROFILES.items():
+        run(label, overrides, threads, writes)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 8, int(sys.argv[2]) if len(sys.argv) > 2 else 200)
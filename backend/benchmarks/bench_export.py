@@ -0,0 +1,37 @@
+"""Stream a full transaction export and report throughput and peak memory.
+
+Usage: python benchmarks/bench_export.py [rows] [csv|parquet]
+"""
+import sys
+import time
+import tracemalloc
+
+from common import make_app, seed
+from flask_jwt_extended import create_access_token
+from app import db
+
+
+def main(rows, fmt):
+    app, _ = make_app('export_%d' % rows)
+    with app.app_context():
+        db.create_all()
+        seed(rows, users=1)
+        token = create_access_token(identity='1')
+
+    client = app.test_client()
+    tracemalloc.start()
+    started = time.perf_counter()
+    response = client.get('/api/transactions/export?format=' + fmt,
+                          headers={'Authorization': 'Bearer ' + token}, buffered=False)
+    size = 0
+    for chunk in response.response:
+        size += len(chunk)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print('%s: %d rows, %.1f MB in %.2f s (%.0f rows/s), peak Python memory %.1f MB' % (
+        fmt, rows, size / 1e6, elapsed, rows / elapsed, peak / 1e6))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000, sys.argv[2] if len(sys.argv) > 2 else 'csv')
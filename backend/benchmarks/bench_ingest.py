@@ -0,0 +1,90 @@
+"""Transaction posting rate through POST /api/transactions/ (one commit per
+row) and through the write-behind POST /api/transactions/ingest (journaled,
+then group-committed by the writer thread), with SQLITE_SYNCHRONOUS=FULL so
+both pay for durability.
+
+For ingestion, "accepted" is the rate clients got their 202s at and
+"committed" the rate up to the last receipt being committed.
+
+Usage: python benchmarks/bench_ingest.py [threads] [writes_per_thread]
+"""
+import os
+import shutil
+import sys
+import threading
+import time
+
+from common import BENCH_DIR, make_app
+from flask_jwt_extended import create_access_token
+from app import db
+from app.ingest import ingest_queue
+from app.models import User, Category, IngestReceipt
+
+JOURNAL_DIR = os.path.join(BENCH_DIR, 'ingest-journal')
+
+
+def reset():
+    for suffix in ('.db', '.db-wal', '.db-shm'):
+        if os.path.exists(os.path.join(BENCH_DIR, 'ingest' + suffix)):
+            os.remove(os.path.join(BENCH_DIR, 'ingest' + suffix))
+    shutil.rmtree(JOURNAL_DIR, ignore_errors=True)
+
+
+def writer(client, token, url, expected, writes, errors):
+    headers = {'Authorization': 'Bearer ' + token}
+    for i in range(writes):
+        response = client.post(url, headers=headers, json={
+            'type': 'expense', 'amount': '12.50', 'category_id': 1, 'date': '2025-01-15'
+        })
+        if response.status_code != expected:
+            errors.append(response.status_code)
+
+
+def run(label, url, expected, threads, writes, **overrides):
+    reset()
+    app, _ = make_app('ingest', SQLITE_SYNCHRONOUS='FULL', INGEST_JOURNAL_DIR=JOURNAL_DIR, **overrides)
+    with app.app_context():
+        db.create_all()
+        db.session.add(Category(name='Groceries', type='expense', is_custom=False))
+        tokens = []
+        for i in range(threads):
+            user = User(name='Writer %d' % i, email='writer%d@example.com' % i, password_hash='x')
+            db.session.add(user)
+            db.session.flush()
+            tokens.append(create_access_token(identity=str(user.user_id)))
+        db.session.commit()
+
+    errors = []
+    workers = [threading.Thread(target=writer, args=(app.test_client(), token, url, expected, writes, errors)) for token in tokens]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    accepted = time.perf_counter() - started
+
+    total = threads * writes
+    committed = accepted
+    if ingest_queue.enabled:
+        with app.app_context():
+            while db.session.query(IngestReceipt).count() < total - len(errors):
+                db.session.rollback()
+                time.sleep(0.01)
+        committed = time.perf_counter() - started
+        ingest_queue.stop()
+    print('%-22s %5d writes: %7.1f accepted/s, %7.1f committed/s, %d failed %s' % (
+        label, total, (total - len(errors)) / accepted, (total - len(errors)) / committed,
+        len(errors), sorted(set(map(str, errors)))))
+
+
+def main(threads, writes):
+    run('POST /transactions/', '/api/transactions/', 201, threads, writes)
+    for rows, ms in ((100, 10), (500, 50)):
+        run('ingest %d rows/%d ms' % (rows, ms), '/api/transactions/ingest', 202, threads, writes,
+            INGEST_ENABLED=True, INGEST_BATCH_ROWS=rows, INGEST_BATCH_MS=ms)
+    run('ingest, journal no fsync', '/api/transactions/ingest', 202, threads, writes,
+        INGEST_ENABLED=True, INGEST_JOURNAL_FSYNC=False)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 8, int(sys.argv[2]) if len(sys.argv) > 2 else 200)
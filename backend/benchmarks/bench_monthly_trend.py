@@ -0,0 +1,49 @@
+"""Compare the old per-month trend queries with the single grouped report query.
+
+Usage: python benchmarks/bench_monthly_trend.py [rows]
+"""
+import sys
+from datetime import date
+
+from common import make_app, seed, count_queries, timed
+from sqlalchemy import func, extract
+from app import db
+from app.models import Transaction
+from app.report_engine import monthly_totals
+
+
+def per_month_trend(user_id, year):
+    monthly_data = []
+    for month in range(1, 13):
+        income = db.session.query(func.sum(Transaction.amount_cents)).filter(
+            Transaction.user_id == user_id,
+            Transaction.type == 'income',
+            extract('month', Transaction.date) == month,
+            extract('year', Transaction.date) == year
+        ).scalar() or 0.0
+        expenses = db.session.query(func.sum(Transaction.amount_cents)).filter(
+            Transaction.user_id == user_id,
+            Transaction.type == 'expense',
+            extract('month', Transaction.date) == month,
+            extract('year', Transaction.date) == year
+        ).scalar() or 0.0
+        monthly_data.append({'month': month, 'income': income, 'expenses': expenses})
+    return monthly_data
+
+
+def main(rows):
+    app, _ = make_app('trend_%d' % rows)
+    with app.app_context():
+        db.create_all()
+        seed(rows, users=10)
+        year = date.today().year - 1
+
+        for label, fn in [('per-month queries', per_month_trend), ('grouped query', monthly_totals)]:
+            with count_queries() as counter:
+                fn(1, year)
+            elapsed, _ = timed(lambda: fn(1, year), repeat=3)
+            print('%-18s %3d queries  %8.1f ms' % (label, counter['count'], elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
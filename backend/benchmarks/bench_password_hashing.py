@@ -0,0 +1,67 @@
+"""Logins per second per core for each password hashing algorithm and cost.
+
+Every profile registers one user and then runs concurrent POST /api/auth/login
+requests, so the numbers include verification on the hashing pool plus the
+rest of the login path. Requests shed by backpressure (503) are counted apart.
+
+Usage: python benchmarks/bench_password_hashing.py [threads] [logins_per_thread]
+"""
+import os
+import sys
+import threading
+import time
+
+from common import make_app
+from app import db
+from app.passwords import password_hasher
+
+PROFILES = [
+    ('pbkdf2 100k / thread', {'PASSWORD_PBKDF2_ITERATIONS': 100000}),
+    ('pbkdf2 600k / thread', {'PASSWORD_PBKDF2_ITERATIONS': 600000}),
+    ('pbkdf2 600k / process', {'PASSWORD_PBKDF2_ITERATIONS': 600000, 'PASSWORD_HASH_POOL': 'process'}),
+    ('bcrypt 10 / thread', {'PASSWORD_HASH_ALGORITHM': 'bcrypt', 'PASSWORD_BCRYPT_ROUNDS': 10}),
+    ('bcrypt 12 / thread', {'PASSWORD_HASH_ALGORITHM': 'bcrypt', 'PASSWORD_BCRYPT_ROUNDS': 12}),
+]
+
+
+def worker(client, logins, results):
+    for _ in range(logins):
+        response = client.post('/api/auth/login', json={'email': 'bench@example.com', 'password': 'correct horse'})
+        results.append(response.status_code)
+
+
+def run(label, overrides, threads, logins):
+    app, _ = make_app('password_hashing', **overrides)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    client = app.test_client()
+    client.post('/api/auth/register', json={'name': 'Bench', 'email': 'bench@example.com', 'password': 'correct horse'})
+    # Warm the pool so process start-up is not measured
+    client.post('/api/auth/login', json={'email': 'bench@example.com', 'password': 'correct horse'})
+
+    results = []
+    workers = [threading.Thread(target=worker, args=(app.test_client(), logins, results)) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    password_hasher.shutdown()
+
+    succeeded = results.count(200)
+    cores = min(app.config['PASSWORD_HASH_WORKERS'], os.cpu_count() or 1)
+    print('%-22s %6.1f logins/s, %6.1f per core, %d shed (503), %d other errors' % (
+        label, succeeded / elapsed, succeeded / elapsed / cores, results.count(503),
+        len(results) - succeeded - results.count(503)))
+
+
+def main(threads, logins):
+    print('%d threads x %d logins, %d cores' % (threads, logins, os.cpu_count() or 1))
+    for label, overrides in PROFILES:
+        run(label, overrides, threads, logins)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 8, int(sys.argv[2]) if len(sys.argv) > 2 else 10)
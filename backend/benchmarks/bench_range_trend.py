@@ -0,0 +1,49 @@
+"""Time /api/reports/trend over a 10-year range at every granularity.
+
+The report cache is disabled so every request runs the query. By default one
+user owns all `rows` transactions, the worst case for day and week buckets,
+which read raw transactions (months and quarters read the rollups).
+
+Usage: python benchmarks/bench_range_trend.py [rows] [users]
+"""
+import sys
+import time
+from datetime import date
+
+from common import make_app, seed
+from flask_jwt_extended import create_access_token
+from app import db
+
+TARGET_MS = 100
+YEARS = 10
+
+
+def main(rows, users):
+    app, _ = make_app('range_trend_%d_%d' % (rows, users), REPORT_CACHE_BACKEND='none')
+    with app.app_context():
+        db.create_all()
+        seed(rows, users=users, years=YEARS)
+        token = create_access_token(identity='1')
+
+    client = app.test_client()
+    headers = {'Authorization': 'Bearer ' + token}
+    today = date.today()
+    start = date(today.year - YEARS, today.month, 1)
+    print('%d transactions over %d years, %d users' % (rows, YEARS, users))
+    for granularity in ('quarter', 'month', 'week', 'day'):
+        url = '/api/reports/trend?start=%s&end=%s&granularity=%s' % (start, today, granularity)
+        client.get(url, headers=headers)
+        timings = []
+        for _ in range(10):
+            started = time.perf_counter()
+            response = client.get(url, headers=headers)
+            timings.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, response.get_data(as_text=True)
+        timings.sort()
+        median = timings[len(timings) // 2]
+        print('%-8s %5d periods  median %7.1f ms %s' % (
+            granularity, len(response.get_json()['trend']), median, 'OK' if median < TARGET_MS else 'SLOW'))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000, int(sys.argv[2]) if len(sys.argv) > 2 else 1)
@@ -0,0 +1,119 @@
+"""Time ?q= full-text search on 1M transaction notes against a LIKE scan.
+
+Seeds `rows` transactions with random notes (words drawn from a skewed
+vocabulary, so some terms are rare and some very common) spread over
+`users` users, timing the inserts with the index triggers in place. Then
+times ranked, paginated searches through the API next to an unranked,
+newest-first `notes LIKE '%word%'` query (which can stop early on common
+terms but scans every row of the user's history for rare ones), and checks
+that update and delete keep the index in sync.
+
+Usage: python benchmarks/bench_search.py [rows] [users]
+"""
+import itertools
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+from common import make_app
+from flask_jwt_extended import create_access_token
+from sqlalchemy import insert, select
+from app import db, rollups
+from app.models import User, Category, Transaction
+
+VOCABULARY = 5000
+TARGET_MS = 50
+
+
+def word(i):
+    return 'w%04d' % i
+
+
+def seed_notes(rows, users, years=5):
+    rng = random.Random(11)
+    db.session.add(Category(name='Shopping', type='expense', is_custom=False))
+    db.session.execute(insert(User.__table__), [
+        {'name': 'User %d' % i, 'email': 'user%d@example.com' % i, 'password_hash': 'x', 'token_version': 0}
+        for i in range(users)
+    ])
+    db.session.commit()
+
+    # Zipf-like: word 0 is in a large share of notes, the tail is rare
+    cumulative = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(VOCABULARY)))
+    first_day = date.today() - timedelta(days=365 * years)
+    batch = []
+    for i in range(rows):
+        batch.append({
+            'user_id': i % users + 1,
+            'type': 'expense',
+            'amount_cents': rng.randrange(100, 50000),
+            'category_id': 1,
+            'date': first_day + timedelta(days=rng.randrange(365 * years)),
+            'notes': ' '.join(word(w) for w in rng.choices(range(VOCABULARY), cum_weights=cumulative, k=rng.randint(2, 6)))
+        })
+        if len(batch) == 50000:
+            db.session.execute(insert(Transaction.__table__), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(Transaction.__table__), batch)
+    rollups.rebuild()
+    db.session.commit()
+
+
+def median_ms(fn, repeat=15):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2], result
+
+
+def main(rows, users):
+    app, _ = make_app('search_%d' % rows)
+    with app.app_context():
+        db.create_all()
+        if not Transaction.query.first():
+            started = time.perf_counter()
+            seed_notes(rows, users)
+            elapsed = time.perf_counter() - started
+            print('seeded %d notes (index kept by triggers) in %.1f s (%.0f rows/s)' % (rows, elapsed, rows / elapsed))
+        token = create_access_token(identity='1')
+
+    client = app.test_client()
+    headers = {'Authorization': 'Bearer ' + token}
+    print('%d notes, %d per user' % (rows, rows // users))
+
+    for term in (word(0), word(50), word(2000), word(2000)[:4], '%s %s' % (word(1), word(2))):
+        url = '/api/transactions/?limit=50&q=' + term.replace(' ', '+')
+        client.get(url, headers=headers)
+        search_ms, response = median_ms(lambda: client.get(url, headers=headers))
+        assert response.status_code == 200, response.get_data(as_text=True)
+        with app.app_context():
+            like = select(Transaction.transaction_id).where(
+                Transaction.user_id == 1,
+                *[Transaction.notes.like('%' + part + '%') for part in term.split()]
+            ).order_by(Transaction.date.desc()).limit(50)
+            like_ms, _ = median_ms(lambda: db.session.execute(like).all(), repeat=5)
+            matches = db.session.execute(select(db.func.count()).select_from(Transaction).where(
+                Transaction.user_id == 1,
+                *[Transaction.notes.like('%' + part + '%') for part in term.split()]
+            )).scalar()
+        print('q=%-12s %6d matches  search %7.1f ms  LIKE %7.1f ms %s' % (
+            term, matches, search_ms, like_ms, 'OK' if search_ms < TARGET_MS else 'SLOW'))
+
+    # Update and delete go through the triggers like any other write
+    marker = 'zzmarker'
+    transaction = client.get('/api/transactions/?limit=1', headers=headers).get_json()['transactions'][0]
+    client.put('/api/transactions/%d' % transaction['transaction_id'], json={'notes': marker}, headers=headers)
+    found = client.get('/api/transactions/?q=' + marker, headers=headers).get_json()['transactions']
+    assert [t['transaction_id'] for t in found] == [transaction['transaction_id']], found
+    client.delete('/api/transactions/%d' % transaction['transaction_id'], headers=headers)
+    assert client.get('/api/transactions/?q=' + marker, headers=headers).get_json()['transactions'] == []
+    print('update and delete kept the index in sync')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000, int(sys.argv[2]) if len(sys.argv) > 2 else 10)
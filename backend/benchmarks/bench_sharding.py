@@ -0,0 +1,94 @@
+"""Concurrent transaction writes with all users in one SQLite file and spread
+over 2 and 4 shard files, then the cost of appending a shard and rebalancing.
+
+Each thread writes as its own user, as in bench_concurrent_writes.py. With one
+database every commit takes the same write lock; with shards only users on
+the same file contend.
+
+Usage: python benchmarks/bench_sharding.py [threads] [writes_per_thread]
+"""
+import os
+import sys
+import threading
+import time
+
+from common import BENCH_DIR, make_app
+from flask_jwt_extended import create_access_token
+from app import db, sharding
+from app.models import User, Category
+
+SHARD_COUNTS = (0, 2, 4)
+
+
+def shard_urls(count):
+    return ' '.join('sqlite:///' + os.path.join(BENCH_DIR, 'sharding_shard%d.db' % i) for i in range(count))
+
+
+def reset(count):
+    for name in ['sharding'] + ['sharding_shard%d' % i for i in range(count + 1)]:
+        for suffix in ('.db', '.db-wal', '.db-shm'):
+            if os.path.exists(os.path.join(BENCH_DIR, name + suffix)):
+                os.remove(os.path.join(BENCH_DIR, name + suffix))
+
+
+def writer(client, token, writes, errors):
+    headers = {'Authorization': 'Bearer ' + token}
+    for i in range(writes):
+        response = client.post('/api/transactions/', headers=headers, json={
+            'type': 'expense', 'amount': '12.50', 'category_id': 1, 'date': '2025-01-15'
+        })
+        if response.status_code != 201:
+            errors.append('locked' if 'database is locked' in response.get_data(as_text=True) else response.status_code)
+
+
+def run(count, threads, writes):
+    reset(count)
+    app, _ = make_app('sharding', SHARD_DATABASE_URLS=shard_urls(count))
+    with app.app_context():
+        db.create_all()
+        sharding.create_all()
+        db.session.add(Category(name='Groceries', type='expense', is_custom=False))
+        tokens = []
+        for i in range(threads):
+            user = User(name='Writer %d' % i, email='writer%d@example.com' % i, password_hash='x')
+            db.session.add(user)
+            db.session.flush()
+            tokens.append(create_access_token(identity=str(user.user_id)))
+        db.session.commit()
+
+    errors = []
+    workers = [threading.Thread(target=writer, args=(app.test_client(), token, writes, errors)) for token in tokens]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    total = threads * writes
+    label = '%d shards' % count if count else 'one database'
+    print('%-14s %5d writes in %6.2f s: %7.1f writes/s, %d failed %s' % (
+        label, total, elapsed, (total - len(errors)) / elapsed, len(errors), sorted(set(map(str, errors)))))
+
+
+def rebalance(count, threads):
+    app, _ = make_app('sharding', SHARD_DATABASE_URLS=shard_urls(count + 1))
+    with app.app_context():
+        started = time.perf_counter()
+        sharding.create_all()
+        moves = sharding.misplaced()
+        rows = sum(sharding.move_user(user_id, source, target) for user_id, source, target in moves)
+        elapsed = time.perf_counter() - started
+        assert sharding.misplaced() == []
+    print('%d -> %d shards: moved %d of %d users (%d rows) in %.2f s' % (
+        count, count + 1, len(moves), threads, rows, elapsed))
+
+
+def main(threads, writes):
+    for count in SHARD_COUNTS:
+        run(count, threads, writes)
+    rebalance(SHARD_COUNTS[-1], threads)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 8, int(sys.argv[2]) if len(sys.argv) > 2 else 200)
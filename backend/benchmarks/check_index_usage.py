@@ -0,0 +1,79 @@
+"""Run EXPLAIN against the statements issued by the report helpers and the
+rollup maintenance paths, and fail if any of them falls back to a full scan of
+the transactions or monthly_category_totals tables.
+
+Usage: python benchmarks/check_index_usage.py
+"""
+import re
+import sys
+
+from common import make_app, seed
+from sqlalchemy import event
+from app import db, rollups
+from app.report_engine import monthly_totals, month_totals, category_totals, budget_status
+
+TABLES = ('transactions', 'monthly_category_totals')
+
+
+def captured_statements(fn, *args):
+    statements = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', on_execute)
+    try:
+        fn(*args)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', on_execute)
+    return statements
+
+
+def explain(statement, parameters):
+    prefix = 'EXPLAIN QUERY PLAN ' if db.engine.dialect.name == 'sqlite' else 'EXPLAIN '
+    rows = db.session.connection().exec_driver_sql(prefix + statement, parameters).all()
+    return '\n'.join(str(row[-1]) for row in rows)
+
+
+def full_scans(plan):
+    if db.engine.dialect.name == 'sqlite':
+        # "SCAN t" is a table scan; "SCAN t USING INDEX" / "SEARCH t ..." are not
+        pattern = r'^SCAN (%s)(?! USING)' % '|'.join(TABLES)
+    else:
+        pattern = r'Seq Scan on (%s)\b' % '|'.join(TABLES)
+    return [m.group(1) for m in re.finditer(pattern, plan, re.MULTILINE)]
+
+
+def main():
+    app, _ = make_app('indexes')
+    failures = 0
+    with app.app_context():
+        db.create_all()
+        seed(20000, users=5)
+
+        checks = [
+            ('monthly trend', monthly_totals, (1, 2024)),
+            ('month totals', month_totals, (1, 6, 2024)),
+            ('category totals', category_totals, (1, 6, 2024)),
+            ('budget status', budget_status, (1, 6, 2024)),
+            ('refresh months', rollups.refresh_months, ([(1, 2024, 6)],)),
+        ]
+
+        for label, fn, args in checks:
+            for statement, parameters in captured_statements(fn, *args):
+                if not any(table in statement for table in TABLES) or statement.startswith(('SAVEPOINT', 'RELEASE')):
+                    continue
+                plan = explain(statement, parameters)
+                scanned = full_scans(plan)
+                failures += 1 if scanned else 0
+                print('%-16s %s' % (label, 'FULL SCAN of ' + ', '.join(scanned) if scanned else 'ok'))
+                if scanned:
+                    print(statement)
+                    print(plan)
+        db.session.rollback()
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
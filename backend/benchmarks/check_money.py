@@ -0,0 +1,97 @@
+"""Randomized checks of app/money.py against Decimal arithmetic.
+
+For random amounts in every minor-unit exponent (0, 2 and 3 decimals):
+Money.parse/to_cents round half up exactly as Decimal.quantize does, stored
+cents below JSON_EXACT survive the trip through the JSON float and back,
+amount_formatter agrees with Money.to_json, and sums of parsed amounts equal
+the Decimal sums. Values that are not amounts must raise ValueError.
+
+Usage: python benchmarks/check_money.py [iterations] [seed]
+"""
+import random
+import sys
+from decimal import Decimal, ROUND_HALF_UP
+
+import common  # noqa: F401 (puts the backend on sys.path)
+from app.money import Money, MAX_CENTS, amount_formatter, to_amount, to_cents
+
+CURRENCIES = ('USD', 'JPY', 'KWD')
+# A float holds any 15 significant digits exactly, so JSON amounts below this
+# many minor units (10 trillion dollars) read back as the stored value
+JSON_EXACT = 10 ** 15
+INVALID = ('abc', '', '1.2.3', 'nan', 'NaN', 'inf', '-Infinity', None, True, [], {}, '1e30', str(MAX_CENTS + 1))
+
+
+def random_text(rng):
+    """A decimal string with up to 6 fraction digits, sometimes negative or padded."""
+    whole = rng.choice([0, rng.randrange(10), rng.randrange(10 ** 6), rng.randrange(10 ** 12)])
+    digits = rng.randrange(7)
+    text = str(whole) + ('.' + ''.join(rng.choice('0123456789') for _ in range(digits)) if digits else '')
+    if rng.random() < 0.2:
+        text = '-' + text
+    if rng.random() < 0.1:
+        text = ' %s ' % text
+    return text
+
+
+def expected_cents(text, currency):
+    scaled = Decimal(text.strip()).scaleb(Money.exponent(currency))
+    return int(scaled.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def main(iterations, seed):
+    rng = random.Random(seed)
+    failures = []
+
+    def check(label, passed, detail):
+        if not passed and len(failures) < 20:
+            failures.append('%s: %r' % (label, detail))
+        return passed
+
+    for currency in CURRENCIES:
+        exponent = Money.exponent(currency)
+        format_amount = amount_formatter(currency)
+        texts = []
+        for _ in range(iterations):
+            text = random_text(rng)
+            texts.append(text)
+            cents = Money.parse(text, currency).cents
+            check('parse rounds half up', cents == expected_cents(text, currency), (currency, text, cents))
+
+            stored = rng.choice([rng.randrange(-10 ** 6, 10 ** 6), rng.randrange(-JSON_EXACT, JSON_EXACT)])
+            money = Money(stored, currency)
+            check('decimal round trip', Money.parse(money.to_decimal(), currency).cents == stored, (currency, stored))
+            check('JSON float round trip', Money.parse(money.to_json(), currency).cents == stored, (currency, stored))
+            check('to_json is the exact decimal', Decimal(repr(money.to_json())) == money.to_decimal(), (currency, stored))
+            large = rng.randrange(-2 ** 53, 2 ** 53)
+            check('formatter matches to_json', format_amount(large) == Money(large, currency).to_json(), (currency, large))
+
+        total = sum((Money.parse(text, currency) for text in texts), Money(0, currency))
+        exact = sum(Decimal(expected_cents(text, currency)).scaleb(-exponent) for text in texts)
+        check('sum matches Decimal', total.to_decimal() == exact, (currency, total, exact))
+
+        for value in INVALID:
+            try:
+                Money.parse(value, currency)
+                check('rejects invalid', False, (currency, value))
+            except ValueError:
+                pass
+
+    # The configured-currency helpers (USD outside an app context)
+    for _ in range(iterations):
+        text = random_text(rng)
+        cents = to_cents(text)
+        check('to_cents', cents == expected_cents(text, 'USD'), text)
+        check('to_amount round trip', to_cents(to_amount(cents)) == cents, cents)
+    values = [rng.choice(['0.1', '0.2', '0.3', 0.1, 0.2, 19.99]) for _ in range(iterations)]
+    check('sum of cents matches Decimal',
+          Decimal(sum(to_cents(v) for v in values)) / 100 == sum(Decimal(str(v)) for v in values), values[:10])
+
+    for failure in failures:
+        print('FAIL', failure)
+    print('%d iterations per currency (seed %d): %s' % (iterations, seed, 'failed' if failures else 'ok'))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000, int(sys.argv[2]) if len(sys.argv) > 2 else 42))
@@ -0,0 +1,100 @@
+"""Count the SQL statements each list and batch endpoint issues for a small
+and a large user and fail if the count grows with the number of rows involved.
+
+Usage: python benchmarks/check_query_counts.py
+"""
+import sys
+from datetime import date
+
+from common import make_app, count_queries
+from flask_jwt_extended import create_access_token
+from sqlalchemy import insert
+from app import db, rollups
+from app.models import User, Category, Transaction, Budget, SavingsGoal
+
+ENDPOINTS = [
+    '/api/transactions/',
+    '/api/transactions/?limit=100',
+    '/api/transactions/?stream=1',
+    '/api/budgets/',
+    '/api/goals/',
+    '/api/reports/dashboard',
+    '/api/reports/monthly-trend',
+]
+
+# Run after the list endpoints; each touches every transaction the user has
+BATCH_REQUESTS = [
+    ('PATCH', '/api/transactions/batch', {'filter': {'type': 'expense'}, 'set': {'notes': 'edited'}}),
+    ('PATCH', '/api/transactions/batch', {'filter': {'q': 'edited'}, 'set': {'amount': 12.5}}),
+    ('DELETE', '/api/transactions/batch', {'filter': {'type': 'expense'}}),
+]
+
+
+def add_user(name, size):
+    today = date.today()
+    user = User(name=name, email=name + '@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.flush()
+
+    categories = []
+    for i in range(size):
+        category = Category(name='%s %d' % (name, i), type='expense', is_custom=True, user_id=user.user_id)
+        db.session.add(category)
+        categories.append(category)
+    db.session.flush()
+
+    db.session.execute(insert(Transaction), [{
+        'user_id': user.user_id,
+        'type': 'expense',
+        'amount_cents': 1000,
+        'category_id': categories[i % size].category_id,
+        'date': today,
+        'notes': ''
+    } for i in range(size * 10)])
+    for category in categories:
+        db.session.add(Budget(user_id=user.user_id, category_id=category.category_id,
+                              monthly_limit_cents=10000, month=today.month, year=today.year))
+        db.session.add(SavingsGoal(user_id=user.user_id, title=category.name, target_amount_cents=10000))
+    rollups.rebuild(user.user_id)
+    db.session.commit()
+    return create_access_token(identity=str(user.user_id))
+
+
+def main():
+    app, _ = make_app('query_counts')
+    failures = 0
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        small = add_user('small', 2)
+        large = add_user('large', 50)
+        client = app.test_client()
+
+        for url in ENDPOINTS:
+            counts = []
+            for token in (small, large):
+                with count_queries() as counter:
+                    response = client.get(url, headers={'Authorization': 'Bearer ' + token})
+                    response.get_data()
+                assert response.status_code == 200, (url, response.status_code)
+                counts.append(counter['count'])
+            grew = counts[1] > counts[0]
+            failures += 1 if grew else 0
+            print('%-32s %3d -> %3d queries  %s' % (url, counts[0], counts[1], 'GREW' if grew else 'ok'))
+
+        for method, url, body in BATCH_REQUESTS:
+            counts = []
+            for token in (small, large):
+                with count_queries() as counter:
+                    response = client.open(url, method=method, json=body, headers={'Authorization': 'Bearer ' + token})
+                assert response.status_code == 200, (url, response.status_code, response.get_json())
+                counts.append(counter['count'])
+            grew = counts[1] > counts[0]
+            failures += 1 if grew else 0
+            print('%-32s %3d -> %3d queries  %s' % (method + ' ' + url, counts[0], counts[1], 'GREW' if grew else 'ok'))
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""Check which database each request reads from with one SQLite read replica
+kept in sync by "flask replicas sync" (the backup-API stand-in).
+
+Fails unless: read-only GETs use the replica, writes use the primary, a
+writer reads from the primary until the replica has synced past the write,
+and a lagging or unreachable replica is skipped.
+
+Usage: python benchmarks/check_replica_routing.py
+"""
+import os
+import shutil
+import sys
+import time
+
+from common import BENCH_DIR, make_app
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from app import db
+from app.models import User, Category
+
+MAX_LAG = 1.0
+
+
+def main():
+    replica_path = os.path.join(BENCH_DIR, 'replica_routing_replica.db')
+    for path in (replica_path, os.path.join(BENCH_DIR, 'replica_routing.db')):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+    app, _ = make_app(
+        'replica_routing',
+        REPLICA_DATABASE_URLS='sqlite:///' + replica_path,
+        REPLICA_MAX_LAG_SECONDS=MAX_LAG,
+        REPLICA_LAG_CHECK_SECONDS=0,
+        REPORT_CACHE_BACKEND='none'
+    )
+    used = []
+
+    def spy(name):
+        def on_execute(conn, cursor, statement, parameters, context, executemany):
+            if 'replica_heartbeat' not in statement:
+                used.append(name)
+        return on_execute
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(Category(name='Groceries', type='expense', is_custom=False))
+        users = [User(name='Reader %d' % i, email='reader%d@example.com' % i, password_hash='x') for i in range(2)]
+        db.session.add_all(users)
+        db.session.commit()
+        writer, reader = [{'Authorization': 'Bearer ' + create_access_token(identity=str(user.user_id))} for user in users]
+        event.listen(db.engine, 'before_cursor_execute', spy('primary'))
+        event.listen(db.engines['replica0'], 'before_cursor_execute', spy('replica'))
+
+    client = app.test_client()
+    runner = app.test_cli_runner()
+    failures = 0
+
+    def check(label, method, url, headers, expected, **kwargs):
+        nonlocal failures
+        used.clear()
+        response = client.open(url, method=method, headers=headers, **kwargs)
+        assert response.status_code < 400, (url, response.status_code, response.get_data(as_text=True))
+        engines = set(used)
+        passed = engines == {expected}
+        failures += 0 if passed else 1
+        print('%-44s %-8s %s' % (label, '+'.join(sorted(engines)) or '-', 'ok' if passed else 'expected ' + expected))
+
+    def sync():
+        result = runner.invoke(args=['replicas', 'sync'])
+        assert result.exit_code == 0, result.output
+
+    check('never synced', 'GET', '/api/transactions/', reader, 'primary')
+    sync()
+    for url in ('/api/transactions/', '/api/reports/dashboard', '/api/budgets/', '/api/goals/'):
+        check('GET ' + url, 'GET', url, reader, 'replica')
+    check('GET /api/recurring/ (not read-routed)', 'GET', '/api/recurring/', reader, 'primary')
+    check('POST /api/transactions/', 'POST', '/api/transactions/', writer, 'primary', json={
+        'type': 'expense', 'amount': '12.50', 'category_id': 1, 'date': '2025-01-15'
+    })
+    check('writer reads right after the write', 'GET', '/api/transactions/', writer, 'primary')
+    check('other users are unaffected', 'GET', '/api/transactions/', reader, 'replica')
+    sync()
+    check('writer after the replica caught up', 'GET', '/api/transactions/', writer, 'replica')
+    time.sleep(MAX_LAG + 0.2)
+    check('replica lagging past the limit', 'GET', '/api/transactions/', reader, 'primary')
+    sync()
+    check('replica synced again', 'GET', '/api/transactions/', reader, 'replica')
+    os.remove(replica_path)
+    os.makedirs(replica_path)
+    with app.app_context():
+        db.engines['replica0'].dispose()
+    check('replica unreachable', 'GET', '/api/transactions/', reader, 'primary')
+    shutil.rmtree(replica_path)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
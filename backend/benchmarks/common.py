@@ -0,0 +1,94 @@
+import os
+import sys
+import random
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, insert
+from config import Config
+from app import create_app, db, rollups
+from app.models import User, Category, Transaction
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def make_app(name, **overrides):
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    path = os.path.join(BENCH_DIR, name + '.db')
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + path
+
+    for key, value in overrides.items():
+        setattr(BenchConfig, key, value)
+
+    return create_app(BenchConfig), path
+
+
+def seed(rows, users=1, years=5, seed_value=42):
+    """Fill an empty database with `rows` random transactions spread over `users`."""
+    if Transaction.query.first():
+        return
+
+    rng = random.Random(seed_value)
+    expense = ['Food & Dining', 'Shopping', 'Transportation', 'Bills & Utilities', 'Groceries', 'Travel']
+    income = ['Salary', 'Freelance']
+    for name in expense:
+        db.session.add(Category(name=name, type='expense', is_custom=False))
+    for name in income:
+        db.session.add(Category(name=name, type='income', is_custom=False))
+    for i in range(users):
+        db.session.add(User(name='Bench %d' % i, email='bench%d@example.com' % i, password_hash='x'))
+    db.session.commit()
+
+    categories = [(c.category_id, c.type) for c in Category.query.all()]
+    user_ids = [u.user_id for u in User.query.all()]
+    first_day = date.today() - timedelta(days=365 * years)
+    span = 365 * years
+
+    batch = []
+    for _ in range(rows):
+        category_id, type_ = rng.choice(categories)
+        batch.append({
+            'user_id': rng.choice(user_ids),
+            'type': type_,
+            'amount_cents': rng.randrange(100, 50000),
+            'category_id': category_id,
+            'date': first_day + timedelta(days=rng.randrange(span)),
+            'notes': ''
+        })
+        if len(batch) == 50000:
+            db.session.execute(insert(Transaction.__table__), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(Transaction.__table__), batch)
+    rollups.rebuild()
+    db.session.commit()
+
+
+@contextmanager
+def count_queries():
+    """Count the SQL statements executed on the default engine inside the block."""
+    counter = {'count': 0}
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        counter['count'] += 1
+
+    event.listen(db.engine, 'before_cursor_execute', on_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', on_execute)
+
+
+def timed(fn, repeat=5):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
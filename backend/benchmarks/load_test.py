@@ -0,0 +1,97 @@
+"""Load-test GET /api/reports/dashboard under gunicorn at several worker counts.
+
+Starts gunicorn (gunicorn.conf.py settings) against a seeded SQLite database
+for each worker count, drives it with concurrent keep-alive clients and reports
+requests per second and p50/p99 latency. The report cache is disabled so every
+request does real work.
+
+Usage: python benchmarks/load_test.py [seconds] [clients]
+"""
+import http.client
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from common import make_app, seed
+from flask_jwt_extended import create_access_token
+from app import db
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORT = 5099
+WORKER_COUNTS = (1, 4, 16)
+
+
+def wait_for_server(timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', PORT, timeout=1)
+            conn.request('GET', '/api/reports/dashboard')
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn did not start')
+
+
+def client(token, stop_at, latencies, errors):
+    conn = http.client.HTTPConnection('127.0.0.1', PORT, timeout=30)
+    headers = {'Authorization': 'Bearer ' + token}
+    while time.perf_counter() < stop_at:
+        started = time.perf_counter()
+        try:
+            conn.request('GET', '/api/reports/dashboard', headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException):
+            errors.append('connection')
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', PORT, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+def run(workers, token, env, seconds, clients):
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', '127.0.0.1:%d' % PORT,
+         '--workers', str(workers), '--access-logfile', '/dev/null', 'wsgi:app'],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_for_server()
+        latencies, errors = [], []
+        stop_at = time.perf_counter() + seconds
+        threads = [threading.Thread(target=client, args=(token, stop_at, latencies, errors)) for _ in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0
+    print('%2d workers: %7.1f req/s  p50 %6.1f ms  p99 %6.1f ms  errors %d' % (
+        workers, len(latencies) / seconds, p50, p99, len(errors)))
+
+
+def main(seconds, clients):
+    app, path = make_app('load_test')
+    with app.app_context():
+        db.create_all()
+        seed(200000, users=50)
+        token = create_access_token(identity='1')
+
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + path, REPORT_CACHE_BACKEND='none')
+    for workers in WORKER_COUNTS:
+        run(workers, token, env, seconds, clients)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10, int(sys.argv[2]) if len(sys.argv) > 2 else 32)
@@ -5,6 +5,151 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///finance.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    
+    # Connection pool (SQLALCHEMY_ENGINE_OPTIONS is built from these in create_app)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 5))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') == '1'
+    
+    # Sharding (app/sharding.py): user-owned tables spread over these databases
+    # by consistent hashing of user_id; users and categories stay in
+    # SQLALCHEMY_DATABASE_URI. Space- or comma-separated, only ever appended to
+    # (run "flask shards rebalance" after adding one). Empty disables sharding.
+    # PostgreSQL schemas: ...?options=-csearch_path%3Dshard1,public
+    SHARD_DATABASE_URLS = os.environ.get('SHARD_DATABASE_URLS', '')
+    SHARD_VIRTUAL_NODES = int(os.environ.get('SHARD_VIRTUAL_NODES', 64))
+    
+    # Read replicas of SQLALCHEMY_DATABASE_URI (app/replicas.py), space- or
+    # comma-separated; empty disables them. Replicas whose heartbeat is older
+    # than REPLICA_MAX_LAG_SECONDS are skipped (checked every
+    # REPLICA_LAG_CHECK_SECONDS), and a user's reads stay on the primary after
+    # a write until a replica has caught up, or REPLICA_STICKY_SECONDS pass
+    # (keep it above the max lag so a replica never serves data older than the write).
+    # Under gunicorn with several workers they need REPORT_CACHE_BACKEND=redis,
+    # where every worker sees the recent writes
+    REPLICA_DATABASE_URLS = os.environ.get('REPLICA_DATABASE_URLS', '')
+    REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 5))
+    REPLICA_LAG_CHECK_SECONDS = float(os.environ.get('REPLICA_LAG_CHECK_SECONDS', 1))
+    REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 30))
+    REPLICA_STICKY_MAX_USERS = int(os.environ.get('REPLICA_STICKY_MAX_USERS', 10000))
+    # "flask replicas heartbeat/sync --loop" period
+    REPLICA_HEARTBEAT_INTERVAL = float(os.environ.get('REPLICA_HEARTBEAT_INTERVAL', 1))
+    
+    # Applied to every new SQLite connection
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', -64 * 1024))  # negative = KiB
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key-change-in-production'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+    # Verified tokens remembered per process (0 disables), and how long a
+    # cached token version may lag a revocation made by another worker
+    JWT_VERIFIED_CACHE_SIZE = int(os.environ.get('JWT_VERIFIED_CACHE_SIZE', 4096))
+    AUTH_TOKEN_VERSION_TTL = int(os.environ.get('AUTH_TOKEN_VERSION_TTL', 30))
+    
+    # Category registry: users whose custom categories are kept per process,
+    # and how long another worker's new category may go unnoticed
+    CATEGORY_CACHE_SIZE = int(os.environ.get('CATEGORY_CACHE_SIZE', 1024))
+    CATEGORY_CACHE_TTL = int(os.environ.get('CATEGORY_CACHE_TTL', 300))
+    
+    # Password hashing: 'pbkdf2' or 'bcrypt', run on a bounded 'thread' or 'process' pool
+    PASSWORD_HASH_ALGORITHM = os.environ.get('PASSWORD_HASH_ALGORITHM', 'pbkdf2')
+    PASSWORD_PBKDF2_ITERATIONS = int(os.environ.get('PASSWORD_PBKDF2_ITERATIONS', 600000))
+    PASSWORD_BCRYPT_ROUNDS = int(os.environ.get('PASSWORD_BCRYPT_ROUNDS', 12))
+    PASSWORD_HASH_POOL = os.environ.get('PASSWORD_HASH_POOL', 'thread')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+    # Hashes allowed to wait for a worker, and how long (seconds) others wait before a 503
+    PASSWORD_HASH_QUEUE_SIZE = int(os.environ.get('PASSWORD_HASH_QUEUE_SIZE', 32))
+    PASSWORD_HASH_WAIT = float(os.environ.get('PASSWORD_HASH_WAIT', 2))
+    
+    # Amounts are stored as integer minor units of this currency
+    CURRENCY = os.environ.get('CURRENCY', 'USD')
+    
+    # Transaction listing
+    TRANSACTIONS_PAGE_MAX_LIMIT = int(os.environ.get('TRANSACTIONS_PAGE_MAX_LIMIT', 500))
+    TRANSACTIONS_STREAM_CHUNK_SIZE = int(os.environ.get('TRANSACTIONS_STREAM_CHUNK_SIZE', 500))
+    
+    # Batch update/delete (/api/transactions/batch): most ids one request may list
+    TRANSACTIONS_BATCH_MAX_IDS = int(os.environ.get('TRANSACTIONS_BATCH_MAX_IDS', 5000))
+    
+    # Bulk import
+    BULK_IMPORT_BATCH_SIZE = int(os.environ.get('BULK_IMPORT_BATCH_SIZE', 1000))
+    BULK_IMPORT_MAX_ERRORS = int(os.environ.get('BULK_IMPORT_MAX_ERRORS', 1000))
+    
+    # Write-behind ingestion (POST /api/transactions/ingest, see app/ingest.py): rows are
+    # journaled to INGEST_JOURNAL_DIR and committed by a writer thread in groups of
+    # INGEST_BATCH_ROWS, or whatever arrived within INGEST_BATCH_MS milliseconds.
+    # Pending receipts are seen by every worker only with REPORT_CACHE_BACKEND=redis;
+    # otherwise a status request to another worker gets 404 until the row is committed
+    INGEST_ENABLED = os.environ.get('INGEST_ENABLED', '0') == '1'
+    INGEST_BATCH_ROWS = int(os.environ.get('INGEST_BATCH_ROWS', 500))
+    INGEST_BATCH_MS = int(os.environ.get('INGEST_BATCH_MS', 50))
+    # Rows accepted but not yet committed, per process, before new ones get a 503
+    INGEST_QUEUE_SIZE = int(os.environ.get('INGEST_QUEUE_SIZE', 10000))
+    INGEST_JOURNAL_DIR = os.environ.get('INGEST_JOURNAL_DIR', 'ingest-journal')
+    INGEST_JOURNAL_SEGMENT_BYTES = int(os.environ.get('INGEST_JOURNAL_SEGMENT_BYTES', 16 * 1024 * 1024))
+    # fsync the journal before answering 202; off, a host crash can lose accepted rows
+    INGEST_JOURNAL_FSYNC = os.environ.get('INGEST_JOURNAL_FSYNC', '1') == '1'
+    
+    # Recurring transactions: rules handled per batch, and the optional in-process
+    # scheduler thread (otherwise run "flask recurring run" from cron or a worker)
+    RECURRING_BATCH_SIZE = int(os.environ.get('RECURRING_BATCH_SIZE', 2000))
+    RECURRING_SCHEDULER_ENABLED = os.environ.get('RECURRING_SCHEDULER_ENABLED', '0') == '1'
+    RECURRING_SCHEDULER_INTERVAL = int(os.environ.get('RECURRING_SCHEDULER_INTERVAL', 3600))
+    
+    # Range trend (/api/reports/trend): most periods one request may return
+    REPORT_TREND_MAX_PERIODS = int(os.environ.get('REPORT_TREND_MAX_PERIODS', 5000))
+    
+    # Analytics (/api/reports/forecast and /api/reports/anomalies)
+    ANALYTICS_ROLLING_MONTHS = int(os.environ.get('ANALYTICS_ROLLING_MONTHS', 3))
+    ANALYTICS_ANOMALY_MONTHS = int(os.environ.get('ANALYTICS_ANOMALY_MONTHS', 12))
+    ANALYTICS_ZSCORE_THRESHOLD = float(os.environ.get('ANALYTICS_ZSCORE_THRESHOLD', 3.0))
+    # Categories with fewer expenses than this in the window are never flagged
+    ANALYTICS_MIN_SAMPLES = int(os.environ.get('ANALYTICS_MIN_SAMPLES', 5))
+    
+    # Savings goal projections use the contribution rate over this many days
+    GOAL_VELOCITY_DAYS = int(os.environ.get('GOAL_VELOCITY_DAYS', 90))
+    
+    # Search (?q=) relevance is divided by 1 + age in days / SEARCH_RECENCY_DAYS
+    SEARCH_RECENCY_DAYS = int(os.environ.get('SEARCH_RECENCY_DAYS', 365))
+    
+    # Exports
+    EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 5000))
+    
+    # Report cache: 'memory' (per process), 'redis' (shared by all workers) or 'none'.
+    # Unset, it is 'memory' in a single process and 'none' with several (a write
+    # would only invalidate the copy in its own process); 'memory' is refused then
+    REPORT_CACHE_BACKEND = os.environ.get('REPORT_CACHE_BACKEND')
+    REPORT_CACHE_TTL = int(os.environ.get('REPORT_CACHE_TTL', 60))
+    REPORT_CACHE_MAX_ENTRIES = int(os.environ.get('REPORT_CACHE_MAX_ENTRIES', 1024))
+    REPORT_CACHE_REDIS_URL = os.environ.get('REPORT_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    
+    # Request instrumentation: Server-Timing header, /metrics and sampled profiles
+    INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION_ENABLED', '0') == '1'
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0.0))
+    PROFILE_THRESHOLD_MS = int(os.environ.get('PROFILE_THRESHOLD_MS', 500))
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+    
+    # Processes serving requests: 1 for the development server and scripts,
+    # SERVER_WORKERS under gunicorn (ServerConfig)
+    SERVER_PROCESSES = 1
+    
+    # Production server (gunicorn.conf.py)
+    SERVER_BIND = os.environ.get('SERVER_BIND', '0.0.0.0:5000')
+    SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', (os.cpu_count() or 1) * 2 + 1))
+    SERVER_THREADS = int(os.environ.get('SERVER_THREADS', 4))
+    SERVER_TIMEOUT = int(os.environ.get('SERVER_TIMEOUT', 30))
+    SERVER_GRACEFUL_TIMEOUT = int(os.environ.get('SERVER_GRACEFUL_TIMEOUT', 30))
+    SERVER_KEEPALIVE = int(os.environ.get('SERVER_KEEPALIVE', 5))
+    # Recycle each worker after this many requests (plus jitter) to cap memory growth
+    SERVER_MAX_REQUESTS = int(os.environ.get('SERVER_MAX_REQUESTS', 10000))
+    SERVER_MAX_REQUESTS_JITTER = int(os.environ.get('SERVER_MAX_REQUESTS_JITTER', 1000))
+
+
+class ServerConfig(Config):
+    """Config of the gunicorn workers (wsgi.py)."""
+    SERVER_PROCESSES = Config.SERVER_WORKERS
@@ -0,0 +1,25 @@
+# gunicorn settings, driven by the SERVER_* values in config.py
+from config import Config
+
+bind = Config.SERVER_BIND
+workers = Config.SERVER_WORKERS
+worker_class = 'gthread'
+threads = Config.SERVER_THREADS
+timeout = Config.SERVER_TIMEOUT
+graceful_timeout = Config.SERVER_GRACEFUL_TIMEOUT
+keepalive = Config.SERVER_KEEPALIVE
+max_requests = Config.SERVER_MAX_REQUESTS
+max_requests_jitter = Config.SERVER_MAX_REQUESTS_JITTER
+
+# Each worker builds its own app (and connection pool) after forking
+preload_app = False
+
+accesslog = '-'
+errorlog = '-'
+
+
+def worker_exit(server, worker):
+    # Commit the write-behind ingestion queue before a recycled worker exits;
+    # anything left over is replayed from its journal by the next worker
+    from app.ingest import ingest_queue
+    ingest_queue.stop()
@@ -0,0 +1,142 @@
+from app import create_app, db, rollups, search, sharding
+from app.sharding import shard_router
+from app.models import MonthlyCategoryTotal, DailyTotal, GoalContribution, SavingsGoal
+from app.money import Money
+from flask import current_app
+from sqlalchemy import inspect, text
+from datetime import datetime
+
+# Float money columns replaced by integer minor units ("cents")
+MONEY_COLUMNS = {
+    'transactions': [('amount', 'amount_cents')],
+    'budgets': [('monthly_limit', 'monthly_limit_cents')],
+    'savings_goals': [('target_amount', 'target_amount_cents'), ('saved_amount', 'saved_amount_cents')],
+}
+
+# Columns added to existing tables after they were first created
+NEW_COLUMNS = {
+    'users': [('token_version', 'INTEGER NOT NULL DEFAULT 0')],
+    'transactions': [('recurring_rule_id', 'INTEGER'), ('occurrence_date', 'DATE')],
+}
+
+
+def add_missing_columns():
+    inspector = inspect(db.engine)
+    added = []
+    for table, columns in NEW_COLUMNS.items():
+        if not inspector.has_table(table):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table)}
+        for name, ddl in columns:
+            if name not in existing:
+                with db.engine.begin() as conn:
+                    conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {name} {ddl}'))
+                added.append(f'{table}.{name}')
+    return added
+
+
+def convert_money_to_cents():
+    # ADD/UPDATE/DROP COLUMN works the same on PostgreSQL and SQLite >= 3.35
+    factor = 10 ** Money.exponent(current_app.config['CURRENCY'])
+    inspector = inspect(db.engine)
+    converted = []
+    for table, pairs in MONEY_COLUMNS.items():
+        if not inspector.has_table(table):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table)}
+        for old, new in pairs:
+            if old in existing and new not in existing:
+                with db.engine.begin() as conn:
+                    conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {new} BIGINT NOT NULL DEFAULT 0'))
+                    conn.execute(text(f'UPDATE {table} SET {new} = ROUND(COALESCE({old}, 0) * {factor})'))
+                    conn.execute(text(f'ALTER TABLE {table} DROP COLUMN {old}'))
+                converted.append(f'{table}.{old}')
+    
+    # Float rollups are simply dropped and rebuilt from the converted rows
+    table = MonthlyCategoryTotal.__tablename__
+    if inspector.has_table(table) and 'total' in {c['name'] for c in inspector.get_columns(table)}:
+        MonthlyCategoryTotal.__table__.drop(db.engine)
+    
+    return converted
+
+
+def create_missing_indexes(engine=None, tables=None):
+    # Indexes declared on existing tables are not touched by create_all(),
+    # so add any that the database does not have yet (SQLite and PostgreSQL)
+    engine = engine or db.engine
+    created = []
+    inspector = inspect(engine)
+    for table in db.metadata.sorted_tables:
+        if tables is not None and table.name not in tables:
+            continue
+        for index in table.indexes:
+            if not inspector.has_index(table.name, index.name):
+                index.create(engine)
+                created.append(index.name)
+    return created
+
+
+def backfill_goal_contributions():
+    # Amounts saved before the ledger existed become one opening contribution
+    # per goal, dated when the goal was created
+    goals = SavingsGoal.query.filter(SavingsGoal.saved_amount_cents > 0).all()
+    for goal in goals:
+        db.session.add(GoalContribution(
+            goal_id=goal.goal_id,
+            user_id=goal.user_id,
+            amount_cents=goal.saved_amount_cents,
+            contributed_at=goal.created_at or datetime.utcnow()
+        ))
+    db.session.commit()
+    return len(goals)
+
+
+def migrate():
+    app = create_app()
+    
+    with app.app_context():
+        for name in convert_money_to_cents():
+            print(f"✅ Converted {name} to integer cents")
+        
+        for name in add_missing_columns():
+            print(f"✅ Added column {name}")
+        
+        had_rollups = all(inspect(db.engine).has_table(model.__tablename__) for model in (MonthlyCategoryTotal, DailyTotal))
+        had_contributions = inspect(db.engine).has_table(GoalContribution.__tablename__)
+        
+        # New tables (and their indexes) are created outright
+        db.create_all()
+        
+        for name in create_missing_indexes():
+            print(f"✅ Created index {name}")
+        
+        # Builds the SQLite FTS table from existing notes the first time
+        with db.engine.begin() as conn:
+            search.install(conn)
+        print("✅ Full-text search index is in place")
+        
+        # With sharding on, these tables in the default database only hold
+        # data not yet moved by "flask shards rebalance"
+        with shard_router.using(None):
+            if not had_rollups:
+                rollups.rebuild()
+                db.session.commit()
+                print("✅ Built monthly and daily rollups from existing transactions")
+            
+            if not had_contributions:
+                count = backfill_goal_contributions()
+                print(f"✅ Recorded opening contributions for {count} savings goals")
+        
+        # Shards are always created with the current schema
+        for name in sharding.create_all():
+            engine = db.engines[name]
+            for index in create_missing_indexes(engine, shard_router.sharded_tables()):
+                print(f"✅ Created index {index} in {name}")
+            with engine.begin() as conn:
+                search.install(conn)
+            print(f"✅ Shard {name} is in place")
+        
+        print("✅ Database schema is up to date!")
+
+if __name__ == '__main__':
+    migrate()
@@ -1,8 +1,12 @@
+import os
 from app import create_app, db
+from app.sharding import create_all as create_shards
 
 app = create_app()
 
+# Development server only; use "gunicorn -c gunicorn.conf.py wsgi:app" in production
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
-    app.run(debug=True)
+        create_shards()
+    app.run(debug=os.environ.get('FLASK_DEBUG', '1') == '1')
@@ -0,0 +1,6 @@
+# Production entry point: gunicorn -c gunicorn.conf.py wsgi:app
+# The schema is managed by migrate.py and is never touched here.
+from config import ServerConfig
+from app import create_app
+
+app = create_app(ServerConfig)